@@ -1,65 +1,285 @@
-from flask import Flask, jsonify, request, make_response
+import json
+import ijson
+from flask import Flask, Response, jsonify, request, make_response, stream_with_context
 from auth import auth_routes  # import the auth blueprint
 from flask_cors import CORS
 
-from database.main import Database
+from database.main import Database, close_db_session, get_pool_status
 from utils.session import validate_session
+from utils.session_cache import session_cache
+from utils.hashpasswd import password_hasher
+from utils.session_purger import start_session_purger, ensure_run_partitions
+from utils.collection_formats import EXPORTERS, import_collection
+from utils.request_runner import request_runner
+from utils.collection_run import CollectionRun, active_runs
+from utils.etag import dashboard_etag, set_dashboard_validators
+from utils.dashboard_cache import dashboard_cache
+from utils.json_provider import install_json_provider
+from utils.metrics import metrics, init_app_metrics, track_stream, PROMETHEUS_CONTENT_TYPE
+from utils.query_log import init_query_budget, query_budget, allow_queries
+from utils.compression import negotiate_encoding, encode_body, compress_stream, is_compressible, set_encoding_headers
+from utils.route_helpers import (
+    CORS_ORIGINS, MAX_PAGE_SIZE, STREAM_BATCH_SIZE, COLLECTIONS_PAGE_QUERIES, IMPORT_BATCH_SIZE, MAX_HISTORY_RUNS, MAX_STATISTICS_HOURS, AUTH_REDIRECT,
+    expire_session_cookie, client_collection, page_arguments, stream_requested, dashboard_line, dashboard_response,
+    collection_error, bulk_endpoints_error, import_parser, import_format_error, set_export_headers, run_collection_summary,
+    history_arguments, history_saved, record_load_run_results, load_run_arguments, load_run_size_error, stats_allowed, stats_not_found,
+)
 app = Flask(__name__)
+install_json_provider(app)
 CORS(
     app,
     supports_credentials=True,
-    resources={r"/*": {"origins": ["http://localhost:5174", "http://127.0.0.1:5173/", "http://localhost:4173", "http://localhost:5173"]}},
+    resources={r"/*": {"origins": CORS_ORIGINS}},
 )
 # Register the blueprint for auth routes
 app.register_blueprint(auth_routes, url_prefix="/auth")
+# Give the request database session back to the pool when the request ends
+app.teardown_appcontext(close_db_session)
+# Request latency, DB queries and bcrypt time per route, exported on /metrics
+init_app_metrics(app, request)
+# Routes running more queries than their @query_budget fail in debug and testing mode
+init_query_budget(app, request)
+metrics.add_gauges("callapi_db_pool", get_pool_status, "Database connection pool (see /pool-stats).")
+metrics.add_gauges("callapi_password_hashing", password_hasher.stats, "Password hashing pool (see /hashing-stats).")
+metrics.add_gauges("callapi_session_cache", session_cache.stats, "Session cache (see /session-cache-stats).")
+metrics.add_gauges("callapi_dashboard_cache", dashboard_cache.stats, "Dashboard cache (see /dashboard-cache-stats).")
+
+
+def start_background_jobs() -> None:
+    """
+    Background work of a serving process, started by the server and never on import (tests and benchmarks
+    import the app): by `python app.py` and by the post_fork hook of gunicorn.conf.py in every worker.
+    """
+    # Purge expired sessions (and old run history) from this process when SESSION_PURGER_ENABLED is set
+    start_session_purger()
+    # With RUN_PARTITIONS_ON_STARTUP, runs recorded before the first retention pass go to their daily partition
+    ensure_run_partitions()
+
+
+@app.after_request
+def compress_response(response):
+    """Compresses buffered JSON responses for clients that accept it (see utils.compression)."""
+    if is_compressible(response):
+        body, encoding = encode_body(response.get_data(), negotiate_encoding(request.headers.get('Accept-Encoding', "")))
+        if encoding is not None:
+            response.set_data(body)
+        set_encoding_headers(response, encoding)
+    return response
+
 
 @app.route("/")
 def home():
     return jsonify({"message": "Welcome to the main page!"})
 
 
+@app.route("/pool-stats", methods=['GET'])
+def pool_stats():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return jsonify(get_pool_status()), 200
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route("/hashing-stats", methods=['GET'])
+def hashing_stats():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return jsonify(password_hasher.stats()), 200
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route("/session-cache-stats", methods=['GET'])
+def session_cache_stats():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return jsonify(session_cache.stats()), 200
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text format: per-route latency, DB queries / time and bcrypt time per request, pool and cache gauges."""
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route("/dashboard-cache-stats", methods=['GET'])
+def dashboard_cache_stats():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return jsonify(dashboard_cache.stats()), 200
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+def _redirect_to_auth():
+    return expire_session_cookie(make_response(jsonify(AUTH_REDIRECT), 401))
+
+
+def _stream_user_information(db: Database, user_id: int, user: dict, cursor: int, endpoints_limit):
+    """
+    Yields the dashboard as NDJSON: one line with the user followed by one line per collection.
+    Collections are read in batches so the memory used doesn't depend on the number of collections.
+    """
+    yield dashboard_line(app.json.dumps, 'user', user)
+
+    while cursor is not None:
+        page = db.get_collections_page(user_id=user_id, limit=STREAM_BATCH_SIZE, cursor=cursor, endpoints_limit=endpoints_limit)
+        if page['status'] != 200:
+            yield dashboard_line(app.json.dumps, 'error', "Internal Server Error")
+            return
+
+        for collection in page['data']['collections']:
+            yield dashboard_line(app.json.dumps, 'collection', client_collection(collection))
+
+        db.release_loaded_rows()
+        cursor = page['data']['next_cursor']
+        if cursor is not None:
+            # The route budget covers the first page
+            allow_queries(COLLECTIONS_PAGE_QUERIES)
+
+
 @app.route('/user-information', methods=['GET'])
+# Session lookup, user (data version), collections and the endpoints of a page
+@query_budget(4)
 def user_information_endpoint():
+    """
+    Dashboard data of the logged user.
+    Query arguments (all optional):
+        limit           - return a page of `limit` collections and the `next_cursor` of the following page
+        cursor          - `next_cursor` returned by the previous page
+        endpoints_limit - return at most `endpoints_limit` endpoints per collection
+                          (the rest is available on /collection-endpoints)
+        stream          - "1" to stream the collections as NDJSON (application/x-ndjson)
+    Responses carry an ETag, If-None-Match is answered with 304 when the collections didn't change.
+    Bodies are compressed according to Accept-Encoding, the streamed mode chunk by chunk.
+    """
     try:
         sid = request.cookies.get("sid")
         user_id = validate_session(sid)
 
         if user_id:
-            user_information = {}
+            pagination = page_arguments(request.args)
+            if pagination is None:
+                return [f"Invalid pagination arguments (page size must be between 1 and {MAX_PAGE_SIZE})."], 400
+            limit, cursor, endpoints_limit = pagination
+            stream = stream_requested(request.args)
 
             db = Database()
             user_information = db.get_all_users_data(user_id=user_id)
 
             if user_information['status'] == 200:
+                data_version = user_information['data'].pop('data_version')
+                etag = dashboard_etag(user_id, data_version)
+                if request.if_none_match.contains_weak(etag):
+                    return set_dashboard_validators(make_response("", 304), etag)
+
+                encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ""))
+
+                if stream:
+                    chunks = _stream_user_information(db, user_id, user_information['data']['user'], cursor, endpoints_limit)
+                    if encoding is not None:
+                        chunks = compress_stream(chunks, encoding)
+                    response = Response(stream_with_context(track_stream(chunks)), mimetype='application/x-ndjson')
+                    set_encoding_headers(response, encoding)
+                    return set_dashboard_validators(response, etag)
+
+                if limit is not None or endpoints_limit is not None:
+                    # collection information (one page)
+                    collections = db.get_collections_page(
+                        user_id=user_id, limit=limit or MAX_PAGE_SIZE, cursor=cursor, endpoints_limit=endpoints_limit
+                    )
+                    if collections['status'] != 200:
+                        return ["Internal Server Error"], 500
+
+                    user_information['data'].update({
+                        'collections': [client_collection(collection) for collection in collections['data']['collections']],
+                        'next_cursor': collections['data']['next_cursor'],
+                    })
+                    return set_dashboard_validators(make_response(user_information['data'], user_information['status']), etag)
+
+                # Full dashboard: serialized and compressed once per data version and content coding
+                if encoding is not None:
+                    body = dashboard_cache.get(user_id, data_version, encoding)
+                    if body is not None:
+                        return dashboard_response(Response, body, encoding, etag)
+
+                body = dashboard_cache.get(user_id, data_version)
+                if body is None:
+                    # collection information
+                    collections = db.get_dashboard_collections(user_id=user_id)
+                    if collections['status'] == 200:
+                        user_information['data'].update({'collections' : collections['data']['collections']})
+                    # 404: the user has no collections yet, the dashboard is the user alone (and still gets its ETag)
+                    elif collections['status'] != 404:
+                        return user_information['data'], user_information['status']
+
+                    body = app.json.dumps_bytes(user_information['data'])
+                    dashboard_cache.set(user_id, data_version, body)
+
+                body, encoding = encode_body(body, encoding)
+                if encoding is not None:
+                    dashboard_cache.set(user_id, data_version, body, encoding)
+                return dashboard_response(Response, body, encoding, etag)
+            else:
+                return ["Internal Server Error"], 500
+
+        else:
+            return _redirect_to_auth()
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
 
-                user_information.update(user_information['data'])
 
-                # collection information
-                collections = db.get_collections_from_user(user_id=user_id)
-                if collections['status'] == 200:
+@app.route('/collection-endpoints', methods=['GET'])
+@query_budget(3)
+def collection_endpoints():
+    """
+    One page of endpoints from a collection of the logged user.
+    Query arguments: collection_title (required), limit, cursor
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
 
-                    client_collection_data = []
+        if user_id:
+            collection_title = request.args.get('collection_title')
+            pagination = page_arguments(request.args)
+            if not collection_title or pagination is None:
+                return ['Invalid query arguments.'], 400
+            limit, cursor, _ = pagination
 
-                    for collection in collections['data']['collections']:
-                        print(collection)
-                        del collection['id']
-                        del collection['user_id']
-                        client_collection_data.append(collection)
+            db = Database()
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
 
-                    user_information['data'].update({'collections' : client_collection_data})
+            if collection_request['status'] == 200:
+                endpoints_request = db.get_endpoints_page(
+                    collection_id=collection_request['data']['collection_id'], limit=limit or MAX_PAGE_SIZE, cursor=cursor
+                )
+                return endpoints_request['data'], endpoints_request['status']
 
-                return user_information['data'], user_information['status']
             else:
-                return ["Internal Server Error"], 500
+                return collection_error(collection_title, collection_request)
 
         else:
-            resp = make_response(jsonify({"type": "redirect", "value": "/auth"}), 401)
-            resp.set_cookie(
-                "sid", str(),
-                httponly=True, secure=False, samesite="Lax",
-                max_age=24 * 3600
-            )
-            return resp
+            return _redirect_to_auth()
 
     except Exception as error:
         print(error)
@@ -68,6 +288,7 @@ def user_information_endpoint():
 
 
 @app.route('/remove-collection', methods=['POST'])
+@query_budget(4)
 def remove_collection():
     try:
         sid = request.cookies.get("sid")
@@ -87,13 +308,7 @@ def remove_collection():
                 return ['Invalid JSON.'], 400
 
         else:
-            resp = make_response(jsonify({"type": "redirect", "value": "/auth"}), 401)
-            resp.set_cookie(
-                "sid", str(),
-                httponly=True, secure=False, samesite="Lax",
-                max_age=24 * 3600
-            )
-            return resp
+            return _redirect_to_auth()
 
     except Exception as error:
         print(error)
@@ -101,6 +316,7 @@ def remove_collection():
 
 
 @app.route('/add-collection', methods=['POST'])
+@query_budget(5)
 def add_collection():
     try:
         sid = request.cookies.get("sid")
@@ -121,13 +337,7 @@ def add_collection():
                 return ['Invalid JSON'], 400
 
         else:
-            resp = make_response(jsonify({"type": "redirect", "value": "/auth"}), 401)
-            resp.set_cookie(
-                "sid", str(),
-                httponly=True, secure=False, samesite="Lax",
-                max_age=24 * 3600
-            )
-            return resp
+            return _redirect_to_auth()
 
     except Exception as error:
         print(error)
@@ -135,6 +345,7 @@ def add_collection():
 
 
 @app.route('/add-endpoint', methods=['POST'])
+@query_budget(6)
 def add_endpoint():
     try:
         sid = request.cookies.get("sid")
@@ -146,31 +357,368 @@ def add_endpoint():
             endpoint_json  = data.get('endpoint_json')
 
             db = Database()
-            all_collections = db.get_collections_from_user(user_id=user_id)
-            collection_id = 0
-            if all_collections['status'] == 200:
-                for collection in all_collections['data']['collections']:
-                    if collection_title == collection['title']:
-                        collection_id = collection['id']
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                collection_id = collection_request['data']['collection_id']
+                add_endpoint_request = db.add_endpoint(collection_id=collection_id, endpoint_data = endpoint_json)
+                return add_endpoint_request['data'], add_endpoint_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request, missing_status=400)
+        else:
+            return ["Invalid user ID"], 400
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/add-endpoints', methods=['POST'])
+@query_budget(5)
+def add_endpoints():
+    """
+    Bulk import of endpoints into one collection.
+    JSON: {"collection_title": "...", "endpoints": [endpoint_json, ...]}
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
+
+        if user_id:
+            data = request.get_json()
+            collection_title = data.get('collection_title')
+            endpoints_json = data.get('endpoints')
+
+            error = bulk_endpoints_error(collection_title, endpoints_json)
+            if error:
+                return error
+
+            db = Database()
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                collection_id = collection_request['data']['collection_id']
+                add_endpoints_request = db.add_endpoints(collection_id=collection_id, endpoints_data=endpoints_json)
+                return add_endpoints_request['data'], add_endpoints_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request, missing_status=400)
+        else:
+            return ["Invalid user ID"], 400
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/import-collection', methods=['POST'])
+def import_collection_endpoint():
+    """
+    Creates a collection from a Postman v2.1 collection or an OpenAPI JSON document sent as the request body.
+    Query arguments: format ("postman" or "openapi"), collection_title (default: the name in the file)
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
+
+        if user_id:
+            parser = import_parser(request.args)
+            if parser is None:
+                return import_format_error()
+
+            db = Database()
+            import_request = import_collection(
+                db, user_id, parser(request.stream),
+                collection_title=request.args.get('collection_title'), batch_size=IMPORT_BATCH_SIZE
+            )
+            return import_request['data'], import_request['status']
+
+        else:
+            return ["Invalid user ID"], 400
+
+    except ijson.JSONError as error:
+        print(error)
+        return ["Invalid JSON file."], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/export-collection', methods=['GET'])
+def export_collection_endpoint():
+    """
+    Streams a collection as a Postman v2.1 collection or an OpenAPI 3 document.
+    Query arguments: collection_title, format ("postman" or "openapi")
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
 
-                if collection_id:
+        if user_id:
+            collection_title = request.args.get('collection_title')
+            export_format = request.args.get('format', 'postman')
+            exporter = EXPORTERS.get(export_format)
+            if not collection_title or exporter is None:
+                return ['Invalid query arguments.'], 400
 
-                    add_endpoint_request = db.add_endpoint(collection_id=collection_id, endpoint_data = endpoint_json)
-                    return add_endpoint_request['data'], add_endpoint_request['status']
+            db = Database()
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
 
-                else:
-                    return [f"Collection \"{collection_title}\" does not exist."], 400
+            if collection_request['status'] == 200:
+                endpoints = db.iter_endpoints(
+                    collection_request['data']['collection_id'], order_by_url=export_format == 'openapi'
+                )
+                resp = Response(stream_with_context(track_stream(exporter(collection_title, endpoints))), mimetype='application/json')
+                return set_export_headers(resp, export_format)
 
             else:
-                return [f"Internal error"], 500
+                return collection_error(collection_title, collection_request)
+
         else:
             return ["Invalid user ID"], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/run-endpoint', methods=['POST'])
+def run_endpoint():
+    """
+    Executes a stored endpoint from the server.
+    JSON: {"collection_title": "...", "endpoint_id": 1, "body": "..." (optional)}
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
+
+        if user_id:
+            data = request.get_json()
+            collection_title = data.get('collection_title')
+            endpoint_id = data.get('endpoint_id')
+
+            if not collection_title or not endpoint_id:
+                return ['Invalid JSON.'], 400
+
+            db = Database()
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoint_request = db.get_endpoint(collection_request['data']['collection_id'], endpoint_id)
+                if endpoint_request['status'] != 200:
+                    return endpoint_request['data'], endpoint_request['status']
+
+                # Give the connection back to the pool while the request runs
+                db.rollback()
+                result = request_runner.run(endpoint_request['data']['endpoint'], data.get('body'))
+                history_saved(db.record_endpoint_runs([result]), 1)
+                return result, 200
+
+            else:
+                return collection_error(collection_title, collection_request)
+        else:
+            return ["Invalid user ID"], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/run-collection', methods=['POST'])
+def run_collection():
+    """
+    Executes every endpoint of a collection from the server (concurrently, see utils.request_runner).
+    JSON: {"collection_title": "...", "body": "..." (optional)}
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
+
+        if user_id:
+            data = request.get_json()
+            collection_title = data.get('collection_title')
+
+            if not collection_title:
+                return ['Invalid JSON.'], 400
+
+            db = Database()
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoints = list(db.iter_endpoints(collection_request['data']['collection_id']))
+                # Give the connection back to the pool while the requests run
+                db.rollback()
+
+                results = request_runner.run_many(endpoints, data.get('body'))
+                history_saved(db.record_endpoint_runs(results), len(results))
+                return run_collection_summary(collection_title, results), 200
+
+            else:
+                return collection_error(collection_title, collection_request)
+        else:
+            return ["Invalid user ID"], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/endpoint-history', methods=['GET'])
+def endpoint_history():
+    """
+    Last runs of an endpoint, newest first.
+    Query arguments: collection_title, endpoint_id, limit (default 20)
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
+
+        if user_id:
+            arguments = history_arguments(request.args, 'limit', 20, MAX_HISTORY_RUNS)
+            if arguments is None:
+                return ['Invalid query arguments.'], 400
+            collection_title, endpoint_id, limit = arguments
+
+            db = Database()
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoint_request = db.get_endpoint(collection_request['data']['collection_id'], endpoint_id)
+                if endpoint_request['status'] != 200:
+                    return endpoint_request['data'], endpoint_request['status']
+
+                history_request = db.get_endpoint_history(endpoint_id=endpoint_id, limit=limit)
+                return history_request['data'], history_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request)
+        else:
+            return ["Invalid user ID"], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/endpoint-statistics', methods=['GET'])
+def endpoint_statistics():
+    """
+    Runs, errors, average latency / size and latency percentiles of an endpoint, from the hourly rollups.
+    Query arguments: collection_title, endpoint_id, hours (default 24)
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
+
+        if user_id:
+            arguments = history_arguments(request.args, 'hours', 24, MAX_STATISTICS_HOURS)
+            if arguments is None:
+                return ['Invalid query arguments.'], 400
+            collection_title, endpoint_id, hours = arguments
+
+            db = Database()
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoint_request = db.get_endpoint(collection_request['data']['collection_id'], endpoint_id)
+                if endpoint_request['status'] != 200:
+                    return endpoint_request['data'], endpoint_request['status']
+
+                statistics_request = db.get_endpoint_statistics(endpoint_id=endpoint_id, hours=hours)
+                return statistics_request['data'], statistics_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request)
+        else:
+            return ["Invalid user ID"], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/run-collection-load', methods=['POST'])
+def run_collection_load():
+    """
+    Runs a collection N times concurrently (see utils.collection_run) and streams NDJSON progress events.
+    JSON: {"collection_title": "...", "iterations": 1, "concurrency": 10, "per_host_concurrency": 5,
+           "rate": null (requests per second), "body": "..." (optional)}
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
+
+        if user_id:
+            arguments = load_run_arguments(request.get_json())
+            if arguments is None:
+                return ['Invalid JSON.'], 400
+            collection_title, run_arguments = arguments
+
+            db = Database()
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoints = list(db.iter_endpoints(collection_request['data']['collection_id']))
+                # Give the connection back to the pool while the requests run
+                db.rollback()
+
+                error = load_run_size_error(collection_title, endpoints, run_arguments['iterations'])
+                if error:
+                    return error
+
+                run = CollectionRun(user_id, endpoints, recorder=record_load_run_results, **run_arguments)
+                if not active_runs.add(run):
+                    return ["Too many runs in progress, try again later."], 503
+                run.start()
+
+                def generate():
+                    try:
+                        for event in run.stream():
+                            yield json.dumps(event) + "\n"
+                    finally:
+                        active_runs.remove(run)
+
+                return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+            else:
+                return collection_error(collection_title, collection_request)
+        else:
+            return ["Invalid user ID"], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/cancel-run', methods=['POST'])
+def cancel_run():
+    """
+    Cancels a run started by /run-collection-load. JSON: {"run_id": "..."}
+    """
+    try:
+        sid = request.cookies.get("sid")
+        user_id = validate_session(sid)
+
+        if user_id:
+            data = request.get_json()
+            run_id = data.get('run_id')
+
+            if not run_id:
+                return ['Invalid JSON.'], 400
+
+            if active_runs.cancel(run_id, user_id):
+                return ["Run cancelled."], 200
+            return [f"Run \"{run_id}\" not found."], 404
+        else:
+            return ["Invalid user ID"], 400
+
     except Exception as error:
         print(error)
         return ["Internal Server Error"], 500
 
 
 @app.route('/change-endpoint', methods=['POST'])
+@query_budget(7)
 def change_endpoint():
     try:
         sid = request.cookies.get("sid")
@@ -183,21 +731,15 @@ def change_endpoint():
             endpoint_id = data.get('endpoint_id')
 
             db = Database()
-            all_collections = db.get_collections_from_user(user_id=user_id)
-            collection_id = 0
-
-            if all_collections['status'] == 200:
-                for collection in all_collections['data']['collections']:
-                    if collection_title == collection['title']:
-                        collection_id = collection['id']
-
-                if collection_id:
-                    endpoint_change_request = db.change_endpoint(endpoint_id, collection_id, endpoint_json)
-                    return endpoint_change_request['data'], endpoint_change_request['status']
-                else:
-                    return [f"Collection \"{collection_title}\" does not exist."], 400
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                collection_id = collection_request['data']['collection_id']
+                endpoint_change_request = db.change_endpoint(endpoint_id, collection_id, endpoint_json)
+                return endpoint_change_request['data'], endpoint_change_request['status']
+
             else:
-                return [f"Internal error"], 500
+                return collection_error(collection_title, collection_request, missing_status=400)
         else:
             return ["No user found!"], 500
 
@@ -207,6 +749,7 @@ def change_endpoint():
 
 
 @app.route('/edit-collection', methods=['POST'])
+@query_budget(5)
 def edit_collection():
     try:
         sid = request.cookies.get("sid")
@@ -231,6 +774,7 @@ def edit_collection():
 
 
 @app.route('/duplicate-collection', methods=['POST'])
+@query_budget(6)
 def duplicate_collection():
     try:
         sid = request.cookies.get("sid")
@@ -254,4 +798,5 @@ def duplicate_collection():
         return ["Internal Server Error"], 500
 
 if __name__ == "__main__":
+    start_background_jobs()
     app.run(debug=True)
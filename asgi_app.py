@@ -0,0 +1,921 @@
+"""
+ASGI serving mode of the API.
+
+Same routes and responses as app.py (WSGI), but every route is a coroutine: database I/O goes
+through the async driver pool (database.async_main) and bcrypt runs on the hashing pool while the
+event loop keeps serving other clients. Request parsing, validation and response bodies come from
+utils.route_helpers, the same code as app.py. Work that blocks (the outgoing requests of the runner)
+runs in the default executor of the event loop.
+
+Run with:
+    hypercorn asgi_app:app --bind 0.0.0.0:5000 --workers 2
+"""
+import json
+import asyncio
+
+import ijson
+from sqlalchemy.util import await_only
+from quart import Quart, Blueprint, Response, jsonify, request, make_response
+from quart_cors import cors
+
+from database.async_main import AsyncDatabase, get_async_pool_status
+from utils.hashpasswd import check_password_async, hash_password_async, needs_rehash, PasswordHashingBusy, password_hasher
+from utils.register_checks import is_valid_email, check_password_requirements
+from utils.session import create_session_async, validate_session_async, remove_session_id_async
+from utils.session_cache import session_cache
+from utils.session_purger import start_session_purger, ensure_run_partitions
+from utils.collection_formats import ASYNC_EXPORTERS, import_collection
+from utils.request_runner import request_runner
+from utils.collection_run import CollectionRun, active_runs
+from utils.etag import dashboard_etag, set_dashboard_validators
+from utils.dashboard_cache import dashboard_cache
+from utils.json_provider import install_json_provider
+from utils.metrics import metrics, init_app_metrics, track_stream_async, PROMETHEUS_CONTENT_TYPE
+from utils.query_log import init_query_budget, query_budget, allow_queries
+from utils.compression import negotiate_encoding, encode_body, compress_stream_async, is_compressible, set_encoding_headers
+from utils.route_helpers import (
+    CORS_ORIGINS, MAX_PAGE_SIZE, STREAM_BATCH_SIZE, COLLECTIONS_PAGE_QUERIES, IMPORT_BATCH_SIZE, MAX_HISTORY_RUNS, MAX_STATISTICS_HOURS, AUTH_REDIRECT,
+    expire_session_cookie, client_collection, page_arguments, stream_requested, dashboard_line, dashboard_response,
+    collection_error, bulk_endpoints_error, import_parser, import_format_error, set_export_headers, run_collection_summary,
+    history_arguments, history_saved, record_load_run_results, load_run_arguments, load_run_size_error, stats_allowed, stats_not_found,
+)
+
+app = Quart(__name__)
+install_json_provider(app)
+app = cors(app, allow_origin=CORS_ORIGINS, allow_credentials=True)
+init_app_metrics(app, request, asynchronous=True)
+init_query_budget(app, request, asynchronous=True)
+metrics.add_gauges("callapi_db_pool", get_async_pool_status, "Database connection pool (see /pool-stats).")
+metrics.add_gauges("callapi_password_hashing", password_hasher.stats, "Password hashing pool (see /hashing-stats).")
+metrics.add_gauges("callapi_session_cache", session_cache.stats, "Session cache (see /session-cache-stats).")
+metrics.add_gauges("callapi_dashboard_cache", dashboard_cache.stats, "Dashboard cache (see /dashboard-cache-stats).")
+auth_routes = Blueprint('auth_routes', __name__)
+
+
+@app.before_serving
+async def start_background_jobs():
+    """Same as app.start_background_jobs(), in every serving process (hypercorn worker) and never on import."""
+    # Purge expired sessions (and old run history) from this process when SESSION_PURGER_ENABLED is set
+    start_session_purger()
+    # With RUN_PARTITIONS_ON_STARTUP, runs recorded before the first retention pass go to their daily partition
+    await _run_blocking(ensure_run_partitions)
+
+
+async def _redirect_to_auth():
+    return expire_session_cookie(await make_response(jsonify(AUTH_REDIRECT), 401))
+
+
+async def _run_blocking(function, *args):
+    """Runs a blocking call in the default executor of the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+class _RequestBodyReader(object):
+    """
+    Blocking file-like view of the request body for the parsers of utils.collection_formats, read from
+    inside AsyncDatabase.run_sync(): every read awaits the next body chunk on the event loop (await_only,
+    the way SQLAlchemy itself awaits the driver there), so only one chunk of the upload is in memory.
+    """
+
+    def __init__(self, body) -> None:
+        self._chunks = body.__aiter__()
+        self._buffer = b""
+        self._done = False
+
+    def _fill(self) -> bool:
+        while not self._buffer and not self._done:
+            try:
+                self._buffer = bytes(await_only(self._chunks.__anext__()))
+            except StopAsyncIteration:
+                self._done = True
+        return bool(self._buffer)
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            data = b""
+            while self._fill():
+                data, self._buffer = data + self._buffer, b""
+            return data
+
+        if not size or not self._fill():
+            return b""
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+async def _encoded(chunks):
+    """Async iterator of the UTF-8 bytes of str chunks."""
+    if hasattr(chunks, '__aiter__'):
+        async for chunk in chunks:
+            yield chunk.encode("utf-8")
+    else:
+        for chunk in chunks:
+            yield chunk.encode("utf-8")
+
+
+@app.after_request
+async def compress_response(response):
+    """Compresses buffered JSON responses for clients that accept it (see utils.compression)."""
+    if is_compressible(response):
+        body, encoding = encode_body(await response.get_data(), negotiate_encoding(request.headers.get('Accept-Encoding', "")))
+        if encoding is not None:
+            response.set_data(body)
+        set_encoding_headers(response, encoding)
+    return response
+
+
+@app.route("/")
+async def home():
+    return jsonify({"message": "Welcome to the main page!"})
+
+
+@app.route("/pool-stats", methods=['GET'])
+async def pool_stats():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return jsonify(get_async_pool_status()), 200
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route("/hashing-stats", methods=['GET'])
+async def hashing_stats():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return jsonify(password_hasher.stats()), 200
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route("/session-cache-stats", methods=['GET'])
+async def session_cache_stats():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return jsonify(session_cache.stats()), 200
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route("/metrics", methods=['GET'])
+async def metrics_endpoint():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route("/dashboard-cache-stats", methods=['GET'])
+async def dashboard_cache_stats():
+    try:
+        if not stats_allowed(request.headers):
+            return stats_not_found()
+        return jsonify(dashboard_cache.stats()), 200
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+async def _stream_user_information(user_id: int, user: dict, cursor: int, endpoints_limit):
+    """
+    Yields the dashboard as NDJSON like app.py. The generator runs after the route returned,
+    so it reads the collections with its own AsyncDatabase.
+    """
+    yield dashboard_line(app.json.dumps, 'user', user)
+
+    async with AsyncDatabase() as db:
+        while cursor is not None:
+            page = await db.get_collections_page(
+                user_id=user_id, limit=STREAM_BATCH_SIZE, cursor=cursor, endpoints_limit=endpoints_limit
+            )
+            if page['status'] != 200:
+                yield dashboard_line(app.json.dumps, 'error', "Internal Server Error")
+                return
+
+            for collection in page['data']['collections']:
+                yield dashboard_line(app.json.dumps, 'collection', client_collection(collection))
+
+            await db.release_loaded_rows()
+            cursor = page['data']['next_cursor']
+            if cursor is not None:
+                # The route budget covers the first page
+                allow_queries(COLLECTIONS_PAGE_QUERIES)
+
+
+@app.route('/user-information', methods=['GET'])
+# Session lookup, user (data version), collections and the endpoints of a page
+@query_budget(4)
+async def user_information_endpoint():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return await _redirect_to_auth()
+
+            pagination = page_arguments(request.args)
+            if pagination is None:
+                return [f"Invalid pagination arguments (page size must be between 1 and {MAX_PAGE_SIZE})."], 400
+            limit, cursor, endpoints_limit = pagination
+
+            user_information = await db.get_all_users_data(user_id=user_id)
+            if user_information['status'] != 200:
+                return ["Internal Server Error"], 500
+
+            data_version = user_information['data'].pop('data_version')
+            etag = dashboard_etag(user_id, data_version)
+            if request.if_none_match.contains_weak(etag):
+                return set_dashboard_validators(await make_response("", 304), etag)
+
+            encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ""))
+
+            if stream_requested(request.args):
+                chunks = _stream_user_information(user_id, user_information['data']['user'], cursor, endpoints_limit)
+                chunks = compress_stream_async(chunks, encoding) if encoding is not None else _encoded(chunks)
+                response = Response(track_stream_async(chunks), mimetype='application/x-ndjson')
+                set_encoding_headers(response, encoding)
+                return set_dashboard_validators(response, etag)
+
+            if limit is not None or endpoints_limit is not None:
+                collections = await db.get_collections_page(
+                    user_id=user_id, limit=limit or MAX_PAGE_SIZE, cursor=cursor, endpoints_limit=endpoints_limit
+                )
+                if collections['status'] != 200:
+                    return ["Internal Server Error"], 500
+
+                user_information['data'].update({
+                    'collections': [client_collection(collection) for collection in collections['data']['collections']],
+                    'next_cursor': collections['data']['next_cursor'],
+                })
+                return set_dashboard_validators(await make_response(user_information['data'], user_information['status']), etag)
+
+            # Full dashboard: serialized and compressed once per data version and content coding
+            if encoding is not None:
+                body = await dashboard_cache.get_async(user_id, data_version, encoding)
+                if body is not None:
+                    return dashboard_response(Response, body, encoding, etag)
+
+            body = await dashboard_cache.get_async(user_id, data_version)
+            if body is None:
+                collections = await db.get_dashboard_collections(user_id=user_id)
+                if collections['status'] == 200:
+                    user_information['data'].update({'collections': collections['data']['collections']})
+                # 404: the user has no collections yet, the dashboard is the user alone (and still gets its ETag)
+                elif collections['status'] != 404:
+                    return user_information['data'], user_information['status']
+
+                body = app.json.dumps_bytes(user_information['data'])
+                await dashboard_cache.set_async(user_id, data_version, body)
+
+            body, encoding = encode_body(body, encoding)
+            if encoding is not None:
+                await dashboard_cache.set_async(user_id, data_version, body, encoding)
+            return dashboard_response(Response, body, encoding, etag)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/collection-endpoints', methods=['GET'])
+@query_budget(3)
+async def collection_endpoints():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return await _redirect_to_auth()
+
+            collection_title = request.args.get('collection_title')
+            pagination = page_arguments(request.args)
+            if not collection_title or pagination is None:
+                return ['Invalid query arguments.'], 400
+            limit, cursor, _ = pagination
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoints_request = await db.get_endpoints_page(
+                    collection_id=collection_request['data']['collection_id'], limit=limit or MAX_PAGE_SIZE, cursor=cursor
+                )
+                return endpoints_request['data'], endpoints_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/remove-collection', methods=['POST'])
+@query_budget(4)
+async def remove_collection():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return await _redirect_to_auth()
+
+            data = await request.get_json()
+            collection_title = data.get('title')
+            if collection_title:
+                remove_request = await db.remove_collections_from_user(user_id=user_id, collection_title=collection_title)
+                return remove_request['data'], remove_request['status']
+
+            else:
+                return ['Invalid JSON.'], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/add-collection', methods=['POST'])
+@query_budget(5)
+async def add_collection():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return await _redirect_to_auth()
+
+            data = await request.get_json()
+            collection_title = data.get('title')
+            if collection_title:
+                add_request = await db.add_collection(user_id=user_id, collection_title=collection_title)
+                return add_request['data'], add_request['status']
+
+            else:
+                return ['Invalid JSON'], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/add-endpoint', methods=['POST'])
+@query_budget(6)
+async def add_endpoint():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            data = await request.get_json()
+            collection_title = data.get('collection_title')
+            endpoint_json = data.get('endpoint_json')
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                collection_id = collection_request['data']['collection_id']
+                add_endpoint_request = await db.add_endpoint(collection_id=collection_id, endpoint_data=endpoint_json)
+                return add_endpoint_request['data'], add_endpoint_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request, missing_status=400)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/add-endpoints', methods=['POST'])
+@query_budget(5)
+async def add_endpoints():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            data = await request.get_json()
+            collection_title = data.get('collection_title')
+            endpoints_json = data.get('endpoints')
+
+            error = bulk_endpoints_error(collection_title, endpoints_json)
+            if error:
+                return error
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                collection_id = collection_request['data']['collection_id']
+                add_endpoints_request = await db.add_endpoints(collection_id=collection_id, endpoints_data=endpoints_json)
+                return add_endpoints_request['data'], add_endpoints_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request, missing_status=400)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/import-collection', methods=['POST'])
+async def import_collection_endpoint():
+    """
+    Same as app.py. import_collection() runs through AsyncDatabase.run_sync() and reads the parser events
+    while the body arrives (_RequestBodyReader), so its endpoints are inserted in batches of IMPORT_BATCH_SIZE.
+    """
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            parser = import_parser(request.args)
+            if parser is None:
+                return import_format_error()
+
+            import_request = await db.run_sync(
+                import_collection, user_id, parser(_RequestBodyReader(request.body)),
+                collection_title=request.args.get('collection_title'), batch_size=IMPORT_BATCH_SIZE
+            )
+            return import_request['data'], import_request['status']
+
+    except ijson.JSONError as error:
+        print(error)
+        return ["Invalid JSON file."], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+async def _export_collection(exporter, collection_title: str, collection_id: int, order_by_url: bool):
+    """
+    Yields the exported document. The generator runs after the route returned, so it reads
+    the endpoints with its own AsyncDatabase.
+    """
+    async with AsyncDatabase() as db:
+        async for chunk in exporter(collection_title, db.iter_endpoints(collection_id, order_by_url=order_by_url)):
+            yield chunk
+
+
+@app.route('/export-collection', methods=['GET'])
+async def export_collection_endpoint():
+    """
+    Same as app.py: the endpoints are streamed out of a server-side cursor into the document.
+    """
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            collection_title = request.args.get('collection_title')
+            export_format = request.args.get('format', 'postman')
+            exporter = ASYNC_EXPORTERS.get(export_format)
+            if not collection_title or exporter is None:
+                return ['Invalid query arguments.'], 400
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                chunks = _export_collection(
+                    exporter, collection_title, collection_request['data']['collection_id'], export_format == 'openapi'
+                )
+                resp = Response(track_stream_async(_encoded(chunks)), mimetype='application/json')
+                return set_export_headers(resp, export_format)
+
+            else:
+                return collection_error(collection_title, collection_request)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/run-endpoint', methods=['POST'])
+async def run_endpoint():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            data = await request.get_json()
+            collection_title = data.get('collection_title')
+            endpoint_id = data.get('endpoint_id')
+
+            if not collection_title or not endpoint_id:
+                return ['Invalid JSON.'], 400
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoint_request = await db.get_endpoint(collection_request['data']['collection_id'], endpoint_id)
+                if endpoint_request['status'] != 200:
+                    return endpoint_request['data'], endpoint_request['status']
+
+                # Give the connection back to the pool while the request runs
+                await db.rollback()
+                result = await _run_blocking(request_runner.run, endpoint_request['data']['endpoint'], data.get('body'))
+                history_saved(await db.record_endpoint_runs([result]), 1)
+                return result, 200
+
+            else:
+                return collection_error(collection_title, collection_request)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/run-collection', methods=['POST'])
+async def run_collection():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            data = await request.get_json()
+            collection_title = data.get('collection_title')
+
+            if not collection_title:
+                return ['Invalid JSON.'], 400
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                collection_id = collection_request['data']['collection_id']
+                endpoints = await db.run_sync(lambda sync_db: list(sync_db.iter_endpoints(collection_id)))
+                # Give the connection back to the pool while the requests run
+                await db.rollback()
+
+                results = await _run_blocking(request_runner.run_many, endpoints, data.get('body'))
+                history_saved(await db.record_endpoint_runs(results), len(results))
+                return run_collection_summary(collection_title, results), 200
+
+            else:
+                return collection_error(collection_title, collection_request)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/endpoint-history', methods=['GET'])
+async def endpoint_history():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            arguments = history_arguments(request.args, 'limit', 20, MAX_HISTORY_RUNS)
+            if arguments is None:
+                return ['Invalid query arguments.'], 400
+            collection_title, endpoint_id, limit = arguments
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoint_request = await db.get_endpoint(collection_request['data']['collection_id'], endpoint_id)
+                if endpoint_request['status'] != 200:
+                    return endpoint_request['data'], endpoint_request['status']
+
+                history_request = await db.get_endpoint_history(endpoint_id=endpoint_id, limit=limit)
+                return history_request['data'], history_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/endpoint-statistics', methods=['GET'])
+async def endpoint_statistics():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            arguments = history_arguments(request.args, 'hours', 24, MAX_STATISTICS_HOURS)
+            if arguments is None:
+                return ['Invalid query arguments.'], 400
+            collection_title, endpoint_id, hours = arguments
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                endpoint_request = await db.get_endpoint(collection_request['data']['collection_id'], endpoint_id)
+                if endpoint_request['status'] != 200:
+                    return endpoint_request['data'], endpoint_request['status']
+
+                statistics_request = await db.get_endpoint_statistics(endpoint_id=endpoint_id, hours=hours)
+                return statistics_request['data'], statistics_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/run-collection-load', methods=['POST'])
+async def run_collection_load():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["Invalid user ID"], 400
+
+            arguments = load_run_arguments(await request.get_json())
+            if arguments is None:
+                return ['Invalid JSON.'], 400
+            collection_title, run_arguments = arguments
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                collection_id = collection_request['data']['collection_id']
+                endpoints = await db.run_sync(lambda sync_db: list(sync_db.iter_endpoints(collection_id)))
+                # Give the connection back to the pool while the requests run
+                await db.rollback()
+
+                error = load_run_size_error(collection_title, endpoints, run_arguments['iterations'])
+                if error:
+                    return error
+
+                run = CollectionRun(user_id, endpoints, recorder=record_load_run_results, **run_arguments)
+                if not active_runs.add(run):
+                    return ["Too many runs in progress, try again later."], 503
+                run.start()
+
+                async def generate():
+                    try:
+                        async for event in run.stream_async():
+                            yield (json.dumps(event) + "\n").encode("utf-8")
+                    finally:
+                        active_runs.remove(run)
+
+                response = Response(generate(), mimetype='application/x-ndjson')
+                # A run lasts as long as its requests, not the default response timeout
+                response.timeout = None
+                return response
+
+            else:
+                return collection_error(collection_title, collection_request)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/cancel-run', methods=['POST'])
+async def cancel_run():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+        if not user_id:
+            return ["Invalid user ID"], 400
+
+        data = await request.get_json()
+        run_id = data.get('run_id')
+
+        if not run_id:
+            return ['Invalid JSON.'], 400
+
+        if active_runs.cancel(run_id, user_id):
+            return ["Run cancelled."], 200
+        return [f"Run \"{run_id}\" not found."], 404
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/change-endpoint', methods=['POST'])
+@query_budget(7)
+async def change_endpoint():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["No user found!"], 500
+
+            data = await request.get_json()
+            collection_title = data.get('collection_title')
+            endpoint_json = data.get('endpoint_json')
+            endpoint_id = data.get('endpoint_id')
+
+            collection_request = await db.get_collection_id(user_id=user_id, collection_title=collection_title)
+
+            if collection_request['status'] == 200:
+                collection_id = collection_request['data']['collection_id']
+                endpoint_change_request = await db.change_endpoint(endpoint_id, collection_id, endpoint_json)
+                return endpoint_change_request['data'], endpoint_change_request['status']
+
+            else:
+                return collection_error(collection_title, collection_request, missing_status=400)
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/edit-collection', methods=['POST'])
+@query_budget(5)
+async def edit_collection():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["No user found!"], 400
+
+            data = await request.get_json()
+            collection_title = data.get('collection_title')
+            collection_json = data.get('collection_json')
+
+            if collection_title:
+                change_collection_data_request = await db.edit_collection(collection_title=collection_title, collection_json=collection_json)
+                return change_collection_data_request['data'], change_collection_data_request['status']
+            else:
+                return [f"JSON not valid"], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@app.route('/duplicate-collection', methods=['POST'])
+@query_budget(6)
+async def duplicate_collection():
+    try:
+        async with AsyncDatabase() as db:
+            user_id = await validate_session_async(db, request.cookies.get("sid"))
+
+            if not user_id:
+                return ["No user found!"], 400
+
+            data = await request.get_json()
+            collection_title = data.get('collection_title')
+
+            if collection_title:
+                duplicate_request = await db.duplicate_collection(collection_title=collection_title, user_id=user_id)
+                return duplicate_request['data'], duplicate_request['status']
+
+            else:
+                return ['JSON not valid'], 400
+
+    except Exception as error:
+        print(error)
+        return ["Internal Server Error"], 500
+
+
+@auth_routes.route('/login', methods=['POST'])
+@query_budget(5)
+async def login():
+    try:
+        data = await request.get_json()
+        email = data.get("email")
+        password = data.get("password")
+
+        if not email or not password:
+            return ["Login credentials do not match!"], 400
+
+        async with AsyncDatabase() as db:
+            user_request = await db.get_user_by_email(email)
+
+            if user_request['status'] == 404:
+                return ["Login credentials do not match!"], 400
+
+            if user_request['status'] != 200:
+                return [user_request['data']['message']], 400
+
+            user = user_request['data']['user']
+
+            if not await check_password_async(password, user["password"]):
+                return ["Login credentials do not match!"], 400
+
+            if needs_rehash(user["password"]):
+                try:
+                    await db.update_user_password_hash(user["id"], user["password"], await hash_password_async(password))
+                except PasswordHashingBusy:
+                    pass
+                except Exception as error:
+                    print(error)
+
+            raw_token, expires_at = await create_session_async(db, user["id"], days=7)
+
+        resp = await make_response(jsonify({"type": "redirect", "value": "/"}), 200)
+        resp.set_cookie(
+            "sid", raw_token,
+            httponly=True, secure=False, samesite="Lax",
+            max_age=24*3600
+        )
+        return resp
+
+    except PasswordHashingBusy:
+        return ["Server busy, please try again."], 503
+
+    except Exception as error:
+        print(error)
+        return ["Internal error."], 500
+
+
+@auth_routes.route('/register', methods=['POST'])
+@query_budget(7)
+async def register():
+    try:
+        data = await request.get_json()
+        username = data.get("username")
+        email = data.get("email")
+        password = data.get("password")
+        if not is_valid_email(email):
+            return jsonify({"message": "Invalid email format!"}), 400
+
+        password_format_check = check_password_requirements(password)
+
+        if password_format_check:
+            return jsonify(password_format_check), 400
+
+    except Exception as error:
+        print(error)
+        return ["No password or username provided in JSON!"], 400
+
+    try:
+        hashed_password = await hash_password_async(password)
+
+        async with AsyncDatabase() as db:
+            register_response = await db.register_new_user(
+                {"username": username, "email": email, "password": password}, hashed_password
+            )
+
+            if register_response['status'] != 201:
+                return [register_response['data']['message']], register_response['status']
+
+            new_user_id = register_response['data']['user']['id']
+            raw_token, expires_at = await create_session_async(db, new_user_id, days=1)
+
+        resp = await make_response(jsonify({"type": "redirect", "value": "/"}), 201)
+        resp.set_cookie(
+            "sid", raw_token,
+            httponly=True, secure=False, samesite="Lax",
+            max_age=24 * 3600
+        )
+        return resp
+
+    except PasswordHashingBusy:
+        return ["Server busy, please try again."], 503
+
+    except Exception as error:
+        print(error)
+        return ["Internal error."], 500
+
+
+@auth_routes.route('/logout', methods=['DELETE'])
+@query_budget(1)
+async def logout():
+    try:
+        sid = request.cookies.get("sid")
+        if sid:
+            async with AsyncDatabase() as db:
+                await remove_session_id_async(db, sid)
+            resp = await make_response({"message": "Logged out"})
+            resp.delete_cookie("sid", path="/")
+            return resp, 200
+        else:
+            return ["Invalid Session ID."], 500
+    except Exception as error:
+        print(error)
+        return ["Internal error."], 500
+
+
+app.register_blueprint(auth_routes, url_prefix="/auth")
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
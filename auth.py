@@ -1,49 +1,75 @@
 from flask import Blueprint, request, jsonify, make_response
 from database.main import Database
-from utils.hashpasswd import check_password
+from utils.hashpasswd import check_password, hash_password, needs_rehash, PasswordHashingBusy
 from utils.register_checks import is_valid_email, check_password_requirements
 from utils.session import create_session, remove_session_id
+from utils.query_log import query_budget
 auth_routes = Blueprint('auth_routes', __name__)
 
 
+def upgrade_password_hash(database: Database, user_id: int, old_hash: str, password: str) -> None:
+    """
+    Rehashes a verified password with the current work factor.
+    Failures are only logged, they never block the login.
+    """
+    try:
+        database.update_user_password_hash(user_id, old_hash, hash_password(password))
+    except PasswordHashingBusy:
+        # Skip the upgrade under load, it is retried on the next login
+        pass
+    except Exception as error:
+        print(error)
+
+
 @auth_routes.route('/login', methods=['POST'])
+@query_budget(5)
 def login():
     try:
         data = request.get_json()
         email = data.get("email")
         password = data.get("password")
 
+        if not email or not password:
+            return ["Login credentials do not match!"], 400
+
         database = Database()
-        users_request = database.get_all_users_data()
+        user_request = database.get_user_by_email(email)
+
+        if user_request['status'] == 404:
+            return ["Login credentials do not match!"], 400
 
-        if users_request['status'] != 200:
-            return [users_request['data']['message']], 400
+        if user_request['status'] != 200:
+            return [user_request['data']['message']], 400
 
-        for user in users_request['data']['users']:
-            if user["email"] == email:
-                if check_password(password, user["password"]):
-                    # ✅ Creăm sesiune valabilă 1 zi
-                    raw_token, expires_at = create_session(user["id"], days=7)
+        user = user_request['data']['user']
 
-                    resp = make_response(jsonify({"type" : "redirect", "value" : "/"}), 200)
-                    resp.set_cookie(
-                        "sid", raw_token,
-                        httponly=True, secure=False, samesite="Lax",
-                        max_age=24*3600
-                    )
-                    return resp
+        if check_password(password, user["password"]):
+            if needs_rehash(user["password"]):
+                upgrade_password_hash(database, user["id"], user["password"], password)
 
-                else:
-                    return ["Login credentials do not match!"], 400
+            # ✅ Creăm sesiune valabilă 1 zi
+            raw_token, expires_at = create_session(user["id"], days=7)
+
+            resp = make_response(jsonify({"type" : "redirect", "value" : "/"}), 200)
+            resp.set_cookie(
+                "sid", raw_token,
+                httponly=True, secure=False, samesite="Lax",
+                max_age=24*3600
+            )
+            return resp
 
         return ["Login credentials do not match!"], 400
 
+    except PasswordHashingBusy:
+        return ["Server busy, please try again."], 503
+
     except Exception as error:
         print(error)
         return ["Internal error."], 500
 
 
 @auth_routes.route('/register', methods=['POST'])
+@query_budget(7)
 def register():
     try:
         data = request.get_json()
@@ -88,6 +114,7 @@ def register():
         return ["No password or username provided in JSON!"], 400
 
 @auth_routes.route('/logout', methods=['DELETE'])
+@query_budget(1)
 def logout():
 
     try:
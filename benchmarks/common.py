@@ -0,0 +1,38 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import os
+import sys
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def use_benchmark_database(name: str) -> None:
+    """
+    Point database.main at a throwaway database before it is imported.
+    Without DATABASE_URL a temporary SQLite file is used.
+    :param name: name of the SQLite file
+    """
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), name)}")
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples_ms: list) -> dict:
+    """
+    :param samples_ms: latencies in milliseconds
+    :return: dictionary with latency percentiles
+    """
+    return {
+        'count': len(samples_ms),
+        'p50_ms': round(statistics.median(samples_ms), 4),
+        'p95_ms': round(percentile(samples_ms, 95), 4),
+        'p99_ms': round(percentile(samples_ms, 99), 4),
+        'mean_ms': round(statistics.fmean(samples_ms), 4),
+    }
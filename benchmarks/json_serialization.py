@@ -0,0 +1,135 @@
+"""
+Dashboard serialization benchmark.
+
+Builds the /user-information payload of one user with 10k endpoints (100 collections x 100 endpoints
+by default) from driver rows and measures the time and memory allocations of:
+    dicts + json      - to_dict() per row then compact json.dumps(sort_keys=True), what the default Flask provider did
+    dicts + orjson    - same dictionaries, serialized with orjson
+    schemas + orjson  - database.schemas dataclasses serialized by orjson (no intermediate dictionaries)
+    schemas + orjson, raw headers - headers kept as JSON text (orjson >= 3.9 only)
+No database is needed.
+
+Usage:
+    python benchmarks/json_serialization.py [collections] [endpoints per collection]
+"""
+import sys
+import json
+import time
+import tracemalloc
+
+from common import percentile
+
+from database import schemas
+from database.schemas import EndpointSchema, CollectionSchema
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+REPEATS = 20
+
+
+class Row(object):
+    """Stand-in for an ORM object, to_dict() as in database.models."""
+
+    columns = ('id', 'collection_id', 'title', 'url', 'method', 'headers')
+
+    def __init__(self, values: tuple) -> None:
+        for column, value in zip(self.columns, values):
+            setattr(self, column, value)
+
+    def to_client_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'title': self.title,
+            'url': self.url,
+            'method': self.method.lower(),
+            'headers': self.headers,
+        }
+
+
+def make_rows(collections: int, endpoints: int) -> list:
+    """:return: (collection_id, collection_title, endpoint_id, title, url, method, headers JSON text) rows"""
+    rows = []
+    for collection_id in range(1, collections + 1):
+        for index in range(endpoints):
+            endpoint_id = (collection_id - 1) * endpoints + index + 1
+            headers = [{'name': "Authorization", 'value': f"Bearer token-{endpoint_id}"}, {'name': "Accept", 'value': "application/json"}]
+            rows.append((
+                collection_id, f"Collection {collection_id}", endpoint_id, f"Endpoint {endpoint_id}",
+                f"https://api.example.com/v1/resources/{endpoint_id}?expand=items", "GET", json.dumps(headers),
+            ))
+    return rows
+
+
+def build_dicts(rows: list) -> dict:
+    collections = []
+    current_id = None
+    for row in rows:
+        if row[0] != current_id:
+            current_id = row[0]
+            collections.append({'id': row[0], 'user_id': 1, 'title': row[1], 'endpoints': []})
+        endpoint = Row((row[2], row[0], row[3], row[4], row[5], json.loads(row[6])))
+        collections[-1]['endpoints'].append(endpoint.to_client_dict())
+    for collection in collections:
+        collection.pop('id')
+        collection.pop('user_id')
+    return {'user': {'name': "benchmark"}, 'collections': collections}
+
+
+def build_schemas(rows: list, raw_headers: bool) -> dict:
+    schemas.RAW_HEADERS = raw_headers
+    collections = []
+    current_id = None
+    for row in rows:
+        if row[0] != current_id:
+            current_id = row[0]
+            collections.append(CollectionSchema(row[1], []))
+        headers = row[6] if raw_headers else json.loads(row[6])
+        collections[-1].endpoints.append(EndpointSchema.from_row((row[2], row[3], row[4], row[5], headers)))
+    return {'user': {'name': "benchmark"}, 'collections': collections}
+
+
+def measure(name: str, rows: list, build, serialize) -> dict:
+    timings = []
+    size = 0
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        size = len(serialize(build(rows)))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    serialize(build(rows))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'variant': name,
+        'bytes': size,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        # Peak of the memory allocated while building and serializing the payload
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def main() -> None:
+    collections = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    endpoints = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rows = make_rows(collections, endpoints)
+
+    results = [measure("dicts + json", rows, build_dicts, lambda payload: json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8"))]
+    if orjson is None:
+        print("orjson is not installed, only the json module was measured.")
+    else:
+        results.append(measure("dicts + orjson", rows, build_dicts, orjson.dumps))
+        results.append(measure("schemas + orjson", rows, lambda r: build_schemas(r, False), orjson.dumps))
+        if hasattr(orjson, 'Fragment'):
+            results.append(measure("schemas + orjson, raw headers", rows, lambda r: build_schemas(r, True), orjson.dumps))
+
+    print(json.dumps({'collections': collections, 'endpoints': collections * endpoints, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
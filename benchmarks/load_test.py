@@ -0,0 +1,126 @@
+"""
+HTTP load test comparing the WSGI (app.py) and ASGI (asgi_app.py) serving modes.
+
+Opens `concurrency` keep-alive connections to each server and sends GET requests
+to the same path as fast as the server answers. Reports requests per second and latency percentiles.
+Only the standard library is used, so thousands of concurrent clients fit in one process.
+
+Usage (start both servers first, log in and copy the "sid" cookie):
+    gunicorn -w 4 --threads 8 -b 127.0.0.1:5000 app:app
+    hypercorn -w 4 -b 127.0.0.1:8000 asgi_app:app
+    python benchmarks/load_test.py --wsgi http://127.0.0.1:5000 --asgi http://127.0.0.1:8000 \
+        --path /user-information --sid <cookie> --concurrency 1000 --duration 30
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+
+from common import summarize
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    """
+    Reads one HTTP/1.1 response (Content-Length or chunked body).
+    :return: status code
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by the server")
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length", "0")))
+
+    return status
+
+
+async def client(host: str, port: int, request: bytes, deadline: float, samples: list, errors: list) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status = await read_response(reader)
+            if status >= 400:
+                errors.append(status)
+            else:
+                samples.append((time.perf_counter() - start) * 1000)
+    except (ConnectionError, asyncio.IncompleteReadError) as error:
+        errors.append(str(error))
+    finally:
+        writer.close()
+
+
+async def run_load(base_url: str, path: str, sid: str, concurrency: int, duration: float) -> dict:
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    request = (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        f"Cookie: sid={sid}\r\n"
+        f"Connection: keep-alive\r\n\r\n"
+    ).encode("latin-1")
+
+    samples, errors = [], []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(
+        *(client(host, port, request, deadline, samples, errors) for _ in range(concurrency)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+
+    return {
+        'url': base_url + path,
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'requests': len(samples),
+        'errors': len(errors),
+        'requests_per_second': round(len(samples) / elapsed, 2),
+        'latency': summarize(samples) if samples else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wsgi", help="base URL of the WSGI server")
+    parser.add_argument("--asgi", help="base URL of the ASGI server")
+    parser.add_argument("--path", default="/user-information")
+    parser.add_argument("--sid", default="", help="value of the sid session cookie")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=15)
+    args = parser.parse_args()
+
+    if not args.wsgi and not args.asgi:
+        parser.error("at least one of --wsgi / --asgi is required")
+
+    results = {'benchmark': 'load_test'}
+    for mode in ('wsgi', 'asgi'):
+        base_url = getattr(args, mode)
+        if base_url:
+            results[mode] = asyncio.run(run_load(base_url, args.path, args.sid, args.concurrency, args.duration))
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Login burst benchmark for password verification.
+
+Simulates a burst of concurrent logins, one thread per request like a threaded WSGI server,
+and compares running bcrypt directly on the request threads (before) with running it
+through the bounded hashing pool (after). Reports throughput, latency percentiles
+and the number of requests rejected with 503.
+
+Usage:
+    python benchmarks/login_burst.py [requests] [request_threads]
+    PASSWORD_HASH_WORKERS=4 PASSWORD_HASH_QUEUE_SIZE=32 PASSWORD_HASH_ROUNDS=10 python benchmarks/login_burst.py 500 128
+"""
+import sys
+import json
+import time
+import threading
+
+from common import summarize
+
+from utils.hashpasswd import (
+    PasswordHasher, PasswordHashingBusy, _hash_password, _check_password,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE, PASSWORD_HASH_ROUNDS,
+)
+
+PASSWORD = "BenchmarkPassword1!"
+
+
+def run_burst(requests: int, request_threads: int, verify) -> dict:
+    """
+    :param requests: number of logins in the burst
+    :param request_threads: number of concurrent request threads
+    :param verify: function that checks the password
+    """
+    hashed = _hash_password(PASSWORD)
+    samples = []
+    rejected = [0]
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def request_thread():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                assert verify(PASSWORD, hashed)
+                with lock:
+                    samples.append((time.perf_counter() - start) * 1000)
+            except PasswordHashingBusy:
+                with lock:
+                    rejected[0] += 1
+
+    threads = [threading.Thread(target=request_thread) for _ in range(request_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': requests,
+        'succeeded': len(samples),
+        'rejected': rejected[0],
+        'seconds': round(elapsed, 3),
+        'logins_per_second': round(len(samples) / elapsed, 2),
+        'latency': summarize(samples) if samples else None,
+    }
+
+
+def main(requests: int, request_threads: int) -> dict:
+    hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE)
+
+    return {
+        'benchmark': 'login_burst',
+        'rounds': PASSWORD_HASH_ROUNDS,
+        'workers': PASSWORD_HASH_WORKERS,
+        'queue_size': PASSWORD_HASH_QUEUE_SIZE,
+        'request_threads': request_threads,
+        'before': run_burst(requests, request_threads, _check_password),
+        'after': run_burst(requests, request_threads, lambda password, hashed: hasher.run(_check_password, password, hashed)),
+        'after_pool_stats': hasher.stats(),
+    }
+
+
+if __name__ == "__main__":
+    burst_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    burst_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    print(json.dumps(main(burst_requests, burst_threads), indent=2))
@@ -0,0 +1,111 @@
+import os
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from database.main import (
+    Database, select_collection_endpoints, exported_endpoint, DATABASE_URL, DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_TIMEOUT, DATABASE_POOL_RECYCLE, DATABASE_POOL_PRE_PING,
+)
+from database.pool import PoolStats, instrument_engine, pool_status
+from utils.metrics import instrument_queries
+from utils.query_log import instrument_query_log
+
+# Async drivers used for the synchronous DATABASE_URL drivers
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def get_async_database_url() -> str:
+    """
+    DATABASE_ASYNC_URL if it's set, otherwise DATABASE_URL with its async driver.
+    """
+    async_url = os.getenv("DATABASE_ASYNC_URL")
+    if async_url:
+        return async_url
+
+    url = make_url(DATABASE_URL)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
+
+
+async_engine = create_async_engine(
+    get_async_database_url(),
+    pool_size=DATABASE_POOL_SIZE,
+    max_overflow=DATABASE_MAX_OVERFLOW,
+    pool_timeout=DATABASE_POOL_TIMEOUT,
+    pool_recycle=DATABASE_POOL_RECYCLE,
+    pool_pre_ping=DATABASE_POOL_PRE_PING,
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=True)
+
+async_engine_pool_stats = PoolStats()
+instrument_engine(async_engine.sync_engine, async_engine_pool_stats)
+instrument_queries(async_engine.sync_engine)
+instrument_query_log(async_engine.sync_engine)
+
+
+def get_async_pool_status() -> dict:
+    """
+    Method that describes the async connection pool
+    :return: dictionary with pool size and occupancy
+    """
+    return pool_status(async_engine.sync_engine, async_engine_pool_stats)
+
+
+class AsyncDatabase(object):
+    """
+    Async counterpart of Database for the ASGI app.
+
+    Every Database method is available as a coroutine with the same arguments and return value, e.g.
+        async with AsyncDatabase() as db:
+            collections = await db.get_collections_from_user(user_id=user_id)
+
+    The method runs through AsyncSession.run_sync(), so the queries are the ones in database.main
+    but the connection I/O goes through the async driver and never blocks the event loop.
+    Database methods that hash passwords must receive the hash computed with utils.hashpasswd
+    *_async helpers, bcrypt would block the event loop otherwise.
+    """
+
+    def __init__(self) -> None:
+        self.session: AsyncSession = AsyncSessionLocal()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            await self.session.rollback()
+        await self.close()
+
+    async def close(self) -> None:
+        await self.session.close()
+
+    async def run_sync(self, function, *args, **kwargs):
+        """
+        Runs function(Database, *args, **kwargs) on the session, for code written against Database
+        (e.g. utils.collection_formats.import_collection or reading all of Database.iter_endpoints()).
+        """
+        return await self.session.run_sync(lambda sync_session: function(Database(sync_session), *args, **kwargs))
+
+    async def iter_endpoints(self, collection_id: int, order_by_url: bool = False, batch_size: int = 500):
+        """
+        Async counterpart of Database.iter_endpoints(): the rows come from a server-side cursor
+        (AsyncSession.stream()) in batches of `batch_size`, so an export never holds the whole collection.
+        """
+        rows = await self.session.stream(
+            select_collection_endpoints(collection_id, order_by_url).execution_options(yield_per=batch_size)
+        )
+        async for row in rows:
+            yield exported_endpoint(row)
+
+    def __getattr__(self, name: str):
+        method = getattr(Database, name)
+
+        async def call(*args, **kwargs):
+            return await self.run_sync(method, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
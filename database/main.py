@@ -1,14 +1,26 @@
 import os
+from datetime import datetime, timedelta
+from flask import g, has_app_context
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, text, inspect
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, func, insert, update, select, literal, cast, Text
+from sqlalchemy.orm import sessionmaker, selectinload
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from dotenv import load_dotenv
 
-from database.models import User, ClientSession, Collection, Endpoint
-from utils.hashpasswd import hash_password
+from database.models import User, ClientSession, Collection, Endpoint, EndpointRun, EndpointRunRollup
+from database.schemas import EndpointSchema, CollectionSchema, RAW_HEADERS
+from database.pool import PoolStats, InstrumentedQueuePool, instrument_engine, pool_status
+from utils.hashpasswd import hash_password, PasswordHashingBusy
 from utils.string_manupulation import normalize_title, generate_duplicate_title
+from utils.dashboard_cache import dashboard_cache
+from utils.metrics import instrument_queries
+from utils.query_log import instrument_query_log
+from utils.run_history import run_row, rollup_rows, histogram_percentiles, decompress_body
 
-load_dotenv('./.env')
+# .env file at the root of the project, whatever the working directory is
+ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
+load_dotenv(ENV_FILE)
 
 DATABASE_HOST=os.getenv("DATABASE_HOST")
 DATABASE_PORT=os.getenv("DATABASE_PORT")
@@ -16,27 +28,119 @@ DATABASE_USERNAME=os.getenv("DATABASE_USERNAME")
 DATABASE_PASSWORD=os.getenv("DATABASE_PASSWORD")
 DATABASE_NAME=os.getenv("DATABASE_DBNAME")
 
-DATABASE_URL = f"postgresql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
-engine = create_engine(DATABASE_URL)
+# Connection pool settings
+DATABASE_POOL_SIZE=int(os.getenv("DATABASE_POOL_SIZE", "10"))
+DATABASE_MAX_OVERFLOW=int(os.getenv("DATABASE_MAX_OVERFLOW", "20"))
+DATABASE_POOL_TIMEOUT=float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+DATABASE_POOL_RECYCLE=int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+DATABASE_POOL_PRE_PING=os.getenv("DATABASE_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+)
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DATABASE_POOL_SIZE,
+    max_overflow=DATABASE_MAX_OVERFLOW,
+    pool_timeout=DATABASE_POOL_TIMEOUT,
+    pool_recycle=DATABASE_POOL_RECYCLE,
+    pool_pre_ping=DATABASE_POOL_PRE_PING,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Keys every endpoint json must have when it's created
+REQUIRED_ENDPOINT_KEYS = ['title', 'url', 'method', 'headers']
+
+engine_pool_stats = PoolStats()
+instrument_engine(engine, engine_pool_stats)
+instrument_queries(engine)
+instrument_query_log(engine)
+
+
+def get_db_session() -> Session:
+    """
+    Returns the database session of the current Flask request. The session is created
+    on first use and released by close_db_session() when the request ends.
+    Outside a request a new session is returned and the caller is responsible for closing it.
+    """
+    if has_app_context():
+        if 'db_session' not in g:
+            g.db_session = SessionLocal()
+        return g.db_session
+
+    return SessionLocal()
+
+
+def close_db_session(exception=None) -> None:
+    """
+    Teardown hook that gives the request session connection back to the pool.
+    :param exception: exception that ended the request (if any)
+    """
+    db_session = g.pop('db_session', None)
+    if db_session is not None:
+        if exception is not None:
+            db_session.rollback()
+        db_session.close()
+
+
+def get_pool_status() -> dict:
+    """
+    Method that describes the connection pool
+    :return: dictionary with pool size, occupancy and checkout latency
+    """
+    return pool_status(engine, engine_pool_stats)
+
+
+def select_collection_endpoints(collection_id: int, order_by_url: bool = False):
+    """
+    Query of the endpoints of a collection read by the exports (Database.iter_endpoints() and its
+    AsyncDatabase counterpart).
+    :param collection_id: ID of the collection
+    :param order_by_url: order by URL instead of ID
+    :return: select statement of (id, title, url, method, headers)
+    """
+    order = (Endpoint.url, Endpoint.id) if order_by_url else (Endpoint.id,)
+    return (
+        select(Endpoint.id, Endpoint.title, Endpoint.url, Endpoint.method, Endpoint.headers)
+        .where(Endpoint.collection_id == collection_id)
+        .order_by(*order)
+    )
+
+
+def exported_endpoint(row) -> dict:
+    """:return: endpoint dictionary of a select_collection_endpoints() row"""
+    return {
+        'id': row.id,
+        'title': row.title,
+        'url': row.url,
+        'method': row.method,
+        'headers': row.headers,
+    }
+
 
 class Database(object):
 
-    def __init__(self) -> None:
-        # The connection with the database it's initialized the moment when the
-        # Database() object is created.
-        self.connection_response = self.get_connection()
+    def __init__(self, db_session: Session = None) -> None:
+        # The session is shared with every other Database() object created during the same
+        # request. No connection is taken from the pool until the first query runs.
+        # An explicit session is used as-is and owned by the caller (see database.async_main).
+        if db_session is not None:
+            self.owns_session = False
+            self.connection_response = {"status": 200, "connection": db_session}
+        else:
+            self.owns_session = not has_app_context()
+            self.connection_response = self.get_connection()
 
     @staticmethod
     def get_connection() -> dict:
         """
-        Method that connects to the database
+        Method that returns the database session (liveness is checked by the pool pre-ping)
         :return: dictionary with connection information or error information
         """
         try:
-            db_session = SessionLocal()
-            db_session.execute(text('SELECT 1'))  # simple query to test connection
+            db_session = get_db_session()
 
             return {
                 "status": 200,
@@ -52,10 +156,47 @@ class Database(object):
                 }
             }
 
-    def register_new_user(self, data : dict) -> dict:
+    def close(self) -> None:
+        """
+        Closes the session if it was created outside a Flask request.
+        Request sessions are closed by the teardown hook.
+        """
+        if self.owns_session and self.connection_response['status'] == 200:
+            self.connection_response['connection'].close()
+
+    def rollback(self) -> None:
+        """
+        Rolls back a failed transaction so the shared request session stays usable.
+        """
+        if self.connection_response['status'] == 200:
+            try:
+                self.connection_response['connection'].rollback()
+            except Exception as error:
+                print(error)
+
+    @staticmethod
+    def _bump_data_version(session: Session, user_id: int = None, collection_id: int = None) -> None:
+        """
+        Increments the data version of a user (ETag of /user-information) in the transaction of the change
+        and drops the cached dashboard of the user.
+        :param user_id: ID of the user, or
+        :param collection_id: ID of one of the user's collections
+        """
+        statement = update(User).values(data_version=User.data_version + 1)
+        if user_id is not None:
+            session.execute(statement.where(User.id == user_id))
+        else:
+            owner = select(Collection.user_id).where(Collection.id == collection_id).scalar_subquery()
+            user_id = session.execute(statement.where(User.id == owner).returning(User.id)).scalar()
+
+        if user_id is not None:
+            dashboard_cache.invalidate(user_id)
+
+    def register_new_user(self, data : dict, hashed_password: str = None) -> dict:
         """
         Method that registers a new user
         :param data: Dictionary with user information
+        :param hashed_password: already computed password hash (if None, data['password'] is hashed here)
         :return: Dictionary with new user information or error information
         """
         if self.connection_response['status'] == 200:
@@ -81,7 +222,8 @@ class Database(object):
                     }
                 else:
 
-                    hashed_password = hash_password(data['password'])
+                    if hashed_password is None:
+                        hashed_password = hash_password(data['password'])
 
                     new_user = User(
                         username=data['username'],
@@ -101,7 +243,18 @@ class Database(object):
                         }
                     }
 
+            except PasswordHashingBusy as error:
+                self.rollback()
+
+                return {
+                    'status': 503,
+                    'data' : {
+                        'message': str(error)
+                    }
+                }
+
             except Exception as error:
+                self.rollback()
 
                 return {
                     'status': 500,
@@ -110,9 +263,6 @@ class Database(object):
                     }
                 }
 
-            finally:
-                session.close()
-
         else:
             return self.connection_response
 
@@ -121,7 +271,7 @@ class Database(object):
         """
         Method that gets all users data
         :param user_id ID of the user to look for. If it's 0 all users are returned
-        :return: dictionary with all users data or error information
+        :return: dictionary with all users data (and the data_version of a single user) or error information
         """
         try:
 
@@ -136,7 +286,8 @@ class Database(object):
                         'data': {
                             'user': {
                                 'name':user.username
-                            }
+                            },
+                            'data_version': user.data_version
                         }
                     }
 
@@ -155,6 +306,7 @@ class Database(object):
                 return self.connection_response
 
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -163,6 +315,114 @@ class Database(object):
                     }
             }
 
+    def get_user_by_email(self, email: str) -> dict:
+        """
+        Method that gets the login data of a user by email (uses the unique index on users.email)
+        :param email: email of the user
+        :return: dictionary with user id, username, email and password hash or error information
+        """
+        return self._get_user_login_data(User.email, email)
+
+    def get_user_by_username(self, username: str) -> dict:
+        """
+        Method that gets the login data of a user by username (uses the unique index on users.username)
+        :param username: username of the user
+        :return: dictionary with user id, username, email and password hash or error information
+        """
+        return self._get_user_login_data(User.username, username)
+
+    def _get_user_login_data(self, column, value: str) -> dict:
+        """
+        Single indexed lookup that fetches only the columns needed to authenticate a user.
+        :param column: unique User column to filter on
+        :param value: value to look for
+        :return: dictionary with user login data or error information
+        """
+        try:
+
+            if self.connection_response['status'] == 200:
+
+                session: Session = self.connection_response["connection"]
+
+                user = (
+                    session.query(User.id, User.username, User.email, User.password)
+                    .filter(column == value)
+                    .first()
+                )
+
+                if user:
+                    return {
+                        'status': 200,
+                        'data': {
+                            'user': {
+                                'id': user.id,
+                                'username': user.username,
+                                'email': user.email,
+                                'password': user.password,
+                            }
+                        }
+                    }
+                else:
+                    return {
+                        'status': 404,
+                        'data': {'message': "User not found!"}
+                    }
+
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
+    def update_user_password_hash(self, user_id: int, old_hash: str, new_hash: str) -> dict:
+        """
+        Method that replaces the stored password hash of a user (work factor upgrade).
+        The hash is only replaced if it wasn't changed in the meantime.
+        :param user_id: ID of the user
+        :param old_hash: password hash that was verified
+        :param new_hash: new password hash
+        :return: dictionary with update information or error information
+        """
+        try:
+
+            if self.connection_response['status'] == 200:
+
+                session: Session = self.connection_response["connection"]
+
+                updated = (
+                    session.query(User)
+                    .filter(User.id == user_id, User.password == old_hash)
+                    .update({User.password: new_hash}, synchronize_session=False)
+                )
+                session.commit()
+
+                if updated:
+                    return {
+                        'status': 200,
+                        'data': {'message': "Password hash updated!"}
+                    }
+                else:
+                    return {
+                        'status': 409,
+                        'data': {'message': "Password hash changed in the meantime!"}
+                    }
+
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
     def create_session(self, user_id, session_hash, expires_at) -> dict:
         """
         Method that creates a new session
@@ -203,6 +463,7 @@ class Database(object):
             else:
                 return self.connection_response
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -211,7 +472,9 @@ class Database(object):
 
     def validate_session(self, session_hash: str) -> dict:
         """
-        Method to validate the session
+        Method to validate the session (single lookup on the unique session_hash index,
+        expired sessions are treated as missing even before the cleanup job deletes them)
+        :param session_hash: hash of the user session
         :return: dictionary with validation data or error information
         """
         try:
@@ -220,7 +483,14 @@ class Database(object):
 
                 session: Session = self.connection_response["connection"]
 
-                client_session = session.query(ClientSession).filter(ClientSession.session_hash == session_hash).first()
+                client_session = (
+                    session.query(ClientSession.user_id, ClientSession.expires_at)
+                    .filter(
+                        ClientSession.session_hash == session_hash,
+                        ClientSession.expires_at > datetime.now()
+                    )
+                    .first()
+                )
 
                 if client_session:
                     return {
@@ -228,6 +498,7 @@ class Database(object):
                         'data': {
                             'message': "Session token valid!",
                             'user_id' : client_session.user_id,
+                            'expires_at': client_session.expires_at,
                         }
                     }
                 else:
@@ -240,6 +511,7 @@ class Database(object):
                 return self.connection_response
 
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -258,15 +530,14 @@ class Database(object):
             if self.connection_response['status'] == 200:
                 session: Session = self.connection_response["connection"]
 
-                client_session = (
+                deleted = (
                     session.query(ClientSession)
                     .filter(ClientSession.session_hash == session_hash)
-                    .first()
+                    .delete(synchronize_session=False)
                 )
+                session.commit()
 
-                if client_session:
-                    session.delete(client_session)
-                    session.commit()
+                if deleted:
                     return {
                         'status': 200,
                         'data': {'message': "Session deleted!"}
@@ -281,6 +552,7 @@ class Database(object):
                 return self.connection_response
 
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -290,6 +562,8 @@ class Database(object):
     def get_collections_from_user(self, user_id: int) -> dict:
         """
         Method to get all collections (this includes as well the endpoints) from a user.
+        The endpoints of every collection are loaded with one extra SELECT ... IN query,
+        so the number of queries doesn't grow with the number of collections.
         :usage: On the DASHBOARD of the frontend
         :param user_id: ID of the user
         :return: dictionary with all collections or error information
@@ -298,17 +572,73 @@ class Database(object):
 
             if self.connection_response['status'] == 200:
                 session: Session = self.connection_response["connection"]
-                collections = session.query(Collection).filter(Collection.user_id == user_id).all()
+                collections = (
+                    session.query(Collection)
+                    .options(selectinload(Collection.endpoints))
+                    .filter(Collection.user_id == user_id)
+                    .order_by(Collection.id)
+                    .all()
+                )
 
                 if collections:
-                    collections = [collection.to_dict() for collection in collections]
-                    for collection in collections:
-                        collection_id = collection['id']
-                        endpoints = self.get_endpoints_from_collection(collection_id)
+                    collections = [
+                        {
+                            **collection.to_dict(),
+                            'endpoints': [endpoint.to_client_dict() for endpoint in collection.endpoints]
+                        }
+                        for collection in collections
+                    ]
+
+                    return {
+                        'status': 200,
+                        'data': {'collections': collections}
+                    }
+                else:
+                    return {
+                        'status': 404,
+                        'data': {'message': "Collection not found!"}
+                    }
+            else:
+                return self.connection_response
 
-                        if endpoints['status'] == 200:
-                            collections[collections.index(collection)].update(endpoints['data'])
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
 
+    def get_dashboard_collections(self, user_id: int) -> dict:
+        """
+        Method to get all collections with their endpoints as response schemas (database.schemas).
+        One SELECT (collections LEFT JOIN endpoints) returning plain columns: no ORM objects are built.
+        :usage: On the DASHBOARD of the frontend (full payload)
+        :param user_id: ID of the user
+        :return: dictionary with CollectionSchema objects or error information
+        """
+        try:
+
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+                headers = cast(Endpoint.headers, Text) if RAW_HEADERS else Endpoint.headers
+                rows = session.execute(
+                    select(Collection.id, Collection.title, Endpoint.id, Endpoint.title, Endpoint.url, Endpoint.method, headers)
+                    .outerjoin(Endpoint, Endpoint.collection_id == Collection.id)
+                    .where(Collection.user_id == user_id)
+                    .order_by(Collection.id, Endpoint.id)
+                )
+
+                collections = []
+                current_id = None
+                for row in rows:
+                    if row[0] != current_id:
+                        current_id = row[0]
+                        collections.append(CollectionSchema(row[1], []))
+                    if row[2] is not None:
+                        collections[-1].endpoints.append(EndpointSchema.from_row(row[2:]))
+
+                if collections:
                     return {
                         'status': 200,
                         'data': {'collections': collections}
@@ -322,6 +652,253 @@ class Database(object):
                 return self.connection_response
 
         except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
+    def get_collections_page(self, user_id: int, limit: int, cursor: int = 0, endpoints_limit: int = None) -> dict:
+        """
+        Method to get one page of collections (with their endpoints) from a user, ordered by ID.
+        :usage: On the DASHBOARD of the frontend (paginated and streamed mode)
+        :param user_id: ID of the user
+        :param limit: maximum number of collections in the page
+        :param cursor: ID of the last collection from the previous page (0 for the first page)
+        :param endpoints_limit: maximum number of endpoints returned for each collection (None for all of them).
+                                The remaining endpoints are fetched with get_endpoints_page().
+        :return: dictionary with the collections and the cursor of the next page (None on the last page)
+                 or error information
+        """
+        try:
+
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+                query = (
+                    session.query(Collection)
+                    .filter(Collection.user_id == user_id, Collection.id > cursor)
+                    .order_by(Collection.id)
+                    .limit(limit + 1)
+                )
+                if endpoints_limit is None:
+                    query = query.options(selectinload(Collection.endpoints))
+
+                collections = query.all()
+                next_cursor = collections[limit - 1].id if len(collections) > limit else None
+                collections = collections[:limit]
+
+                if endpoints_limit is None:
+                    client_collections = [
+                        {
+                            **collection.to_dict(),
+                            'endpoints': [endpoint.to_client_dict() for endpoint in collection.endpoints]
+                        }
+                        for collection in collections
+                    ]
+                else:
+                    endpoints_by_collection = self._get_first_endpoints(
+                        session, [collection.id for collection in collections], endpoints_limit + 1
+                    )
+                    client_collections = []
+                    for collection in collections:
+                        endpoints = endpoints_by_collection.get(collection.id, [])
+                        client_collections.append({
+                            **collection.to_dict(),
+                            'endpoints': [endpoint.to_client_dict() for endpoint in endpoints[:endpoints_limit]],
+                            'endpoints_next_cursor': endpoints[endpoints_limit - 1].id if len(endpoints) > endpoints_limit else None,
+                        })
+
+                return {
+                    'status': 200,
+                    'data': {
+                        'collections': client_collections,
+                        'next_cursor': next_cursor
+                    }
+                }
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
+    @staticmethod
+    def _get_first_endpoints(session: Session, collection_ids: list, limit: int) -> dict:
+        """
+        Loads the first `limit` endpoints of every collection with a single windowed query.
+        :param session: database session
+        :param collection_ids: IDs of the collections
+        :param limit: maximum number of endpoints per collection
+        :return: dictionary collection_id -> list of Endpoint ordered by ID
+        """
+        if not collection_ids:
+            return {}
+
+        ranked = (
+            session.query(
+                Endpoint.id.label('id'),
+                func.row_number().over(partition_by=Endpoint.collection_id, order_by=Endpoint.id).label('position')
+            )
+            .filter(Endpoint.collection_id.in_(collection_ids))
+            .subquery()
+        )
+        endpoints = (
+            session.query(Endpoint)
+            .join(ranked, ranked.c.id == Endpoint.id)
+            .filter(ranked.c.position <= limit)
+            .order_by(Endpoint.collection_id, Endpoint.id)
+            .all()
+        )
+
+        endpoints_by_collection = {}
+        for endpoint in endpoints:
+            endpoints_by_collection.setdefault(endpoint.collection_id, []).append(endpoint)
+
+        return endpoints_by_collection
+
+    def get_endpoint(self, collection_id: int, endpoint_id: int) -> dict:
+        """
+        Method to get one endpoint of a collection.
+        :param collection_id: ID of the collection
+        :param endpoint_id: ID of the endpoint
+        :return: dictionary with the endpoint or error information
+        """
+        try:
+
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+                endpoint = (
+                    session.query(Endpoint)
+                    .filter(Endpoint.id == endpoint_id, Endpoint.collection_id == collection_id)
+                    .first()
+                )
+
+                if endpoint:
+                    return {
+                        'status': 200,
+                        'data': {'endpoint': endpoint.to_client_dict()}
+                    }
+                else:
+                    return {
+                        'status': 404,
+                        'data': {'message': "Endpoint not found!"}
+                    }
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
+    def get_endpoints_page(self, collection_id: int, limit: int, cursor: int = 0) -> dict:
+        """
+        Method to get one page of endpoints from a collection, ordered by ID.
+        :param collection_id: ID of the collection
+        :param limit: maximum number of endpoints in the page
+        :param cursor: ID of the last endpoint from the previous page (0 for the first page)
+        :return: dictionary with the endpoints and the cursor of the next page (None on the last page)
+                 or error information
+        """
+        try:
+
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+                endpoints = (
+                    session.query(Endpoint)
+                    .filter(Endpoint.collection_id == collection_id, Endpoint.id > cursor)
+                    .order_by(Endpoint.id)
+                    .limit(limit + 1)
+                    .all()
+                )
+                next_cursor = endpoints[limit - 1].id if len(endpoints) > limit else None
+
+                return {
+                    'status': 200,
+                    'data': {
+                        'endpoints': [endpoint.to_client_dict() for endpoint in endpoints[:limit]],
+                        'next_cursor': next_cursor
+                    }
+                }
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
+    def iter_endpoints(self, collection_id: int, order_by_url: bool = False, batch_size: int = 500):
+        """
+        Generator over all endpoints of a collection, read with a server-side cursor in batches
+        of `batch_size` rows (used by the streamed exports). Errors are raised to the caller.
+        :param collection_id: ID of the collection
+        :param order_by_url: order by URL instead of ID
+        :param batch_size: rows fetched per round trip
+        :return: iterator of endpoint dictionaries (id, title, url, method, headers)
+        """
+        if self.connection_response['status'] != 200:
+            raise ConnectionError(self.connection_response['data']['message'])
+
+        session: Session = self.connection_response["connection"]
+        rows = session.execute(
+            select_collection_endpoints(collection_id, order_by_url).execution_options(yield_per=batch_size)
+        )
+
+        for row in rows:
+            yield exported_endpoint(row)
+
+    def release_loaded_rows(self) -> None:
+        """
+        Detaches every loaded row from the session so long-running reads (streamed responses)
+        don't keep all of them in memory.
+        """
+        if self.connection_response['status'] == 200:
+            self.connection_response['connection'].expunge_all()
+
+    def get_collection_id(self, user_id: int, collection_title: str) -> dict:
+        """
+        Method to get the ID of a collection by its title (uses the unique index on collections(user_id, title)).
+        :param user_id: ID of the user
+        :param collection_title: Title of the collection
+        :return: dictionary with the collection ID or error information
+        """
+        try:
+
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+                collection_id = (
+                    session.query(Collection.id)
+                    .filter(Collection.user_id == user_id, Collection.title == collection_title)
+                    .scalar()
+                )
+
+                if collection_id:
+                    return {
+                        'status': 200,
+                        'data': {'collection_id': collection_id}
+                    }
+                else:
+                    return {
+                        'status': 404,
+                        'data': {'message': "Collection not found!"}
+                    }
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -339,13 +916,14 @@ class Database(object):
 
             if self.connection_response['status'] == 200:
                 session: Session = self.connection_response["connection"]
-                endpoints = session.query(Endpoint).filter(Endpoint.collection_id == collection_id).all()
-
-                endpoints = [endpoint.to_dict() for endpoint in endpoints]
+                endpoints = (
+                    session.query(Endpoint)
+                    .filter(Endpoint.collection_id == collection_id)
+                    .order_by(Endpoint.id)
+                    .all()
+                )
 
-                for endpoint in endpoints:
-                    del endpoints[endpoints.index(endpoint)]['collection_id']
-                    endpoints[endpoints.index(endpoint)]['method'] = endpoints[endpoints.index(endpoint)]['method'].lower()
+                endpoints = [endpoint.to_client_dict() for endpoint in endpoints]
 
                 return {
                     'status': 200,
@@ -355,6 +933,7 @@ class Database(object):
                 return self.connection_response
 
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -375,6 +954,7 @@ class Database(object):
 
                 if collection:
                     session.delete(collection)
+                    self._bump_data_version(session, user_id=user_id)
                     session.commit()
                     return {
                         'status': 200,
@@ -389,6 +969,7 @@ class Database(object):
                 return self.connection_response
 
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -415,6 +996,7 @@ class Database(object):
                 else:
                     new_collection = Collection(title=collection_title, user_id=user_id)
                     session.add(new_collection)
+                    self._bump_data_version(session, user_id=user_id)
                     session.commit()
                     session.refresh(new_collection)
                     return {
@@ -425,6 +1007,7 @@ class Database(object):
                 return self.connection_response
 
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -446,9 +1029,7 @@ class Database(object):
         :return: Dictionary with endpoint add request status message or error information
         """
 
-        required_endpoint_data_keys = ['title', 'url', 'method', 'headers']
-
-        for key in required_endpoint_data_keys:
+        for key in REQUIRED_ENDPOINT_KEYS:
             if key not in endpoint_data.keys():
                 return {
                     'status': 400,
@@ -474,6 +1055,7 @@ class Database(object):
                                         headers=endpoint_data['headers'])
 
                     session.add(new_endpoint)
+                    self._bump_data_version(session, collection_id=collection_id)
                     session.commit()
                     session.refresh(new_endpoint)
                     return {
@@ -484,6 +1066,7 @@ class Database(object):
                 return self.connection_response
 
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -491,6 +1074,86 @@ class Database(object):
             }
 
 
+    def add_endpoints(self, collection_id: int, endpoints_data: list) -> dict:
+        """
+        Method to add many endpoints to an existing collection in one transaction.
+        Every item is validated first, duplicated titles (inside the list or already in the collection)
+        are found with a single query and the valid items are inserted with a multi-row INSERT.
+        :param collection_id:  ID of the collection
+        :param endpoints_data: List of endpoint dictionaries (same format as in add_endpoint())
+        :return: Dictionary with the result of every item (in the same order) or error information
+        """
+        results = []
+        valid_items = {}
+
+        for index, endpoint_data in enumerate(endpoints_data):
+            result = {'index': index, 'title': None, 'status': 201, 'message': "Endpoint added successfully!"}
+            results.append(result)
+
+            if not isinstance(endpoint_data, dict):
+                result.update({'status': 400, 'message': "Endpoint json must be an object!"})
+                continue
+
+            result['title'] = endpoint_data.get('title')
+            missing_key = next((key for key in REQUIRED_ENDPOINT_KEYS if key not in endpoint_data), None)
+            if missing_key:
+                result.update({'status': 400, 'message': f"\'{missing_key}\' in endpoint json is required!"})
+            elif not isinstance(endpoint_data['title'], str) or not isinstance(endpoint_data['method'], str):
+                result.update({'status': 400, 'message': "Endpoint title and method must be strings!"})
+            elif endpoint_data['title'] in valid_items:
+                result.update({'status': 400, 'message': f"Endpoint with title \"{endpoint_data['title']}\" is duplicated in the request!"})
+            else:
+                valid_items[endpoint_data['title']] = (result, endpoint_data)
+
+        try:
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+
+                if valid_items:
+                    existing_titles = {
+                        title for (title,) in
+                        session.query(Endpoint.title)
+                        .filter(Endpoint.collection_id == collection_id, Endpoint.title.in_(list(valid_items)))
+                    }
+
+                    rows = []
+                    for title, (result, endpoint_data) in valid_items.items():
+                        if title in existing_titles:
+                            result.update({'status': 400, 'message': f"Endpoint with title \"{title}\" already exists!"})
+                        else:
+                            rows.append({
+                                'title': title,
+                                'collection_id': collection_id,
+                                'url': endpoint_data['url'],
+                                'method': endpoint_data['method'].upper(),
+                                'headers': endpoint_data['headers'],
+                            })
+
+                    if rows:
+                        session.execute(insert(Endpoint), rows)
+                        self._bump_data_version(session, collection_id=collection_id)
+                        session.commit()
+
+                created = sum(1 for result in results if result['status'] == 201)
+                return {
+                    'status': 201 if created else 400,
+                    'data': {
+                        'created': created,
+                        'failed': len(results) - created,
+                        'results': results
+                    }
+                }
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
     def change_endpoint(self, id_: int, collection_id: int, endpoint_data: dict) -> dict:
         """
         Method to change a specific endpoint to an existing collection.
@@ -545,6 +1208,7 @@ class Database(object):
                                     endpoint_data[column] = endpoint_data[column].upper()
                                 setattr(endpoint, column, endpoint_data[column])
 
+                        self._bump_data_version(session, collection_id=endpoint.collection_id)
                         session.commit()
                         session.refresh(endpoint)
 
@@ -565,6 +1229,7 @@ class Database(object):
                         'data': {'message': "Internal server error!"}
                     }
             except Exception as error:
+                self.rollback()
                 print(error)
                 return {
                     'status': 400,
@@ -589,6 +1254,7 @@ class Database(object):
                         if hasattr(collection, column):
                             setattr(collection, column, collection_json[column])
 
+                    self._bump_data_version(session, user_id=collection.user_id)
                     session.commit()
                     session.refresh(collection)
 
@@ -610,6 +1276,7 @@ class Database(object):
                 }
 
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
@@ -620,6 +1287,8 @@ class Database(object):
     def duplicate_collection(self, collection_title: str, user_id: int) -> dict:
         """
         Method to duplicate collection data.
+        The endpoints are copied by the database with a single INSERT ... SELECT and the "(n)" suffix
+        of the new title is computed only from the titles of this user that start with the same base.
         :param collection_title: Title of the collection
         :param user_id: ID of the user
         :return: Dictionary with collection add request status message or error information
@@ -627,42 +1296,45 @@ class Database(object):
         try:
             if self.connection_response['status'] == 200:
                 session: Session = self.connection_response["connection"]
-                collection = session.query(Collection).filter(Collection.title == collection_title, Collection.user_id == user_id).first()
+                collection_id = (
+                    session.query(Collection.id)
+                    .filter(Collection.title == collection_title, Collection.user_id == user_id)
+                    .scalar()
+                )
 
-                if collection:
+                if collection_id:
 
-                    # new_collection = Collection(user_id=user_id, title=collection_title)
                     norm_title = normalize_title(collection_title)
-                    collections = (session.query(Collection).filter(Collection.title.like(f"{norm_title}%")).all())
-
-                    titles = [collection.title for collection in collections]
+                    # The (user_id, title) index narrows the scan to this user's collections; LIKE '<base>%' is only a
+                    # filter on them (a default collation btree can't serve a LIKE prefix without text_pattern_ops)
+                    titles = [
+                        title for (title,) in
+                        session.query(Collection.title)
+                        .filter(Collection.user_id == user_id, Collection.title.startswith(norm_title, autoescape=True))
+                    ]
                     new_title = generate_duplicate_title(norm_title, titles)
 
-
                     new_collection = Collection(user_id= user_id, title=new_title)
                     session.add(new_collection)
                     session.flush()
 
-                    endpoints = session.query(Endpoint).filter(Endpoint.collection_id == collection.id).all()
-                    endpoints_cols = [c.key for c in inspect(Endpoint).mapper.column_attrs]
                     skip = {"id", "created_at", "updated_at", "collection_id"}
-
-                    new_endpoints = []
-
-                    for ep in endpoints:
-                        data = {col: getattr(ep, col) for col in endpoints_cols if col not in skip}
-                        # dacă ai câmpuri UNIQ pe endpoint (ex. name), poate vrei să le ajustezi aici
-                        clone = Endpoint(**data)
-                        clone.collection_id = new_collection.id
-                        new_endpoints.append(clone)
-
-                    session.add_all(new_endpoints)
+                    copied_columns = [column for column in Endpoint.__table__.columns if column.name not in skip]
+
+                    session.execute(
+                        insert(Endpoint.__table__).from_select(
+                            ['collection_id'] + [column.name for column in copied_columns],
+                            select(literal(new_collection.id), *copied_columns)
+                            .where(Endpoint.collection_id == collection_id)
+                            .order_by(Endpoint.id)
+                        )
+                    )
+                    self._bump_data_version(session, user_id=user_id)
                     session.commit()
-                    session.refresh(new_collection)
 
                     return {
                         'status': 200,
-                        'data': {'message': "Collection added successfully!"}
+                        'data': {'message': "Collection added successfully!", 'title': new_title}
                     }
 
                 else:
@@ -673,8 +1345,151 @@ class Database(object):
             else:
                 return self.connection_response
         except Exception as error:
+            self.rollback()
             print(error)
             return {
                 'status': 400,
                 'data': {'message': "Internal server error!"}
-            }
\ No newline at end of file
+            }
+
+    def record_endpoint_runs(self, results: list) -> dict:
+        """
+        Method to save runner results in the run history: one multi-row INSERT of the raw runs
+        and one upsert of the hourly rollups, in the same transaction.
+        :param results: result dictionaries of utils.request_runner.RequestRunner.run()
+        :return: Dictionary with the number of runs saved or error information
+        """
+        try:
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+                ran_at = datetime.now()
+                rows = [run_row(result, ran_at) for result in results if result.get('endpoint_id')]
+
+                if rows:
+                    sqlite = session.get_bind().dialect.name == 'sqlite'
+                    if sqlite:
+                        # (id, ran_at) is no rowid alias on SQLite, so the identity of id is given here
+                        first_id = session.query(func.coalesce(func.max(EndpointRun.id), 0)).scalar() + 1
+                        for offset, row in enumerate(rows):
+                            row['id'] = first_id + offset
+                    session.execute(insert(EndpointRun), rows)
+
+                    dialect_insert = sqlite_insert if sqlite else postgresql_insert
+                    statement = dialect_insert(EndpointRunRollup).values(rollup_rows(rows))
+                    session.execute(statement.on_conflict_do_update(
+                        index_elements=['endpoint_id', 'hour', 'latency_bucket'],
+                        set_={
+                            'runs': EndpointRunRollup.runs + statement.excluded.runs,
+                            'errors': EndpointRunRollup.errors + statement.excluded.errors,
+                            'latency_ms_sum': EndpointRunRollup.latency_ms_sum + statement.excluded.latency_ms_sum,
+                            'bytes_sum': EndpointRunRollup.bytes_sum + statement.excluded.bytes_sum,
+                        }
+                    ))
+                    session.commit()
+
+                return {
+                    'status': 201,
+                    'data': {'saved': len(rows)}
+                }
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
+    def get_endpoint_history(self, endpoint_id: int, limit: int) -> dict:
+        """
+        Method to get the last runs of an endpoint (index scan on (endpoint_id, ran_at) of every partition).
+        :param endpoint_id: ID of the endpoint
+        :param limit: maximum number of runs
+        :return: Dictionary with the runs, newest first, or error information
+        """
+        try:
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+                runs = (
+                    session.query(EndpointRun)
+                    .filter(EndpointRun.endpoint_id == endpoint_id)
+                    .order_by(EndpointRun.ran_at.desc())
+                    .limit(limit)
+                    .all()
+                )
+
+                return {
+                    'status': 200,
+                    'data': {
+                        'runs': [
+                            {
+                                'ran_at': run.ran_at.isoformat(),
+                                'status': run.status,
+                                'latency_ms': run.latency_us / 1000,
+                                'bytes': run.bytes,
+                                'body': decompress_body(run.body),
+                                'error': run.error,
+                            }
+                            for run in runs
+                        ]
+                    }
+                }
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
+
+    def get_endpoint_statistics(self, endpoint_id: int, hours: int = 24) -> dict:
+        """
+        Method to get the run statistics of an endpoint from the hourly rollups (never from the raw runs).
+        :param endpoint_id: ID of the endpoint
+        :param hours: number of full hours before the current one included in the statistics
+        :return: Dictionary with runs, errors, average latency and size, latency percentiles or error information
+        """
+        try:
+            if self.connection_response['status'] == 200:
+                session: Session = self.connection_response["connection"]
+                since = (datetime.now() - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+                buckets = (
+                    session.query(
+                        EndpointRunRollup.latency_bucket,
+                        func.sum(EndpointRunRollup.runs),
+                        func.sum(EndpointRunRollup.errors),
+                        func.sum(EndpointRunRollup.latency_ms_sum),
+                        func.sum(EndpointRunRollup.bytes_sum),
+                    )
+                    .filter(EndpointRunRollup.endpoint_id == endpoint_id, EndpointRunRollup.hour >= since)
+                    .group_by(EndpointRunRollup.latency_bucket)
+                    .all()
+                )
+
+                runs = sum(bucket[1] for bucket in buckets)
+                return {
+                    'status': 200,
+                    'data': {
+                        'since': since.isoformat(),
+                        'runs': runs,
+                        'errors': sum(bucket[2] for bucket in buckets),
+                        'avg_latency_ms': round(sum(bucket[3] for bucket in buckets) / runs, 3) if runs else None,
+                        'avg_bytes': round(sum(bucket[4] for bucket in buckets) / runs) if runs else None,
+                        **histogram_percentiles({bucket[0]: bucket[1] for bucket in buckets}),
+                    }
+                }
+            else:
+                return self.connection_response
+
+        except Exception as error:
+            self.rollback()
+            print(error)
+            return {
+                'status': 400,
+                'data': {'message': str(error)}
+            }
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, Identity, Integer, BigInteger, SmallInteger, Float, String, LargeBinary, ForeignKey, DateTime, Index
+from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 
 Base = declarative_base()
@@ -11,6 +11,8 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     password = Column(String)
+    # Incremented by every change of the user's collections or endpoints (ETag of /user-information)
+    data_version = Column(Integer, nullable=False, server_default="0")
 
     def to_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -19,19 +21,25 @@ class ClientSession(Base):
     __tablename__ = "sessions"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    session_hash = Column(String)
-    expires_at = Column(DateTime)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    session_hash = Column(String, unique=True, index=True)
+    expires_at = Column(DateTime, index=True)
 
     def to_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
 class Collection(Base):
     __tablename__ = "collections"
+    __table_args__ = (
+        Index("ix_collections_user_id_title", "user_id", "title", unique=True),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     title = Column(String)
 
+    # passive_deletes="all": deleting a collection leaves its endpoints to the database FK rules
+    endpoints = relationship("Endpoint", back_populates="collection", order_by="Endpoint.id", passive_deletes="all")
+
     def to_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
@@ -44,5 +52,56 @@ class Endpoint(Base):
     method = Column(String)
     headers = Column(JSONB, nullable=False, server_default="[]")
 
+    collection = relationship("Collection", back_populates="endpoints")
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+    def to_client_dict(self):
+        """Endpoint as shown on the dashboard: without collection_id and with a lowercase method."""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'url': self.url,
+            'method': self.method.lower(),
+            'headers': self.headers,
+        }
+
+class EndpointRun(Base):
+    """
+    One execution of a stored endpoint. Range partitioned by day on ran_at (database/sql/003_endpoint_runs.sql),
+    old days are dropped by the retention job. No FK to endpoints so history inserts and endpoint deletes stay cheap.
+    """
+    __tablename__ = "endpoint_runs"
+    __table_args__ = (
+        Index("ix_endpoint_runs_endpoint_id_ran_at", "endpoint_id", "ran_at"),
+        {'postgresql_partition_by': "RANGE (ran_at)"},
+    )
+    # Identity on Postgres; SQLite has no rowid alias for a composite key, Database.record_endpoint_runs() numbers the rows
+    id = Column(BigInteger, Identity(), primary_key=True)
+    ran_at = Column(DateTime, primary_key=True)
+    endpoint_id = Column(Integer, nullable=False)
+    status = Column(SmallInteger)
+    latency_us = Column(Integer, nullable=False)
+    bytes = Column(Integer, nullable=False)
+    # zlib compressed start of the body (see utils.run_history)
+    body = Column(LargeBinary)
+    error = Column(String)
+
     def to_dict(self):
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
\ No newline at end of file
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+class EndpointRunRollup(Base):
+    """Runs per endpoint, hour and latency bucket, read by the history statistics instead of the raw runs."""
+    __tablename__ = "endpoint_run_rollups"
+
+    endpoint_id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, primary_key=True, index=True)
+    latency_bucket = Column(SmallInteger, primary_key=True)
+    runs = Column(Integer, nullable=False)
+    errors = Column(Integer, nullable=False)
+    latency_ms_sum = Column(Float, nullable=False)
+    bytes_sum = Column(BigInteger, nullable=False)
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -0,0 +1,132 @@
+import time
+import threading
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolStats(object):
+    """
+    Thread-safe counters describing how the connection pool is used.
+    Checkout latency is the time spent waiting for a connection from the pool
+    (including opening a new one when the pool is still growing). Timeouts count the checkouts that
+    found the pool exhausted for pool_timeout; connect errors the ones where opening a connection failed.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.connect_errors = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+
+    def record_checkout_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkout_time_total += seconds
+            if seconds > self.checkout_time_max:
+                self.checkout_time_max = seconds
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def record_connect_error(self) -> None:
+        with self._lock:
+            self.connect_errors += 1
+
+    def record_checkout(self) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def record_checkin(self) -> None:
+        with self._lock:
+            self.checkins += 1
+
+    def record_connect(self) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            average = (self.checkout_time_total / self.checkouts) if self.checkouts else 0.0
+            return {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'timeouts': self.timeouts,
+                'connect_errors': self.connect_errors,
+                'checkout_ms_avg': round(average * 1000, 3),
+                'checkout_ms_max': round(self.checkout_time_max * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that measures how long each checkout waits for a connection.
+    """
+
+    stats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.record_timeout()
+            raise
+        except Exception:
+            # Connection refused, authentication, DNS...: the database is the problem, not the pool size
+            if self.stats is not None:
+                self.stats.record_connect_error()
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.record_checkout_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.stats = self.stats
+        return new_pool
+
+
+def instrument_engine(engine, stats: PoolStats) -> None:
+    """
+    Attach the pool statistics to an engine created with InstrumentedQueuePool.
+    :param engine: SQLAlchemy engine
+    :param stats: PoolStats instance that collects the counters
+    """
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.stats = stats
+
+    event.listen(engine, 'connect', lambda dbapi_conn, record: stats.record_connect())
+    event.listen(engine, 'checkout', lambda dbapi_conn, record, proxy: stats.record_checkout())
+    event.listen(engine, 'checkin', lambda dbapi_conn, record: stats.record_checkin())
+
+
+def pool_status(engine, stats: PoolStats) -> dict:
+    """
+    Current pool occupancy merged with the collected counters.
+    :param engine: SQLAlchemy engine
+    :param stats: PoolStats instance attached to the engine
+    :return: dictionary with pool information
+    """
+    pool = engine.pool
+    status = stats.snapshot()
+
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        checked_out = pool.checkedout()
+        status.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_in': pool.checkedin(),
+            'checked_out': checked_out,
+            'overflow': pool.overflow(),
+            'saturation': round(checked_out / capacity, 3) if capacity > 0 else 0.0,
+        })
+
+    return status
@@ -0,0 +1,51 @@
+"""
+Typed response schemas of the dashboard.
+
+Built straight from the column tuples of a Core SELECT (no ORM objects, no to_dict()) and serialized
+as dataclasses by the JSON provider (utils.json_provider), so no intermediate dictionaries are created.
+When responses are serialized by orjson >= 3.9 (JSON_PROVIDER=orjson, the default) the endpoint headers
+are read from the database as JSON text and embedded as-is (orjson.Fragment) instead of being decoded
+to Python lists and encoded again. The json module can't serialize a Fragment, so with JSON_PROVIDER=default
+the headers are decoded.
+"""
+import json
+from dataclasses import dataclass
+
+from utils.json_provider import orjson, USE_ORJSON
+
+# Headers are selected as text and embedded without decoding
+RAW_HEADERS = USE_ORJSON and hasattr(orjson, 'Fragment')
+
+
+def headers_value(headers):
+    """
+    :param headers: headers column value (JSON text when RAW_HEADERS, decoded by the driver otherwise)
+    :return: value serialized in the response
+    """
+    if headers is None:
+        return []
+    if isinstance(headers, str):
+        return orjson.Fragment(headers) if RAW_HEADERS else json.loads(headers)
+    return headers
+
+
+@dataclass(slots=True)
+class EndpointSchema:
+    id: int
+    title: str
+    url: str
+    method: str
+    headers: object
+
+    @classmethod
+    def from_row(cls, row) -> "EndpointSchema":
+        """
+        :param row: (id, title, url, method, headers)
+        """
+        return cls(row[0], row[1], row[2], row[3].lower(), headers_value(row[4]))
+
+
+@dataclass(slots=True)
+class CollectionSchema:
+    title: str
+    endpoints: list
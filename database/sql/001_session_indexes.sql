@@ -0,0 +1,8 @@
+-- Indexes for session validation, logout and the expired session purge.
+-- CONCURRENTLY keeps the sessions table writable while the indexes are built,
+-- run each statement outside a transaction block.
+-- Remove duplicated session_hash rows before creating the unique index.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_sessions_session_hash ON sessions (session_hash);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sessions_user_id ON sessions (user_id);
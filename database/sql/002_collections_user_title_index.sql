@@ -0,0 +1,4 @@
+-- Unique (user_id, title) index used to resolve a collection by title in /add-endpoint and /change-endpoint.
+-- Run outside a transaction block. Remove duplicated titles per user before creating the index.
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_collections_user_id_title ON collections (user_id, title);
@@ -0,0 +1,37 @@
+-- Run history of stored endpoints (see database.models.EndpointRun / EndpointRunRollup).
+-- endpoint_runs is partitioned by day: the retention job in utils/cleanup_sessions_scheduler.py creates
+-- the next partitions and drops the expired ones (DROP TABLE instead of row by row deletes).
+-- Rows that don't match a daily partition land in endpoint_runs_default (see 005_endpoint_runs_partitions.sql).
+
+CREATE TABLE IF NOT EXISTS endpoint_runs (
+    id          bigint GENERATED BY DEFAULT AS IDENTITY,
+    ran_at      timestamp NOT NULL,
+    endpoint_id integer NOT NULL,
+    status      smallint,
+    latency_us  integer NOT NULL,
+    bytes       integer NOT NULL,
+    body        bytea,
+    error       varchar,
+    PRIMARY KEY (id, ran_at)
+) PARTITION BY RANGE (ran_at);
+
+CREATE TABLE IF NOT EXISTS endpoint_runs_default PARTITION OF endpoint_runs DEFAULT;
+
+-- Last runs of an endpoint, created on every partition
+CREATE INDEX IF NOT EXISTS ix_endpoint_runs_endpoint_id_ran_at ON endpoint_runs (endpoint_id, ran_at);
+
+-- The body is already compressed by the application
+ALTER TABLE endpoint_runs ALTER COLUMN body SET STORAGE EXTERNAL;
+
+CREATE TABLE IF NOT EXISTS endpoint_run_rollups (
+    endpoint_id    integer NOT NULL,
+    hour           timestamp NOT NULL,
+    latency_bucket smallint NOT NULL,
+    runs           integer NOT NULL,
+    errors         integer NOT NULL,
+    latency_ms_sum double precision NOT NULL,
+    bytes_sum      bigint NOT NULL,
+    PRIMARY KEY (endpoint_id, hour, latency_bucket)
+);
+
+CREATE INDEX IF NOT EXISTS ix_endpoint_run_rollups_hour ON endpoint_run_rollups (hour);
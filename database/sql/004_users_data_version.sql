@@ -0,0 +1,5 @@
+-- Version of the dashboard data of every user, incremented by the Database methods that change
+-- collections or endpoints. /user-information derives its ETag from it.
+-- Adding a column with a constant default doesn't rewrite the table (Postgres 11+).
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS data_version integer NOT NULL DEFAULT 0;
@@ -0,0 +1,28 @@
+-- Daily partitions of endpoint_runs for today and the next 3 days (RUN_HISTORY_PARTITIONS_AHEAD).
+-- Without them the runs recorded before the first retention pass land in endpoint_runs_default, and
+-- Postgres refuses a partition whose range already has rows in the default partition.
+-- Rows of those days already in endpoint_runs_default are moved into the new partition before it is
+-- attached (same steps as create_run_partition() in utils/cleanup_sessions_scheduler.py).
+-- The app creates the partitions again when it starts, this only covers the first deployment.
+
+DO $$
+DECLARE
+    day date;
+    partition_name text;
+BEGIN
+    FOR day IN SELECT generate_series(current_date, current_date + 3, interval '1 day')::date LOOP
+        partition_name := 'endpoint_runs_' || to_char(day, 'YYYYMMDD');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE endpoint_runs INCLUDING STORAGE)', partition_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM endpoint_runs_default WHERE ran_at >= %L AND ran_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                day, day + 1, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE endpoint_runs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, day, day + 1
+            );
+        END IF;
+    END LOOP;
+END $$;
@@ -0,0 +1,10 @@
+"""
+gunicorn settings of the WSGI app, read from the working directory:
+    gunicorn -w 4 --threads 8 -b 0.0.0.0:5000 app:app
+"""
+
+
+def post_fork(server, worker):
+    # Threads and connections of the background jobs belong to the worker, not to the master
+    from app import start_background_jobs
+    start_background_jobs()
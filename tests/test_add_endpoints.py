@@ -0,0 +1,159 @@
+"""
+Bulk insert of endpoints: Database.add_endpoints() and the /add-endpoints route.
+
+Runs in its own process (the database is configured on import) against a temporary SQLite database.
+Needs the app dependencies (requirements.txt).
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPENDENCIES = ('flask', 'flask_cors', 'sqlalchemy', 'bcrypt', 'dotenv', 'ijson')
+
+ADD_ENDPOINTS_SCRIPT = """
+import json
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.postgresql import JSONB
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kwargs):
+    return "JSON"
+
+from database.main import engine, Database
+from database.models import Base, User, Endpoint
+Base.metadata.create_all(engine)
+
+import app as app_module
+from utils.route_helpers import MAX_BULK_ENDPOINTS
+
+
+def endpoint(title, method="get"):
+    return {'title': title, 'url': f"https://api.example.com/{title}", 'method': method, 'headers': []}
+
+
+db = Database()
+session = db.connection_response['connection']
+user_id = db.register_new_user({'username': "bob", 'email': "bob@example.com"}, hashed_password="hash")['data']['user']['id']
+db.add_collection(user_id=user_id, collection_title="Main")
+collection_id = db.get_collection_id(user_id=user_id, collection_title="Main")['data']['collection_id']
+db.add_endpoint(collection_id=collection_id, endpoint_data=endpoint("existing"))
+
+
+def state():
+    session.expire_all()
+    return {
+        'version': session.query(User.data_version).filter(User.id == user_id).scalar(),
+        'endpoints': [[row.title, row.method] for row in session.query(Endpoint).filter(Endpoint.collection_id == collection_id).order_by(Endpoint.id)],
+    }
+
+
+result = {'before': state()}
+mixed = db.add_endpoints(collection_id=collection_id, endpoints_data=[
+    endpoint("one"),
+    "not an object",
+    {'title': "no url", 'method': "GET", 'headers': []},
+    endpoint(7),
+    endpoint("existing"),
+    endpoint("two", method="post"),
+    endpoint("one"),
+])
+result['mixed'] = {'status': mixed['status'], 'created': mixed['data']['created'], 'failed': mixed['data']['failed'],
+                   'results': [[item['index'], item['title'], item['status'], item['message']] for item in mixed['data']['results']]}
+result['after_mixed'] = state()
+
+failed = db.add_endpoints(collection_id=collection_id, endpoints_data=[endpoint("one"), endpoint("existing")])
+result['all_failed'] = [failed['status'], failed['data']['created'], failed['data']['failed']]
+result['after_all_failed'] = state()
+
+client = app_module.app.test_client()
+client.post('/auth/register', json={'username': "alice", 'email': "alice@example.com",
+                                    'password': "Passw0rd!x", 'confirm_password': "Passw0rd!x"})
+client.post('/add-collection', json={'title': "Bulk"})
+responses = {}
+response = client.post('/add-endpoints', json={'collection_title': "Bulk", 'endpoints': [endpoint(f"e{n}") for n in range(300)]})
+responses['bulk'] = [response.status_code, response.get_json()['created'], response.get_json()['failed']]
+response = client.post('/add-endpoints', json={'collection_title': "Bulk", 'endpoints': [endpoint("e0"), endpoint("new")]})
+responses['partial'] = [response.status_code, [item['status'] for item in response.get_json()['results']]]
+for name, body in (('empty', {'collection_title': "Bulk", 'endpoints': []}),
+                   ('not_a_list', {'collection_title': "Bulk", 'endpoints': endpoint("x")}),
+                   ('too_many', {'collection_title': "Bulk", 'endpoints': [endpoint("x")] * (MAX_BULK_ENDPOINTS + 1)}),
+                   ('unknown_collection', {'collection_title': "Missing", 'endpoints': [endpoint("x")]})):
+    responses[name] = client.post('/add-endpoints', json=body).status_code
+result['route'] = responses
+print(json.dumps(result))
+"""
+
+
+def missing_dependencies() -> list:
+    return [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(missing_dependencies(), "app dependencies are not installed")
+class AddEndpointsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(directory, 'add_endpoints.db')}",
+                PASSWORD_HASH_ROUNDS="4",
+                # The bulk insert stays within the route budget whatever the number of endpoints
+                QUERY_BUDGET_MODE="raise",
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+            )
+            completed = subprocess.run(
+                [sys.executable, "-c", ADD_ENDPOINTS_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+            )
+        if completed.returncode != 0:
+            raise AssertionError(completed.stderr)
+        cls.result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def test_results_follow_the_request_order(self) -> None:
+        mixed = self.result['mixed']
+
+        self.assertEqual((mixed['status'], mixed['created'], mixed['failed']), (201, 2, 5))
+        self.assertEqual([item[:3] for item in mixed['results']], [
+            [0, "one", 201],
+            [1, None, 400],
+            [2, "no url", 400],
+            [3, 7, 400],
+            [4, "existing", 400],
+            [5, "two", 201],
+            [6, "one", 400],
+        ])
+        messages = [item[3] for item in mixed['results']]
+        self.assertEqual(messages[2], "'url' in endpoint json is required!")
+        self.assertIn("already exists", messages[4])
+        self.assertIn("duplicated in the request", messages[6])
+
+    def test_only_valid_endpoints_are_inserted_once(self) -> None:
+        before, after = self.result['before'], self.result['after_mixed']
+
+        self.assertEqual(after['endpoints'], before['endpoints'] + [["one", "GET"], ["two", "POST"]])
+        self.assertEqual(after['version'], before['version'] + 1)
+
+    def test_nothing_inserted_when_every_endpoint_fails(self) -> None:
+        self.assertEqual(self.result['all_failed'], [400, 0, 2])
+        self.assertEqual(self.result['after_all_failed'], self.result['after_mixed'])
+
+    def test_route(self) -> None:
+        self.assertEqual(self.result['route'], {
+            'bulk': [201, 300, 0],
+            'partial': [201, [400, 201]],
+            'empty': 400,
+            'not_a_list': 400,
+            'too_many': 400,
+            'unknown_collection': 400,
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
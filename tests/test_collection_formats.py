@@ -0,0 +1,62 @@
+"""
+Postman / OpenAPI export and import round trip (utils.collection_formats).
+
+    python -m unittest discover tests
+"""
+import io
+import asyncio
+import unittest
+import importlib.util
+
+from utils.collection_formats import EXPORTERS, ASYNC_EXPORTERS, export_postman, export_openapi, parse_postman, parse_openapi
+
+ENDPOINTS = [
+    {'id': 1, 'title': "List", 'url': "https://api.example.com/items", 'method': "GET",
+     'headers': [{'name': "Accept", 'value': "application/json"}]},
+    {'id': 2, 'title': "Create", 'url': "https://api.example.com/items", 'method': "POST", 'headers': []},
+]
+
+
+def endpoints_of(events) -> list:
+    return [(value['title'], value['url'], value['method'].upper()) for kind, value in events if kind == 'endpoint']
+
+
+class CollectionFormatsTest(unittest.TestCase):
+
+    def test_postman_round_trip(self) -> None:
+        document = "".join(export_postman("Main", ENDPOINTS)).encode("utf-8")
+        events = list(parse_postman(io.BytesIO(document)))
+
+        self.assertIn(('collection', "Main"), events)
+        self.assertEqual(endpoints_of(events), [(endpoint['title'], endpoint['url'], endpoint['method']) for endpoint in ENDPOINTS])
+
+    def test_openapi_round_trip(self) -> None:
+        document = "".join(export_openapi("Main", ENDPOINTS)).encode("utf-8")
+        events = list(parse_openapi(io.BytesIO(document)))
+
+        self.assertEqual(sorted(endpoints_of(events)), sorted((endpoint['title'], endpoint['url'], endpoint['method']) for endpoint in ENDPOINTS))
+
+    def test_async_exporters_match(self) -> None:
+        async def endpoints():
+            for endpoint in ENDPOINTS:
+                yield endpoint
+
+        async def export(exporter):
+            return "".join([chunk async for chunk in exporter("Main", endpoints())])
+
+        for name, exporter in ASYNC_EXPORTERS.items():
+            self.assertEqual(asyncio.run(export(exporter)), "".join(EXPORTERS[name]("Main", ENDPOINTS)), name)
+
+    @unittest.skipIf(importlib.util.find_spec('werkzeug') is None, "werkzeug is not installed")
+    def test_parses_werkzeug_request_stream(self) -> None:
+        # The request stream of app.py: an empty read there means the client disconnected
+        from werkzeug.wsgi import LimitedStream
+
+        document = "".join(export_postman("Main", ENDPOINTS)).encode("utf-8")
+        events = list(parse_postman(LimitedStream(io.BytesIO(document), len(document))))
+
+        self.assertEqual(len(endpoints_of(events)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+CollectionRun events with a fake runner (no network).
+
+    python -m unittest discover tests
+"""
+import threading
+import unittest
+from unittest import mock
+
+from utils.collection_run import CollectionRun, RunRegistry
+
+
+class FakeRunner(object):
+
+    def __init__(self, fail_on: int = None) -> None:
+        self.fail_on = fail_on
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def run(self, endpoint: dict, body: str = None) -> dict:
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        if call == self.fail_on:
+            raise ValueError("Invalid header value b'a\\nb'")
+        return {'status': 200, 'ok': True, 'timing': {'total_ms': float(call % 20 + 1)}}
+
+
+ENDPOINTS = [{'id': 1, 'title': "one", 'url': "http://one.test/"}, {'id': 2, 'title': "two", 'url': "http://two.test/"}]
+
+
+def events_of(run: CollectionRun, timeout: float = 10) -> list:
+    events = []
+    reader = threading.Thread(target=lambda: events.extend(run.stream()), daemon=True)
+    run.start()
+    reader.start()
+    reader.join(timeout)
+    if reader.is_alive():
+        raise AssertionError("The stream of the run did not end")
+    return events
+
+
+class CollectionRunTest(unittest.TestCase):
+
+    def test_finished(self) -> None:
+        run = CollectionRun(1, ENDPOINTS, iterations=50, concurrency=4, runner=FakeRunner())
+        final = events_of(run)[-1]
+
+        self.assertEqual(final['type'], 'finished')
+        self.assertEqual(final['completed'], 100)
+        self.assertEqual(final['errors'], 0)
+        self.assertIsNotNone(final['p99_ms'])
+        self.assertEqual(sorted(endpoint['requests'] for endpoint in final['endpoints']), [50, 50])
+
+    def test_runner_exception_ends_the_stream(self) -> None:
+        run = CollectionRun(1, ENDPOINTS, iterations=50, concurrency=4, runner=FakeRunner(fail_on=10))
+        events = events_of(run)
+
+        self.assertEqual(events[0]['type'], 'started')
+        self.assertEqual(events[-1]['type'], 'failed')
+        self.assertIn("ValueError", events[-1]['error'])
+        self.assertLess(events[-1]['completed'], 100)
+
+    def test_results_recorded_in_batches(self) -> None:
+        batches = []
+        run = CollectionRun(1, ENDPOINTS, iterations=50, concurrency=4, runner=FakeRunner(), recorder=batches.append)
+        with mock.patch('utils.collection_run.RUN_HISTORY_BATCH_SIZE', 30):
+            final = events_of(run)[-1]
+
+        self.assertEqual(final['type'], 'finished')
+        # Three full batches, the last 10 results before the final event
+        self.assertEqual([len(batch) for batch in batches], [30, 30, 30, 10])
+
+    def test_registry_shares_its_threads_and_bounds_runs(self) -> None:
+        registry = RunRegistry(max_runs=1, max_threads=2)
+        first = CollectionRun(1, ENDPOINTS, iterations=10, concurrency=8, runner=FakeRunner())
+        second = CollectionRun(1, ENDPOINTS, runner=FakeRunner())
+
+        self.assertTrue(registry.add(first))
+        self.assertFalse(registry.add(second))
+        self.assertIs(first.executor, registry.executor)
+        self.assertEqual(events_of(first)[-1]['completed'], 20)
+
+        registry.remove(first)
+        self.assertTrue(registry.add(second))
+        registry.executor.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Dashboard cache backends (utils.dashboard_cache); the Redis one with an in-memory stand-in of the client.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import threading
+import unittest
+
+from utils.dashboard_cache import LocalDashboardCache, RedisDashboardCache
+
+
+class FakeRedis(object):
+    """The commands RedisDashboardCache sends, recording the thread of every call."""
+
+    def __init__(self) -> None:
+        self.values = {}
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.threads.append(threading.get_ident())
+        self.values[key] = value
+
+    def delete(self, *keys):
+        self.threads.append(threading.get_ident())
+        for key in keys:
+            self.values.pop(key, None)
+
+
+class LocalDashboardCacheTest(unittest.TestCase):
+
+    def test_hit_requires_the_data_version(self) -> None:
+        cache = LocalDashboardCache()
+        cache.set(1, 3, b"{}")
+        cache.set(1, 3, b"gz", 'gzip')
+
+        self.assertEqual(cache.get(1, 3), b"{}")
+        self.assertEqual(cache.get(1, 3, 'gzip'), b"gz")
+        self.assertIsNone(cache.get(1, 4))
+
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1, 3))
+
+
+class RedisDashboardCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client = FakeRedis()
+        self.cache = RedisDashboardCache(client=self.client)
+
+    def test_sync_calls(self) -> None:
+        self.cache.set(1, 3, b"{}")
+
+        self.assertEqual(self.cache.get(1, 3), b"{}")
+        self.assertIsNone(self.cache.get(1, 4))
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.get(1, 3))
+
+    def test_event_loop_thread_never_calls_redis(self) -> None:
+        async def requests():
+            await self.cache.set_async(1, 3, b"{}")
+            body = await self.cache.get_async(1, 3)
+            # Like a write of the ASGI app (AsyncDatabase.run_sync runs on the event loop thread)
+            self.cache.invalidate(1)
+            await asyncio.sleep(0.1)
+            return threading.get_ident(), body
+
+        loop_thread, body = asyncio.run(requests())
+
+        self.assertEqual(body, b"{}")
+        self.assertEqual(self.client.values, {})
+        self.assertEqual(len(self.client.threads), 3)
+        self.assertNotIn(loop_thread, self.client.threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Validators of /user-information: If-None-Match answered with 304 while the data version is unchanged,
+and a new ETag after every route that changes collections or endpoints.
+
+Runs the app in its own process (settings are read on import) against a temporary SQLite database.
+Needs the app dependencies (requirements.txt).
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPENDENCIES = ('flask', 'flask_cors', 'sqlalchemy', 'bcrypt', 'dotenv', 'ijson')
+
+ETAG_SCRIPT = """
+import json
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.postgresql import JSONB
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kwargs):
+    return "JSON"
+
+from database.main import engine
+from database.models import Base
+Base.metadata.create_all(engine)
+
+from app import app
+client = app.test_client()
+client.post('/auth/register', json={'username': "alice", 'email': "alice@example.com",
+                                    'password': "Passw0rd!x", 'confirm_password': "Passw0rd!x"})
+client.post('/auth/login', json={'email': "alice@example.com", 'password': "Passw0rd!x"})
+
+
+def endpoint(title):
+    return {'title': title, 'url': f"https://api.example.com/{title}", 'method': "GET", 'headers': []}
+
+
+def etag():
+    return client.get('/user-information').headers['ETag']
+
+
+result = {'validators': {}, 'writes': {}, 'reads': {}}
+first = etag()
+for mode in ("", "?limit=10", "?stream=1"):
+    revalidated = client.get(f'/user-information{mode}', headers={'If-None-Match': first})
+    other = client.get(f'/user-information{mode}', headers={'If-None-Match': 'W/"0.0"'})
+    result['validators'][mode or "full"] = [revalidated.status_code, revalidated.get_data(as_text=True),
+                                            revalidated.headers.get('ETag') == first, other.status_code]
+
+document = json.dumps({'info': {'name': "Imported"}, 'item': [{'name': "Imported", 'request': {'method': "GET", 'url': "https://api.example.com/imported"}}]})
+writes = [
+    ('add-collection', lambda: client.post('/add-collection', json={'title': "Main"})),
+    ('add-endpoint', lambda: client.post('/add-endpoint', json={'collection_title': "Main", 'endpoint_json': endpoint("one")})),
+    ('add-endpoints', lambda: client.post('/add-endpoints', json={'collection_title': "Main", 'endpoints': [endpoint("two"), endpoint("three")]})),
+    ('change-endpoint', lambda: client.post('/change-endpoint', json={
+        'collection_title': "Main", 'endpoint_id': 1, 'endpoint_json': endpoint("renamed")})),
+    ('edit-collection', lambda: client.post('/edit-collection', json={'collection_title': "Main", 'collection_json': {'title': "Edited"}})),
+    ('duplicate-collection', lambda: client.post('/duplicate-collection', json={'collection_title': "Edited"})),
+    ('import-collection', lambda: client.post('/import-collection?format=postman', data=document)),
+    ('remove-collection', lambda: client.post('/remove-collection', json={'title': "Edited(1)"})),
+]
+previous = etag()
+for name, write in writes:
+    status = write().status_code
+    current = etag()
+    stale = client.get('/user-information', headers={'If-None-Match': previous}).status_code
+    result['writes'][name] = [status, current != previous, stale]
+    previous = current
+
+reads = [
+    ('collection-endpoints', lambda: client.get('/collection-endpoints?collection_title=Edited')),
+    ('export-collection', lambda: client.get('/export-collection?collection_title=Edited')),
+    ('failed add-endpoint', lambda: client.post('/add-endpoint', json={'collection_title': "Edited", 'endpoint_json': endpoint("two")})),
+]
+for name, read in reads:
+    status = read().status_code
+    result['reads'][name] = [status, etag() == previous]
+print(json.dumps(result))
+"""
+
+
+def missing_dependencies() -> list:
+    return [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(missing_dependencies(), "app dependencies are not installed")
+class DashboardETagTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(directory, 'etag.db')}",
+                PASSWORD_HASH_ROUNDS="4",
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+            )
+            completed = subprocess.run(
+                [sys.executable, "-c", ETAG_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+            )
+        if completed.returncode != 0:
+            raise AssertionError(completed.stderr)
+        cls.result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def test_unchanged_dashboard_is_not_modified(self) -> None:
+        for mode, (status, body, same_etag, other_status) in self.result['validators'].items():
+            self.assertEqual((status, body, same_etag), (304, "", True), mode)
+            self.assertEqual(other_status, 200, mode)
+
+    def test_every_write_route_changes_the_etag(self) -> None:
+        for name, (status, changed, stale_status) in self.result['writes'].items():
+            self.assertIn(status, (200, 201), name)
+            self.assertTrue(changed, name)
+            # The client's copy from before the write is not revalidated
+            self.assertEqual(stale_status, 200, name)
+
+    def test_reads_and_failed_writes_keep_the_etag(self) -> None:
+        for name, (status, unchanged) in self.result['reads'].items():
+            self.assertTrue(unchanged, f"{name} ({status})")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+/user-information under both JSON providers (JSON_PROVIDER=orjson and JSON_PROVIDER=default).
+
+The provider is chosen when the app is imported, so every provider runs the app in its own process
+against a temporary SQLite database. Needs the app dependencies (requirements.txt).
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPENDENCIES = ('flask', 'flask_cors', 'sqlalchemy', 'bcrypt', 'dotenv', 'ijson')
+
+DASHBOARD_SCRIPT = """
+import json
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.postgresql import JSONB
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kwargs):
+    return "JSON"
+
+from database.main import engine
+from database.models import Base
+Base.metadata.create_all(engine)
+
+from app import app
+client = app.test_client()
+client.post('/auth/register', json={'username': "alice", 'email': "alice@example.com",
+                                    'password': "Passw0rd!x", 'confirm_password': "Passw0rd!x"})
+client.post('/auth/login', json={'email': "alice@example.com", 'password': "Passw0rd!x"})
+client.post('/add-collection', json={'title': "Main"})
+client.post('/add-endpoint', json={'collection_title': "Main", 'endpoint_json': {
+    'title': "List", 'url': "https://api.example.com/items", 'method': "GET",
+    'headers': [{'name': "Accept", 'value': "application/json"}]}})
+
+responses = {}
+for mode, path in (('full', "/user-information"), ('page', "/user-information?limit=10"),
+                   ('stream', "/user-information?stream=1")):
+    response = client.get(path)
+    body = response.get_data(as_text=True)
+    if mode == 'stream':
+        body = [json.loads(line) for line in body.splitlines()]
+    else:
+        body = json.loads(body)
+    responses[mode] = {'status': response.status_code, 'body': body}
+print(json.dumps(responses))
+"""
+
+
+def missing_dependencies() -> list:
+    return [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(missing_dependencies(), "app dependencies are not installed")
+class DashboardJSONProviderTest(unittest.TestCase):
+
+    def run_dashboard(self, provider: str) -> dict:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                JSON_PROVIDER=provider,
+                DATABASE_URL=f"sqlite:///{os.path.join(directory, 'dashboard.db')}",
+                PASSWORD_HASH_ROUNDS="4",
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+            )
+            completed = subprocess.run(
+                [sys.executable, "-c", DASHBOARD_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+            )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def test_dashboard_under_both_providers(self) -> None:
+        results = {provider: self.run_dashboard(provider) for provider in ('orjson', 'default')}
+
+        for provider, responses in results.items():
+            for mode, response in responses.items():
+                self.assertEqual(response['status'], 200, f"{provider} {mode}: {response['body']}")
+
+        full = results['default']['full']['body']
+        self.assertEqual(full['collections'][0]['endpoints'][0]['headers'], [{'name': "Accept", 'value': "application/json"}])
+        self.assertEqual(results['orjson'], results['default'])
+
+
+if __name__ == "__main__":
+    unittest.main()
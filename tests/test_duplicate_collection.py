@@ -0,0 +1,107 @@
+"""
+Database.duplicate_collection(): title of the copy, endpoints copied by INSERT ... SELECT, data version.
+
+Runs in its own process (the database is configured on import) against a temporary SQLite database.
+Needs the app dependencies (requirements.txt).
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPENDENCIES = ('flask', 'sqlalchemy', 'bcrypt', 'dotenv')
+
+DUPLICATE_SCRIPT = """
+import json
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.postgresql import JSONB
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kwargs):
+    return "JSON"
+
+from database.main import engine, Database
+from database.models import Base, User, Collection, Endpoint
+Base.metadata.create_all(engine)
+
+db = Database()
+session = db.connection_response['connection']
+user_id = db.register_new_user({'username': "alice", 'email': "alice@example.com"}, hashed_password="hash")['data']['user']['id']
+other_id = db.register_new_user({'username': "bob", 'email': "bob@example.com"}, hashed_password="hash")['data']['user']['id']
+
+# "Mainframe(5)" starts with the same base but is another title, bob's "Main(7)" belongs to another user
+for owner, title in ((user_id, "Main"), (user_id, "Main(1)"), (user_id, "Mainframe(5)"), (other_id, "Main(7)")):
+    db.add_collection(user_id=owner, collection_title=title)
+main_id = db.get_collection_id(user_id=user_id, collection_title="Main")['data']['collection_id']
+db.add_endpoints(collection_id=main_id, endpoints_data=[
+    {'title': "List", 'url': "https://api.example.com/items", 'method': "GET", 'headers': [{'name': "Accept", 'value': "application/json"}]},
+    {'title': "Create", 'url': "https://api.example.com/items", 'method': "POST", 'headers': []},
+])
+
+
+def data_version():
+    session.expire_all()
+    return session.query(User.data_version).filter(User.id == user_id).scalar()
+
+
+def endpoints_of(title):
+    collection_id = db.get_collection_id(user_id=user_id, collection_title=title)['data']['collection_id']
+    return [
+        [endpoint.title, endpoint.url, endpoint.method, endpoint.headers, endpoint.collection_id == collection_id]
+        for endpoint in session.query(Endpoint).filter(Endpoint.collection_id == collection_id).order_by(Endpoint.id)
+    ]
+
+
+result = {}
+version = data_version()
+first = db.duplicate_collection(collection_title="Main", user_id=user_id)
+result['first'] = [first['status'], first['data']['title'], data_version() - version]
+second = db.duplicate_collection(collection_title="Main(1)", user_id=user_id)
+result['second'] = [second['status'], second['data']['title']]
+result['original'] = endpoints_of("Main")
+result['copy'] = endpoints_of("Main(2)")
+missing = db.duplicate_collection(collection_title="Missing", user_id=user_id)
+result['missing'] = [missing['status'], data_version() - version]
+print(json.dumps(result))
+"""
+
+
+def missing_dependencies() -> list:
+    return [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(missing_dependencies(), "app dependencies are not installed")
+class DuplicateCollectionTest(unittest.TestCase):
+
+    def test_duplicate_collection(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(directory, 'duplicate.db')}",
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+            )
+            completed = subprocess.run(
+                [sys.executable, "-c", DUPLICATE_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+            )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        # Next number after this user's "Main(n)" titles only
+        self.assertEqual(result['first'], [200, "Main(2)", 1])
+        self.assertEqual(result['second'], [200, "Main(3)"])
+
+        self.assertEqual(len(result['original']), 2)
+        self.assertEqual([endpoint[:4] for endpoint in result['copy']], [endpoint[:4] for endpoint in result['original']])
+        self.assertTrue(all(endpoint[4] for endpoint in result['copy']))
+
+        self.assertEqual(result['missing'], [404, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+End of the request with buffered and streamed bodies (utils.metrics.track_stream / run_at_request_end).
+
+    python -m unittest discover tests
+"""
+import asyncio
+import unittest
+import contextvars
+
+from utils.metrics import start_request, current_request_stats, run_at_request_end, track_stream, track_stream_async
+
+
+def counting_chunks(count: int):
+    """Body whose every chunk counts one query in the request in progress, like the streamed dashboard."""
+    for position in range(count):
+        current_request_stats().queries += 1
+        yield f"{position}\n"
+
+
+async def counting_chunks_async(count: int):
+    for chunk in counting_chunks(count):
+        yield chunk
+
+
+class RequestEndTest(unittest.TestCase):
+
+    def test_buffered_response_ends_right_away(self) -> None:
+        start_request()
+        ended = []
+        run_at_request_end(lambda: ended.append(True))
+
+        self.assertEqual(ended, [True])
+
+    def test_streamed_response_ends_with_the_stream(self) -> None:
+        start_request()
+        body = track_stream(counting_chunks(3))
+        ended = []
+        # The after_request hooks run before the body is generated
+        run_at_request_end(lambda: ended.append(current_request_stats().queries))
+        self.assertEqual(ended, [])
+
+        self.assertEqual(list(body), ["0\n", "1\n", "2\n"])
+        self.assertEqual(ended, [3])
+
+    def test_every_finisher_runs_when_one_fails(self) -> None:
+        start_request()
+        body = track_stream(counting_chunks(1))
+        ended = []
+        run_at_request_end(lambda: 1 / 0)
+        run_at_request_end(lambda: ended.append(True))
+
+        with self.assertRaises(ZeroDivisionError):
+            list(body)
+        self.assertEqual(ended, [True])
+
+    def test_async_stream(self) -> None:
+        async def request():
+            start_request()
+            body = track_stream_async(counting_chunks_async(2))
+            ended = []
+            run_at_request_end(lambda: ended.append(current_request_stats().queries))
+            chunks = [chunk async for chunk in body]
+            return chunks, ended
+
+        self.assertEqual(asyncio.run(request()), (["0\n", "1\n"], [2]))
+
+    def test_outside_a_request(self) -> None:
+        chunks = iter(["a"])
+        self.assertIs(contextvars.Context().run(track_stream, chunks), chunks)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Time of the password hashing pool (utils.hashpasswd.PasswordHasher) in the request stats: the time
+of the hash and the time spent waiting for a worker are counted apart.
+
+    python -m unittest discover tests
+"""
+import time
+import unittest
+import threading
+import contextvars
+import importlib.util
+
+from utils.metrics import start_request
+
+
+def slow_hash(seconds: float) -> str:
+    time.sleep(seconds)
+    return "hashed"
+
+
+@unittest.skipIf(importlib.util.find_spec('bcrypt') is None, "bcrypt is not installed")
+class PasswordHasherTimingTest(unittest.TestCase):
+
+    def test_queue_wait_is_not_hash_time(self) -> None:
+        from utils.hashpasswd import PasswordHasher
+
+        hasher = PasswordHasher(workers=1, queue_size=1)
+        timings = {}
+
+        def request(name: str) -> None:
+            stats = start_request()
+            hasher.run(slow_hash, 0.2)
+            timings[name] = (stats.bcrypt_time, stats.bcrypt_wait)
+
+        first = threading.Thread(target=contextvars.Context().run, args=(request, "first"))
+        first.start()
+        time.sleep(0.05)
+        contextvars.Context().run(request, "second")
+        first.join()
+
+        for name, (bcrypt_time, bcrypt_wait) in timings.items():
+            self.assertAlmostEqual(bcrypt_time, 0.2, delta=0.08, msg=name)
+        self.assertLess(timings['first'][1], 0.05)
+        # Waited for the first hash to finish
+        self.assertGreater(timings['second'][1], 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+Checkout failures counted by InstrumentedQueuePool (database.pool): pool timeouts apart from connect errors.
+
+    python -m unittest discover tests
+"""
+import sqlite3
+import unittest
+
+from sqlalchemy import exc
+
+from database.pool import PoolStats, InstrumentedQueuePool
+
+
+class InstrumentedQueuePoolTest(unittest.TestCase):
+
+    def pool(self, creator) -> InstrumentedQueuePool:
+        pool = InstrumentedQueuePool(creator, pool_size=1, max_overflow=0, timeout=0.05)
+        pool.stats = PoolStats()
+        return pool
+
+    def test_exhausted_pool_is_a_timeout(self) -> None:
+        pool = self.pool(lambda: sqlite3.connect(":memory:", check_same_thread=False))
+        connection = pool.connect()
+        with self.assertRaises(exc.TimeoutError):
+            pool.connect()
+        connection.close()
+
+        snapshot = pool.stats.snapshot()
+        self.assertEqual((snapshot['timeouts'], snapshot['connect_errors']), (1, 0))
+
+    def test_database_down_is_no_timeout(self) -> None:
+        def refused():
+            raise ConnectionRefusedError("connection refused")
+
+        pool = self.pool(refused)
+        with self.assertRaises(ConnectionRefusedError):
+            pool.connect()
+
+        snapshot = pool.stats.snapshot()
+        self.assertEqual((snapshot['timeouts'], snapshot['connect_errors']), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
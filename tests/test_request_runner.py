@@ -0,0 +1,143 @@
+"""
+RequestRunner against a local stub server (RUNNER_ALLOW_PRIVATE_HOSTS lets it reach 127.0.0.1).
+
+    python -m unittest discover tests
+"""
+import os
+import time
+import importlib
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ["RUNNER_ALLOW_PRIVATE_HOSTS"] = "true"
+
+import utils.request_runner
+# The setting is read on import, which another test may have done already
+importlib.reload(utils.request_runner)
+from utils.request_runner import RequestRunner, RUNNER_ALLOW_PRIVATE_HOSTS
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _answer(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b""
+        self.server.received.append((self.command, self.path, self.headers.get('Host'), body))
+
+        payload = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        if self.path == "/drop":
+            # Keep-alive announced, then the connection is closed like an idle timeout of the server
+            self.close_connection = True
+
+    do_GET = do_POST = do_PUT = _answer
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class RequestRunnerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.server.daemon_threads = True
+        cls.server.received = []
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.server.received.clear()
+        self.runner = RequestRunner()
+
+    def tearDown(self) -> None:
+        self.runner.close()
+
+    def endpoint(self, path: str = "/", method: str = "GET", headers: list = None, url: str = None) -> dict:
+        return {'id': 1, 'title': "stub", 'url': url or self.base_url + path, 'method': method, 'headers': headers or []}
+
+    def test_private_hosts_allowed_by_setting(self) -> None:
+        self.assertTrue(RUNNER_ALLOW_PRIVATE_HOSTS)
+        result = self.runner.run(self.endpoint("/items?page=2", headers=[{'name': "Accept", 'value': "application/json"}]))
+
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['status'], 200)
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['body'], '{"ok": true}')
+        self.assertEqual(self.server.received[0][:2], ("GET", "/items?page=2"))
+
+    def test_connection_reused(self) -> None:
+        first = self.runner.run(self.endpoint())
+        second = self.runner.run(self.endpoint())
+
+        self.assertFalse(first['reused_connection'])
+        self.assertTrue(second['reused_connection'])
+        self.assertEqual(second['timing']['connect_ms'], 0.0)
+
+    def test_private_hosts_refused(self) -> None:
+        runner = RequestRunner(allow_private_hosts=False)
+        try:
+            result = runner.run(self.endpoint())
+        finally:
+            runner.close()
+
+        self.assertIn("non public address", result['error'])
+        self.assertEqual(self.server.received, [])
+
+    def test_invalid_header_reported(self) -> None:
+        result = self.runner.run(self.endpoint(headers=[{'name': "X-Value", 'value': "a\nb"}]))
+
+        self.assertIn("Invalid value of header", result['error'])
+        self.assertIsNone(result['status'])
+        self.assertEqual(self.server.received, [])
+
+    def test_invalid_port_reported(self) -> None:
+        result = self.runner.run(self.endpoint(url="http://127.0.0.1:99999999/"))
+
+        self.assertIn("Invalid port", result['error'])
+
+    def test_idempotent_request_retried_on_closed_connection(self) -> None:
+        self.runner.run(self.endpoint("/drop"))
+        time.sleep(0.1)
+        result = self.runner.run(self.endpoint("/after", method="PUT"))
+
+        self.assertIsNone(result['error'])
+        self.assertEqual(result['status'], 200)
+        self.assertEqual([request[:2] for request in self.server.received], [("GET", "/drop"), ("PUT", "/after")])
+
+    def test_post_not_retried_on_closed_connection(self) -> None:
+        self.runner.run(self.endpoint("/drop"))
+        time.sleep(0.1)
+        result = self.runner.run(self.endpoint("/after", method="POST"))
+
+        self.assertIsNotNone(result['error'])
+        self.assertEqual([request[:2] for request in self.server.received], [("GET", "/drop")])
+
+    def test_connects_to_checked_address(self) -> None:
+        # The host is resolved (and checked) once, the connection doesn't resolve it again
+        runner = RequestRunner(allow_private_hosts=False)
+        runner._check_public_host = lambda host, port: "127.0.0.1"
+        port = self.server.server_address[1]
+        try:
+            result = runner.run(self.endpoint(url=f"http://pinned.invalid:{port}/pinned"))
+        finally:
+            runner.close()
+
+        self.assertIsNone(result['error'])
+        self.assertEqual(self.server.received[0][1:3], ("/pinned", f"pinned.invalid:{port}"))
+
+
+if __name__ == "__main__":
+    unittest.main()
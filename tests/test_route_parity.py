@@ -0,0 +1,59 @@
+"""
+The WSGI (app.py + auth.py) and ASGI (asgi_app.py) apps serve the same routes.
+
+The route decorators are read from the source, so the check runs without Flask or Quart installed.
+
+    python -m unittest discover tests
+"""
+import os
+import ast
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Prefix of every blueprint (both apps register auth_routes under /auth)
+BLUEPRINT_PREFIXES = {'app': "", 'auth_routes': "/auth"}
+
+
+def routes_of(*filenames) -> dict:
+    """:return: dictionary "METHOD path" -> @query_budget of the route (None without one)"""
+    routes = {}
+    for filename in filenames:
+        with open(os.path.join(ROOT, filename), encoding="utf-8") as file:
+            tree = ast.parse(file.read(), filename)
+
+        for node in ast.walk(tree):
+            if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+
+            rules, budget = [], None
+            for decorator in node.decorator_list:
+                if not isinstance(decorator, ast.Call) or not isinstance(decorator.func, (ast.Attribute, ast.Name)):
+                    continue
+                if isinstance(decorator.func, ast.Name) and decorator.func.id == 'query_budget':
+                    budget = decorator.args[0].value
+                elif isinstance(decorator.func, ast.Attribute) and decorator.func.attr == 'route':
+                    prefix = BLUEPRINT_PREFIXES[decorator.func.value.id]
+                    methods = ['GET']
+                    for keyword in decorator.keywords:
+                        if keyword.arg == 'methods':
+                            methods = [element.value for element in keyword.value.elts]
+                    rules.extend(f"{method} {prefix}{decorator.args[0].value}" for method in methods)
+
+            for rule in rules:
+                routes[rule] = budget
+    return routes
+
+
+class RouteParityTest(unittest.TestCase):
+
+    def test_same_routes_and_budgets(self) -> None:
+        wsgi = routes_of("app.py", "auth.py")
+        asgi = routes_of("asgi_app.py")
+
+        self.assertEqual(sorted(set(wsgi) - set(asgi)), [], "routes missing from asgi_app.py")
+        self.assertEqual(sorted(set(asgi) - set(wsgi)), [], "routes missing from app.py")
+        self.assertEqual(asgi, wsgi)
+
+
+if __name__ == "__main__":
+    unittest.main()
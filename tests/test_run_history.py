@@ -0,0 +1,133 @@
+"""
+Runs of /run-endpoint, /run-collection and /run-collection-load saved in the run history, read back by /endpoint-history
+and /endpoint-statistics.
+
+Runs the app in its own process (settings are read on import) against a temporary SQLite database,
+the endpoints point to a local HTTP server. Needs the app dependencies (requirements.txt).
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPENDENCIES = ('flask', 'flask_cors', 'sqlalchemy', 'bcrypt', 'dotenv', 'ijson')
+
+HISTORY_SCRIPT = """
+import json
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.postgresql import JSONB
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kwargs):
+    return "JSON"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+server = HTTPServer(("127.0.0.1", 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+url = f"http://127.0.0.1:{server.server_port}/items"
+
+from database.main import engine
+from database.models import Base
+Base.metadata.create_all(engine)
+
+from app import app
+client = app.test_client()
+client.post('/auth/register', json={'username': "alice", 'email': "alice@example.com",
+                                    'password': "Passw0rd!x", 'confirm_password': "Passw0rd!x"})
+client.post('/add-collection', json={'title': "Main"})
+for title in ("List", "Other"):
+    client.post('/add-endpoint', json={'collection_title': "Main", 'endpoint_json': {
+        'title': title, 'url': url, 'method': "GET", 'headers': []}})
+endpoint_id = client.get('/collection-endpoints?collection_title=Main').get_json()['endpoints'][0]['id']
+
+result = {'runs': []}
+for _ in range(2):
+    response = client.post('/run-endpoint', json={'collection_title': "Main", 'endpoint_id': endpoint_id})
+    result['runs'].append([response.status_code, response.get_json()['status']])
+response = client.post('/run-collection', json={'collection_title': "Main"})
+result['collection'] = [response.status_code, response.get_json()['succeeded']]
+
+arguments = f"collection_title=Main&endpoint_id={endpoint_id}"
+result['history'] = client.get(f'/endpoint-history?{arguments}').get_json()
+result['statistics'] = client.get(f'/endpoint-statistics?{arguments}').get_json()
+
+events = client.post('/run-collection-load', json={'collection_title': "Main", 'iterations': 4}).get_data(as_text=True)
+result['load'] = json.loads(events.splitlines()[-1])['type']
+result['load_runs'] = client.get(f'/endpoint-statistics?{arguments}').get_json()['runs']
+
+# A failed history write leaves the run result alone, it is logged and counted
+with engine.begin() as connection:
+    connection.exec_driver_sql("DROP TABLE endpoint_runs")
+response = client.post('/run-endpoint', json={'collection_title': "Main", 'endpoint_id': endpoint_id})
+result['unsaved'] = [response.status_code, response.get_json()['status']]
+from utils.metrics import run_history_errors
+result['errors'] = run_history_errors.render()[-1]
+print(json.dumps(result))
+"""
+
+
+def missing_dependencies() -> list:
+    return [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(missing_dependencies(), "app dependencies are not installed")
+class RunHistoryTest(unittest.TestCase):
+
+    def test_runs_are_saved_and_read_back(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(directory, 'history.db')}",
+                PASSWORD_HASH_ROUNDS="4",
+                RUNNER_ALLOW_PRIVATE_HOSTS="true",
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+            )
+            completed = subprocess.run(
+                [sys.executable, "-c", HISTORY_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+            )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(result['runs'], [[200, 200], [200, 200]])
+        self.assertEqual(result['collection'], [200, 2])
+
+        # Two runs of /run-endpoint and one of /run-collection, newest first
+        runs = result['history']['runs']
+        self.assertEqual(len(runs), 3)
+        self.assertTrue(all(run['status'] == 200 and run['bytes'] == 12 and run['body'] == '{"ok": true}' for run in runs))
+
+        statistics = result['statistics']
+        self.assertEqual((statistics['runs'], statistics['errors'], statistics['avg_bytes']), (3, 0, 12))
+        for percentile in ('p50_ms', 'p95_ms', 'p99_ms'):
+            self.assertIsNotNone(statistics[percentile], percentile)
+
+        # Every request of the load run is saved too
+        self.assertEqual(result['load'], 'finished')
+        self.assertEqual(result['load_runs'], 3 + 4)
+
+        self.assertEqual(result['unsaved'], [200, 200])
+        self.assertEqual(result['errors'], "callapi_run_history_errors_total 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
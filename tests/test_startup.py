@@ -0,0 +1,66 @@
+"""
+Importing the app starts no background work: the session purger and the creation of the run partitions
+start from start_background_jobs(), the hook the servers call in every worker (gunicorn.conf.py, Quart before_serving).
+
+Runs the app in its own process (settings are read on import) against a temporary SQLite database.
+Needs the app dependencies (requirements.txt).
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPENDENCIES = ('flask', 'flask_cors', 'sqlalchemy', 'bcrypt', 'dotenv', 'ijson')
+
+STARTUP_SCRIPT = """
+import json
+import threading
+from unittest import mock
+
+with mock.patch('utils.session_purger.ensure_run_partitions') as ensure_run_partitions:
+    import app
+    from utils.session_purger import session_purger
+
+    result = {'imported': {'purger': session_purger.stats()['running'], 'partitions': ensure_run_partitions.call_count,
+                           'threads': sorted(thread.name for thread in threading.enumerate())}}
+    app.start_background_jobs()
+    result['started'] = {'purger': session_purger.stats()['running'], 'partitions': ensure_run_partitions.call_count}
+session_purger.stop()
+print(json.dumps(result))
+"""
+
+
+def missing_dependencies() -> list:
+    return [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(missing_dependencies(), "app dependencies are not installed")
+class StartupTest(unittest.TestCase):
+
+    def test_background_jobs_start_from_the_hook(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(directory, 'startup.db')}",
+                SESSION_PURGER_ENABLED="true",
+                SESSION_PURGER_MIN_INTERVAL="60",
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+            )
+            completed = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+            )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(result['imported'], {'purger': False, 'partitions': 0, 'threads': ["MainThread"]})
+        self.assertEqual(result['started'], {'purger': True, 'partitions': 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+/metrics and the */-stats routes are hidden unless STATS_ENDPOINTS_ENABLED is set (see utils.route_helpers).
+
+The setting is read when the app is imported, so every configuration runs the app in its own process.
+Needs the app dependencies (requirements.txt).
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPENDENCIES = ('flask', 'flask_cors', 'sqlalchemy', 'bcrypt', 'dotenv', 'ijson')
+STATS_ROUTES = ("/metrics", "/pool-stats", "/hashing-stats", "/session-cache-stats", "/dashboard-cache-stats")
+
+STATS_SCRIPT = """
+import json
+from app import app
+client = app.test_client()
+statuses = {}
+for path in %r:
+    statuses[path] = [client.get(path).status_code,
+                      client.get(path, headers={'Authorization': "Bearer s3cret"}).status_code]
+print(json.dumps(statuses))
+""" % (STATS_ROUTES,)
+
+
+def missing_dependencies() -> list:
+    return [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(missing_dependencies(), "app dependencies are not installed")
+class StatsEndpointsTest(unittest.TestCase):
+
+    def statuses(self, **settings) -> dict:
+        """:return: dictionary route -> [status without token, status with the token]"""
+        with tempfile.TemporaryDirectory() as directory:
+            env = {name: value for name, value in os.environ.items() if not name.startswith("STATS_")}
+            env.update(
+                DATABASE_URL=f"sqlite:///{os.path.join(directory, 'stats.db')}",
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+                **settings,
+            )
+            completed = subprocess.run(
+                [sys.executable, "-c", STATS_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+            )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def test_hidden_by_default(self) -> None:
+        self.assertEqual(self.statuses(), {path: [404, 404] for path in STATS_ROUTES})
+
+    def test_enabled(self) -> None:
+        self.assertEqual(self.statuses(STATS_ENDPOINTS_ENABLED="true"), {path: [200, 200] for path in STATS_ROUTES})
+
+    def test_enabled_with_token(self) -> None:
+        statuses = self.statuses(STATS_ENDPOINTS_ENABLED="true", STATS_TOKEN="s3cret")
+        self.assertEqual(statuses, {path: [404, 200] for path in STATS_ROUTES})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Queries of the streamed dashboard (/user-information?stream=1) are counted in /metrics and checked
+against the route budget, although they run after the view returned.
+
+Runs the app in its own process (settings are read on import) against a temporary SQLite database.
+Needs the app dependencies (requirements.txt).
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPENDENCIES = ('flask', 'flask_cors', 'sqlalchemy', 'bcrypt', 'dotenv', 'ijson')
+
+STREAM_SCRIPT = """
+import json
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.postgresql import JSONB
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kwargs):
+    return "JSON"
+
+from database.main import engine
+from database.models import Base
+Base.metadata.create_all(engine)
+
+import app as app_module
+from utils.query_log import QueryBudgetExceeded
+
+client = app_module.app.test_client()
+client.post('/auth/register', json={'username': "alice", 'email': "alice@example.com",
+                                    'password': "Passw0rd!x", 'confirm_password': "Passw0rd!x"})
+for number in range(2 * app_module.STREAM_BATCH_SIZE + 1):
+    client.post('/add-collection', json={'title': f"Collection {number}"})
+
+
+def user_information_metrics():
+    lines = client.get('/metrics').get_data(as_text=True).splitlines()
+    return {
+        'queries': [line.split()[-1] for line in lines if line.startswith('callapi_request_db_queries_sum{route="/user-information"}')],
+        'violations': [line.split()[-1] for line in lines if line.startswith('callapi_query_budget_violations_total{route="/user-information"}')],
+    }
+
+
+result = {}
+response = client.get('/user-information?stream=1')
+result['lines'] = len(response.get_data(as_text=True).splitlines())
+result['within_budget'] = user_information_metrics()
+
+# Every page running more queries than it declares, like an N+1 in get_collections_page
+app_module.COLLECTIONS_PAGE_QUERIES = 0
+try:
+    client.get('/user-information?stream=1').get_data()
+    result['error'] = None
+except QueryBudgetExceeded as error:
+    result['error'] = str(error).splitlines()[0]
+result['over_budget'] = user_information_metrics()
+print(json.dumps(result))
+"""
+
+
+def missing_dependencies() -> list:
+    return [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(missing_dependencies(), "app dependencies are not installed")
+class StreamBudgetTest(unittest.TestCase):
+
+    def test_stream_queries_counted_and_checked(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(directory, 'stream.db')}",
+                PASSWORD_HASH_ROUNDS="4",
+                STATS_ENDPOINTS_ENABLED="true",
+                STATS_TOKEN="",
+                QUERY_BUDGET_MODE="raise",
+                PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+            )
+            completed = subprocess.run(
+                [sys.executable, "-c", STREAM_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120
+            )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        # User line + one line per collection, three pages of collections
+        self.assertEqual(result['lines'], 102)
+        # User, then collections and endpoints of every page (the session is cached at registration)
+        self.assertEqual(result['within_budget'], {'queries': ["7.0"], 'violations': []})
+
+        self.assertEqual(result['error'], "/user-information ran 7 database queries, its budget is 4:")
+        self.assertEqual(result['over_budget'], {'queries': ["14.0"], 'violations': ["1"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,18 @@
 # cleanup_scheduler.py
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
 from dotenv import load_dotenv
 
 import psycopg2
 
+from utils.run_history import RUN_HISTORY_RETENTION_DAYS, RUN_HISTORY_ROLLUP_RETENTION_DAYS, RUN_HISTORY_PARTITIONS_AHEAD
 
-load_dotenv('../.env')
+
+# Same .env file as database/main.py, whatever the working directory is
+ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
+load_dotenv(ENV_FILE)
 
 DATABASE_HOST=os.getenv("DATABASE_HOST")
 DATABASE_PORT=os.getenv("DATABASE_PORT")
@@ -21,47 +26,305 @@ DB_DSN = os.getenv(
     f"dbname={DATABASE_NAME} user={DATABASE_USERNAME} password={DATABASE_PASSWORD} host={DATABASE_HOST} port={DATABASE_PORT}"
 )
 
-def cleanup_sessions():
+# Rows deleted per statement; small batches keep row locks and WAL bursts short
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", "5000"))
+# Pause between batches (seconds) so live validate_session queries get the table in between
+CLEANUP_BATCH_SLEEP = float(os.getenv("CLEANUP_BATCH_SLEEP", "0.05"))
+# Upper bound of batches per run, the rest is left for the next run
+CLEANUP_MAX_BATCHES = int(os.getenv("CLEANUP_MAX_BATCHES", "200"))
+
+CLEANUP_LOCK_ID = 42
+HISTORY_LOCK_ID = 43
+
+# The oldest expired sessions first, SKIP LOCKED leaves rows touched by a logout alone
+DELETE_EXPIRED_BATCH = """
+    DELETE FROM sessions
+    WHERE id IN (
+        SELECT id FROM sessions
+        WHERE expires_at <= now()
+        ORDER BY expires_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    );
+"""
+
+DELETE_EXPIRED_ROLLUPS_BATCH = """
+    DELETE FROM endpoint_run_rollups
+    WHERE (endpoint_id, hour, latency_bucket) IN (
+        SELECT endpoint_id, hour, latency_bucket FROM endpoint_run_rollups
+        WHERE hour < %s
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    );
+"""
+
+# Daily partitions of endpoint_runs are named endpoint_runs_YYYYMMDD
+RUN_PARTITION_FORMAT = "endpoint_runs_%Y%m%d"
+LIST_RUN_PARTITIONS = """
+    SELECT child.relname FROM pg_inherits
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    WHERE parent.relname = 'endpoint_runs';
+"""
+
+_connection = None
+
+
+def get_cleanup_connection():
+    """Returns the connection reused by every cleanup run, reconnecting if it was closed."""
+    global _connection
+    if _connection is None or _connection.closed:
+        _connection = psycopg2.connect(DB_DSN)
+        _connection.autocommit = True
+    return _connection
+
+
+def delete_in_batches(cur, statement: str, params: tuple, batch_size: int = CLEANUP_BATCH_SIZE,
+                      batch_sleep: float = CLEANUP_BATCH_SLEEP, max_batches: int = CLEANUP_MAX_BATCHES) -> tuple:
+    """
+    Runs a batched DELETE until it deletes less than a batch, every batch is its own transaction (autocommit).
+    :param statement: DELETE statement, its last parameter is the batch size
+    :param params: the other parameters of the statement
+    :return: (rows deleted, batches run)
+    """
+    deleted = 0
+    batches = 0
+    while batches < max_batches:
+        cur.execute(statement, params + (batch_size,))
+        batches += 1
+        deleted += cur.rowcount
+        if cur.rowcount < batch_size:
+            break
+        time.sleep(batch_sleep)
+
+    return deleted, batches
+
+
+def purge_expired_sessions(cur, batch_size: int = CLEANUP_BATCH_SIZE, batch_sleep: float = CLEANUP_BATCH_SLEEP,
+                           max_batches: int = CLEANUP_MAX_BATCHES) -> tuple:
+    """
+    Deletes expired sessions in batches.
+    :return: (rows deleted, batches run)
+    """
+    return delete_in_batches(cur, DELETE_EXPIRED_BATCH, (), batch_size, batch_sleep, max_batches)
+
+
+def run_locked_purge(cur, batch_size: int = CLEANUP_BATCH_SIZE, batch_sleep: float = CLEANUP_BATCH_SLEEP,
+                     max_batches: int = CLEANUP_MAX_BATCHES) -> dict:
+    """
+    Purges expired sessions while holding the cleanup advisory lock, so only one process
+    (scheduler or API replica) purges at a time.
+    :param cur: psycopg2 cursor of an autocommit connection
+    :return: dictionary with the run report
+    """
+    started = time.perf_counter()
+    report = {'locked': False, 'deleted': 0, 'batches': 0, 'backlog': False, 'duration_ms': 0.0}
+
+    # Încearcă să iei un lock global (schimbă 42 cu alt int fix dacă vrei)
+    cur.execute("SELECT pg_try_advisory_lock(%s);", (CLEANUP_LOCK_ID,))
+    if not cur.fetchone()[0]:
+        # Alt proces face deja cleanup
+        return report
+
+    report['locked'] = True
+    try:
+        report['deleted'], report['batches'] = purge_expired_sessions(cur, batch_size, batch_sleep, max_batches)
+        # Stopped by the batch limit, more expired sessions are probably waiting
+        report['backlog'] = report['batches'] >= max_batches
+    finally:
+        # Eliberează lock-ul
+        cur.execute("SELECT pg_advisory_unlock(%s);", (CLEANUP_LOCK_ID,))
+
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return report
+
+
+def cleanup_sessions() -> dict:
     """Șterge sesiunile expirate; protejat cu advisory lock ca să nu ruleze dublu."""
-    conn = psycopg2.connect(DB_DSN)
-    conn.autocommit = True
-    cur = conn.cursor()
     try:
-        # Încearcă să iei un lock global (schimbă 42 cu alt int fix dacă vrei)
-        cur.execute("SELECT pg_try_advisory_lock(42);")
-        locked = cur.fetchone()[0]
-        if not locked:
-            # Alt proces face deja cleanup
-            return
-
-        # Varianta simplă (rapidă, ai index pe expires_at)
-        cur.execute("""
-            DELETE FROM sessions
-            WHERE expires_at <= now();
-        """)
-        # Dacă vrei să vezi câte rânduri s-au șters:
-        # cur.rowcount are rezultate doar pentru DELETE simplu în anumite setări.
-        print(f"[{datetime.utcnow().isoformat()}] Cleanup DONE.")
+        conn = get_cleanup_connection()
+        with conn.cursor() as cur:
+            report = run_locked_purge(cur)
+
+        if report['locked']:
+            print(f"[{datetime.utcnow().isoformat()}] Cleanup DONE: {report['deleted']} sessions deleted "
+                  f"in {report['batches']} batches ({report['duration_ms']} ms).")
+        return report
+
     except Exception as e:
         print(f"[{datetime.utcnow().isoformat()}] Cleanup ERROR: {e}")
-    finally:
-        # Eliberează lock-ul și conexiunea
+        # Drop the connection (this releases the lock too), the next run opens a new one
+        if _connection is not None:
+            _connection.close()
+        return {'locked': False, 'deleted': 0, 'batches': 0, 'backlog': False, 'duration_ms': 0.0}
+
+def create_run_partition(cur, day) -> str:
+    """
+    Creates the partition of endpoint_runs for one day. Rows of that day already stored in
+    endpoint_runs_default (written before the partition existed) are moved into it first,
+    otherwise Postgres refuses the new partition.
+    :param cur: psycopg2 cursor of an autocommit connection
+    :param day: date of the partition
+    :return: name of the partition
+    """
+    name = day.strftime(RUN_PARTITION_FORMAT)
+    bounds = (day.isoformat(), (day + timedelta(days=1)).isoformat())
+    cur.execute("BEGIN;")
+    try:
+        cur.execute(f"CREATE TABLE {name} (LIKE endpoint_runs INCLUDING STORAGE);")
+        cur.execute(
+            f"WITH moved AS (DELETE FROM endpoint_runs_default WHERE ran_at >= %s AND ran_at < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved;",
+            bounds
+        )
+        cur.execute(f"ALTER TABLE endpoint_runs ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s);", bounds)
+        cur.execute("COMMIT;")
+    except Exception:
+        cur.execute("ROLLBACK;")
+        raise
+    return name
+
+
+def create_run_partitions(cur, today, days_ahead: int = RUN_HISTORY_PARTITIONS_AHEAD, existing: set = None) -> dict:
+    """
+    Creates the missing daily partitions from today to `days_ahead` days from today.
+    A partition that can't be created is reported and the next ones are still tried.
+    :param existing: names of the existing partitions (read from the database when None)
+    :return: dictionary with the partitions created and the errors
+    """
+    report = {'created': [], 'errors': []}
+    if existing is None:
+        cur.execute(LIST_RUN_PARTITIONS)
+        existing = {name for (name,) in cur.fetchall()}
+
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        name = day.strftime(RUN_PARTITION_FORMAT)
+        if name in existing:
+            continue
+        try:
+            report['created'].append(create_run_partition(cur, day))
+        except Exception as error:
+            print(f"[{datetime.utcnow().isoformat()}] Can't create partition {name}: {error}")
+            report['errors'].append(f"{name}: {error}")
+    return report
+
+
+def maintain_run_partitions(cur, today, retention_days: int = RUN_HISTORY_RETENTION_DAYS,
+                            days_ahead: int = RUN_HISTORY_PARTITIONS_AHEAD) -> dict:
+    """
+    Creates the daily partitions of endpoint_runs up to `days_ahead` days from today and drops
+    the partitions older than the retention (a whole day goes away without deleting rows).
+    The drops run even when a partition couldn't be created.
+    :param cur: psycopg2 cursor of an autocommit connection
+    :param today: current date
+    :return: dictionary with the partitions created and dropped and the errors
+    """
+    cur.execute(LIST_RUN_PARTITIONS)
+    existing = {name for (name,) in cur.fetchall()}
+
+    report = create_run_partitions(cur, today, days_ahead, existing)
+    report['dropped'] = []
+
+    cutoff = today - timedelta(days=retention_days)
+    for name in sorted(existing):
         try:
-            cur.execute("SELECT pg_advisory_unlock(42);")
-        except Exception:
-            pass
-        cur.close()
-        conn.close()
+            day = datetime.strptime(name, RUN_PARTITION_FORMAT).date()
+        except ValueError:
+            # endpoint_runs_default
+            continue
+        if day < cutoff:
+            try:
+                cur.execute(f"DROP TABLE IF EXISTS {name};")
+                report['dropped'].append(name)
+            except Exception as error:
+                print(f"[{datetime.utcnow().isoformat()}] Can't drop partition {name}: {error}")
+                report['errors'].append(f"{name}: {error}")
+
+    # Rows written while no daily partition existed
+    try:
+        cur.execute("DELETE FROM endpoint_runs_default WHERE ran_at < %s;", (cutoff,))
+    except Exception as error:
+        print(f"[{datetime.utcnow().isoformat()}] Can't purge endpoint_runs_default: {error}")
+        report['errors'].append(f"endpoint_runs_default: {error}")
+    return report
+
+
+def run_locked_history_cleanup(cur) -> dict:
+    """
+    Retention of the endpoint run history: daily partitions of the raw runs and expired hourly rollups,
+    while holding the history advisory lock (scheduler, embedded purger and API replicas take turns).
+    :param cur: psycopg2 cursor of an autocommit connection
+    :return: dictionary with the run report
+    """
+    started = time.perf_counter()
+    report = {'locked': False, 'created': [], 'dropped': [], 'errors': [], 'rollups_deleted': 0, 'duration_ms': 0.0}
+
+    cur.execute("SELECT pg_try_advisory_lock(%s);", (HISTORY_LOCK_ID,))
+    if not cur.fetchone()[0]:
+        return report
+
+    report['locked'] = True
+    try:
+        today = datetime.now().date()
+        report.update(maintain_run_partitions(cur, today))
+        report['rollups_deleted'], _ = delete_in_batches(
+            cur, DELETE_EXPIRED_ROLLUPS_BATCH, (today - timedelta(days=RUN_HISTORY_ROLLUP_RETENTION_DAYS),)
+        )
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s);", (HISTORY_LOCK_ID,))
+
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+    return report
+
+
+def prepare_run_partitions(cur) -> dict:
+    """
+    Creates today's and the next daily partitions when a process starts, so the first runs it records
+    don't land in endpoint_runs_default. Skipped when another process holds the history lock.
+    :param cur: psycopg2 cursor of an autocommit connection
+    """
+    cur.execute("SELECT pg_try_advisory_lock(%s);", (HISTORY_LOCK_ID,))
+    if not cur.fetchone()[0]:
+        return {'created': [], 'errors': []}
+    try:
+        return create_run_partitions(cur, datetime.now().date())
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s);", (HISTORY_LOCK_ID,))
+
+
+def cleanup_endpoint_runs() -> dict:
+    """
+    Retention of the endpoint run history (see run_locked_history_cleanup()).
+    Protected by its own advisory lock, like cleanup_sessions().
+    """
+    try:
+        conn = get_cleanup_connection()
+        with conn.cursor() as cur:
+            report = run_locked_history_cleanup(cur)
+
+        if report['locked']:
+            print(f"[{datetime.utcnow().isoformat()}] Run history cleanup DONE: {len(report['created'])} partitions created, "
+                  f"{len(report['dropped'])} dropped, {report['rollups_deleted']} rollups deleted, "
+                  f"{len(report['errors'])} errors ({report['duration_ms']} ms).")
+        return report
+
+    except Exception as e:
+        print(f"[{datetime.utcnow().isoformat()}] Run history cleanup ERROR: {e}")
+        if _connection is not None:
+            _connection.close()
+        return {'locked': False, 'created': [], 'dropped': [], 'errors': [str(e)], 'rollups_deleted': 0, 'duration_ms': 0.0}
 
 def main():
     scheduler = BackgroundScheduler()
     scheduler.add_job(cleanup_sessions, "interval", minutes=1, id="purge_sessions", max_instances=1, coalesce=True)
+    scheduler.add_job(cleanup_endpoint_runs, "interval", hours=1, id="purge_endpoint_runs", max_instances=1,
+                      coalesce=True, next_run_time=datetime.now())
     scheduler.start()
     print("Scheduler started. Press Ctrl+C to stop.")
 
     # Ține procesul în viață
     try:
-        import time
         while True:
             time.sleep(3600)
     except KeyboardInterrupt:
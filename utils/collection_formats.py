@@ -0,0 +1,408 @@
+"""
+Postman v2.1 and OpenAPI (JSON) import / export of collections.
+
+Import files are read with an incremental JSON parser (ijson): only the value of one request
+(Postman) or one path (OpenAPI) is in memory at a time. Parsers yield events:
+    ('collection', name)        - name of the collection found in the file
+    ('endpoint', endpoint_json) - endpoint in the format accepted by Database.add_endpoints()
+Exporters take an iterator of endpoint dictionaries and yield the document in string chunks
+(ASYNC_EXPORTERS: the same for an async iterator).
+"""
+import re
+import json
+from urllib.parse import urlsplit
+
+import ijson
+
+POSTMAN_SCHEMA = "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
+OPENAPI_METHODS = ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')
+
+# Prefix of a Postman item (request or folder), at any folder depth
+POSTMAN_ITEM_PREFIX = re.compile(r"^item\.item(\.item\.item)*$")
+
+
+class _ValueBuilder(object):
+    """Builds one JSON value out of ijson events."""
+
+    def __init__(self) -> None:
+        self._builder = ijson.ObjectBuilder()
+        self._depth = 0
+
+    def feed(self, event: str, value) -> bool:
+        """
+        :return: True when the value is complete
+        """
+        self._builder.event(event, value)
+        if event in ('start_map', 'start_array'):
+            self._depth += 1
+        elif event in ('end_map', 'end_array'):
+            self._depth -= 1
+        return self._depth == 0
+
+    @property
+    def value(self):
+        return self._builder.value
+
+
+class _BodyReader(object):
+    """
+    Binary file-like view of a request body for ijson. ijson probes the stream with read(0),
+    which Werkzeug's request stream takes for a client disconnect.
+    """
+
+    def __init__(self, stream) -> None:
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size) if size else b""
+
+
+def _postman_url(url) -> str:
+    if isinstance(url, str):
+        return url
+    if not isinstance(url, dict):
+        return ""
+    if url.get('raw'):
+        return url['raw']
+
+    host = url.get('host', "")
+    path = url.get('path', "")
+    host = ".".join(host) if isinstance(host, list) else host
+    path = "/".join(str(part) for part in path) if isinstance(path, list) else path
+    protocol = f"{url['protocol']}://" if url.get('protocol') else ""
+    return f"{protocol}{host}/{path}" if path else f"{protocol}{host}"
+
+
+def _postman_endpoint(title: str, request) -> dict:
+    if isinstance(request, str):
+        request = {'url': request}
+
+    return {
+        'title': title,
+        'url': _postman_url(request.get('url')),
+        'method': str(request.get('method') or "GET"),
+        'headers': [
+            {'name': header.get('key', ""), 'value': str(header.get('value', ""))}
+            for header in request.get('header') or []
+            if isinstance(header, dict) and not header.get('disabled')
+        ],
+    }
+
+
+def parse_postman(stream):
+    """
+    Streams a Postman v2.1 collection. Requests inside folders get the folder names as title prefix
+    ("Folder / Request").
+    :param stream: binary file-like object
+    """
+    items = []
+    builder = None
+
+    for prefix, event, value in ijson.parse(_BodyReader(stream)):
+        if builder is not None:
+            if builder.feed(event, value):
+                items[-1]['request'] = builder.value
+                builder = None
+            continue
+
+        if prefix == 'info.name' and event == 'string':
+            yield 'collection', value
+
+        elif POSTMAN_ITEM_PREFIX.match(prefix):
+            if event == 'start_map':
+                items.append({'name': None, 'request': None})
+            elif event == 'end_map':
+                item = items.pop()
+                if item['request'] is not None:
+                    names = [parent['name'] for parent in items if parent['name']] + [item['name'] or "Request"]
+                    yield 'endpoint', _postman_endpoint(" / ".join(names), item['request'])
+
+        elif items and prefix.endswith('.request') and POSTMAN_ITEM_PREFIX.match(prefix[:-len('.request')]):
+            if event == 'string':
+                items[-1]['request'] = value
+            elif event == 'start_map':
+                builder = _ValueBuilder()
+                builder.feed(event, value)
+
+        elif items and event == 'string' and prefix.endswith('.name') and POSTMAN_ITEM_PREFIX.match(prefix[:-len('.name')]):
+            items[-1]['name'] = value
+
+
+def _openapi_endpoints(base_url: str, path: str, path_item: dict):
+    if not isinstance(path_item, dict):
+        return
+
+    common_parameters = path_item.get('parameters') or []
+    for method in OPENAPI_METHODS:
+        operation = path_item.get(method)
+        if not isinstance(operation, dict):
+            continue
+
+        headers = []
+        for parameter in common_parameters + (operation.get('parameters') or []):
+            if isinstance(parameter, dict) and parameter.get('in') == 'header':
+                example = parameter.get('example', (parameter.get('schema') or {}).get('default', ""))
+                headers.append({'name': parameter.get('name', ""), 'value': str(example)})
+
+        # Servers declared on the operation or the path win over the document servers
+        servers = operation.get('servers') or path_item.get('servers') or []
+        server_url = base_url
+        if servers and isinstance(servers[0], dict) and servers[0].get('url'):
+            server_url = servers[0]['url']
+
+        yield {
+            'title': operation.get('summary') or operation.get('operationId') or f"{method.upper()} {path}",
+            'url': server_url.rstrip("/") + path.split("#")[0],
+            'method': method.upper(),
+            'headers': headers,
+        }
+
+
+def parse_openapi(stream):
+    """
+    Streams an OpenAPI 3 (or Swagger 2) JSON document, one endpoint per operation.
+    The base URL is the first server (or host + basePath); it must appear before "paths",
+    which is the case for the documents generated by the common tools.
+    :param stream: binary file-like object
+    """
+    base_url = ""
+    swagger = {'scheme': None, 'host': "", 'basePath': ""}
+    current_path = None
+    builder = None
+
+    for prefix, event, value in ijson.parse(_BodyReader(stream)):
+        if builder is not None:
+            if builder.feed(event, value):
+                for endpoint in _openapi_endpoints(base_url or _swagger_base_url(swagger), current_path, builder.value):
+                    yield 'endpoint', endpoint
+                builder = None
+            continue
+
+        if prefix == 'paths' and event == 'map_key':
+            current_path = value
+            builder = _ValueBuilder()
+        elif prefix == 'info.title' and event == 'string':
+            yield 'collection', value
+        elif prefix == 'servers.item.url' and event == 'string' and not base_url:
+            base_url = value
+        elif prefix in ('host', 'basePath') and event == 'string':
+            swagger[prefix] = value
+        elif prefix == 'schemes.item' and event == 'string' and swagger['scheme'] is None:
+            swagger['scheme'] = value
+
+
+def _swagger_base_url(swagger: dict) -> str:
+    if not swagger['host']:
+        return swagger['basePath']
+    return f"{swagger['scheme'] or 'https'}://{swagger['host']}{swagger['basePath']}"
+
+
+PARSERS = {
+    'postman': parse_postman,
+    'openapi': parse_openapi,
+}
+
+
+class _PostmanDocument(object):
+    """Chunks of a Postman v2.1 collection, one call per endpoint."""
+
+    def __init__(self, collection_title: str) -> None:
+        self.collection_title = collection_title
+        self.separator = ""
+
+    def start(self) -> str:
+        return '{"info": ' + json.dumps({'name': self.collection_title, 'schema': POSTMAN_SCHEMA}) + ', "item": ['
+
+    def add(self, endpoint: dict) -> str:
+        item = {
+            'name': endpoint['title'],
+            'request': {
+                'method': endpoint['method'].upper(),
+                'header': [
+                    {'key': header.get('name', ""), 'value': header.get('value', "")}
+                    for header in endpoint['headers'] or [] if isinstance(header, dict)
+                ],
+                'url': {'raw': endpoint['url']},
+            },
+        }
+        chunk = self.separator + json.dumps(item)
+        self.separator = ", "
+        return chunk
+
+    def end(self) -> str:
+        return ']}'
+
+
+class _OpenAPIDocument(object):
+    """
+    Chunks of an OpenAPI 3.0 document, one call per endpoint. Endpoints must come ordered by URL so the
+    operations of one path are contiguous. Every operation keeps its server (scheme + host) in "servers".
+    OpenAPI can't hold two operations with the same path and method, the extra ones get a "#<id>" suffix.
+    """
+
+    def __init__(self, collection_title: str) -> None:
+        self.collection_title = collection_title
+        self.emitted_paths = set()
+        self.current_path = None
+        self.current_methods = set()
+        self.path_separator = ""
+        self.operation_separator = ""
+
+    def start(self) -> str:
+        return '{"openapi": "3.0.3", "info": ' + json.dumps({'title': self.collection_title, 'version': "1.0.0"}) + ', "paths": {'
+
+    def add(self, endpoint: dict) -> str:
+        url = urlsplit(endpoint['url'])
+        path = url.path or "/"
+        method = endpoint['method'].lower()
+        chunk = ""
+
+        if path != self.current_path or method in self.current_methods:
+            if self.current_path is not None:
+                chunk += '}'
+            if path in self.emitted_paths:
+                path = f"{path}#{endpoint['id']}"
+            self.emitted_paths.add(path)
+            self.current_path = path
+            self.current_methods = set()
+            chunk += self.path_separator + json.dumps(path) + ': {'
+            self.path_separator = ", "
+            self.operation_separator = ""
+
+        operation = {
+            'summary': endpoint['title'],
+            'parameters': [
+                {'name': header.get('name', ""), 'in': 'header', 'schema': {'type': 'string', 'default': header.get('value', "")}}
+                for header in endpoint['headers'] or [] if isinstance(header, dict)
+            ],
+            'responses': {'default': {'description': "Response"}},
+        }
+        if url.scheme and url.netloc:
+            operation['servers'] = [{'url': f"{url.scheme}://{url.netloc}"}]
+
+        self.current_methods.add(method)
+        chunk += self.operation_separator + json.dumps(method) + ': ' + json.dumps(operation)
+        self.operation_separator = ", "
+        return chunk
+
+    def end(self) -> str:
+        return ('}' if self.current_path is not None else "") + '}}'
+
+
+def _export(document, endpoints):
+    yield document.start()
+    for endpoint in endpoints:
+        yield document.add(endpoint)
+    yield document.end()
+
+
+async def _export_async(document, endpoints):
+    yield document.start()
+    async for endpoint in endpoints:
+        yield document.add(endpoint)
+    yield document.end()
+
+
+def export_postman(collection_title: str, endpoints):
+    """
+    Yields a Postman v2.1 collection in chunks.
+    :param collection_title: title of the collection
+    :param endpoints: iterator of endpoint dictionaries (title, url, method, headers)
+    """
+    return _export(_PostmanDocument(collection_title), endpoints)
+
+
+def export_postman_async(collection_title: str, endpoints):
+    """Same as export_postman() for an async iterator of endpoints (AsyncDatabase.iter_endpoints())."""
+    return _export_async(_PostmanDocument(collection_title), endpoints)
+
+
+def export_openapi(collection_title: str, endpoints):
+    """
+    Yields an OpenAPI 3.0 document in chunks (see _OpenAPIDocument).
+    :param collection_title: title of the collection
+    :param endpoints: iterator of endpoint dictionaries (id, title, url, method, headers) ordered by URL
+    """
+    return _export(_OpenAPIDocument(collection_title), endpoints)
+
+
+def export_openapi_async(collection_title: str, endpoints):
+    """Same as export_openapi() for an async iterator of endpoints (AsyncDatabase.iter_endpoints())."""
+    return _export_async(_OpenAPIDocument(collection_title), endpoints)
+
+
+EXPORTERS = {
+    'postman': export_postman,
+    'openapi': export_openapi,
+}
+
+ASYNC_EXPORTERS = {
+    'postman': export_postman_async,
+    'openapi': export_openapi_async,
+}
+
+
+def import_collection(db, user_id: int, events, collection_title: str = None, batch_size: int = 500) -> dict:
+    """
+    Creates a collection from parser events and inserts its endpoints in batches (Database.add_endpoints).
+    Batches already inserted stay in the collection if the file turns out to be invalid further down.
+    :param db: Database object
+    :param user_id: ID of the user
+    :param events: iterator returned by one of PARSERS
+    :param collection_title: title of the new collection (default: the name found in the file)
+    :param batch_size: number of endpoints inserted per transaction
+    :return: Dictionary with import summary or error information
+    """
+    summary = {'collection': collection_title, 'created': 0, 'failed': 0, 'errors': []}
+    collection_id = None
+    batch = []
+
+    def flush():
+        nonlocal collection_id
+        if collection_id is None:
+            summary['collection'] = summary['collection'] or "Imported collection"
+            add_request = db.add_collection(user_id=user_id, collection_title=summary['collection'])
+            if add_request['status'] != 201:
+                return add_request
+            collection_request = db.get_collection_id(user_id=user_id, collection_title=summary['collection'])
+            if collection_request['status'] != 200:
+                return collection_request
+            collection_id = collection_request['data']['collection_id']
+
+        add_request = db.add_endpoints(collection_id=collection_id, endpoints_data=batch)
+        if 'results' not in add_request['data']:
+            return add_request
+
+        summary['created'] += add_request['data']['created']
+        summary['failed'] += add_request['data']['failed']
+        for result in add_request['data']['results']:
+            if result['status'] != 201 and len(summary['errors']) < 50:
+                summary['errors'].append({'title': result['title'], 'message': result['message']})
+        batch.clear()
+        return None
+
+    for kind, value in events:
+        if kind == 'collection':
+            summary['collection'] = summary['collection'] or value
+        else:
+            batch.append(value)
+            if len(batch) >= batch_size:
+                error = flush()
+                if error:
+                    return error
+
+    if batch:
+        error = flush()
+        if error:
+            return error
+
+    if collection_id is None:
+        return {
+            'status': 400,
+            'data': {'message': "No endpoints found in the file!"}
+        }
+
+    return {
+        'status': 201 if summary['created'] else 400,
+        'data': summary
+    }
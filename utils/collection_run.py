@@ -0,0 +1,307 @@
+"""
+Concurrent "run collection N times" engine.
+
+All endpoints of a collection are scheduled on an asyncio event loop (in a background thread):
+`concurrency` workers take jobs from the run, every job waits for its host semaphore and for the
+rate limiter, then the request itself goes through utils.request_runner (keep-alive pools per host).
+Progress events with latency percentiles are published while the run is in progress. Latencies are
+counted in the logarithmic buckets of utils.run_history, percentiles are within 10% of the exact value.
+
+The requests of every run go through the thread pool of the RunRegistry, so RUN_MAX_THREADS bounds
+the threads of all runs together and RUN_MAX_ACTIVE the number of runs in progress.
+
+Cancelling a run stops scheduling new requests; requests already sent finish (bounded by the runner timeout).
+With a recorder, the results are handed to it in batches of RUN_HISTORY_BATCH_SIZE (the last one before the
+final event), e.g. to save them in the run history.
+"""
+import os
+import time
+import queue
+import asyncio
+import secrets
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.request_runner import request_runner
+from utils.run_history import latency_bucket, histogram_percentiles
+
+RUN_MAX_CONCURRENCY = int(os.getenv("RUN_MAX_CONCURRENCY", "100"))
+RUN_MAX_PER_HOST = int(os.getenv("RUN_MAX_PER_HOST", "20"))
+RUN_MAX_REQUESTS = int(os.getenv("RUN_MAX_REQUESTS", "100000"))
+# Seconds between two progress events
+RUN_PROGRESS_INTERVAL = float(os.getenv("RUN_PROGRESS_INTERVAL", "1"))
+# Threads sending the requests of all the runs of this process, and runs in progress at the same time
+RUN_MAX_THREADS = int(os.getenv("RUN_MAX_THREADS", "200"))
+RUN_MAX_ACTIVE = int(os.getenv("RUN_MAX_ACTIVE", "10"))
+# Results handed to the recorder of a run (run history) at a time
+RUN_HISTORY_BATCH_SIZE = int(os.getenv("RUN_HISTORY_BATCH_SIZE", "500"))
+
+# Events that end a run
+FINAL_EVENTS = ('finished', 'cancelled', 'failed')
+
+
+def percentiles(histogram: dict) -> dict:
+    """
+    :param histogram: dictionary latency bucket -> number of requests
+    :return: dictionary with p50, p90, p95 and p99
+    """
+    return histogram_percentiles(histogram, (50, 90, 95, 99))
+
+
+class RateLimiter(object):
+    """
+    Spaces the requests of a run evenly so at most `rate` start every second.
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate
+        self._next_slot = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class CollectionRun(object):
+    """
+    One run of a list of endpoints, `iterations` times.
+    Events (dictionaries) are read with stream(): "started", "progress" (repeated), then one of
+    "finished", "cancelled" or "failed" (with the error and the summary of the requests done so far).
+    """
+
+    def __init__(self, user_id: int, endpoints: list, iterations: int = 1, concurrency: int = 10,
+                 per_host: int = 5, rate: float = None, body: str = None, runner=request_runner, recorder=None) -> None:
+        self.id = secrets.token_hex(8)
+        self.user_id = user_id
+        self.endpoints = endpoints
+        self.iterations = iterations
+        self.concurrency = max(1, min(concurrency, RUN_MAX_CONCURRENCY))
+        self.per_host = max(1, min(per_host, RUN_MAX_PER_HOST))
+        self.rate = rate
+        self.body = body
+        self.runner = runner
+        # Called with lists of results, in a thread of the default executor of the run loop
+        self.recorder = recorder
+        self.total = len(endpoints) * iterations
+
+        self.completed = 0
+        self.errors = 0
+        self.latencies = {}
+        self.per_endpoint = {}
+        self.unrecorded = []
+        self.cancelled = False
+        # Shared pool of the RunRegistry, set by RunRegistry.add(); without it the run uses its own threads
+        self.executor = None
+        self._events = queue.Queue()
+        self._loop = None
+        self._main_task = None
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._thread_main, name=f"collection-run-{self.id}", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        """Stops scheduling new requests, can be called from any thread."""
+        self.cancelled = True
+        if self._loop is not None and self._main_task is not None:
+            self._loop.call_soon_threadsafe(self._main_task.cancel)
+
+    def stream(self):
+        """
+        Yields the events of the run until it ends. Closing the generator (client gone) cancels the run.
+        """
+        try:
+            while True:
+                event = self._events.get()
+                yield event
+                if event['type'] in FINAL_EVENTS:
+                    return
+        finally:
+            self._stop_if_running()
+
+    async def stream_async(self):
+        """
+        Same as stream() for the ASGI app: the event loop awaits the events instead of blocking on them.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                event = await loop.run_in_executor(None, self._events.get)
+                yield event
+                if event['type'] in FINAL_EVENTS:
+                    return
+        finally:
+            self._stop_if_running()
+
+    def _stop_if_running(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self.cancel()
+
+    def _thread_main(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._run())
+        finally:
+            self._loop.close()
+
+    async def _run(self) -> None:
+        self._main_task = asyncio.current_task()
+        started = time.perf_counter()
+        self._events.put({'type': 'started', 'run_id': self.id, 'total': self.total,
+                          'concurrency': self.concurrency, 'per_host': self.per_host, 'rate': self.rate})
+
+        error = None
+        try:
+            if self.executor is not None:
+                await self._run_jobs(self.executor, started)
+            else:
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"run-{self.id}") as executor:
+                    await self._run_jobs(executor, started)
+        except asyncio.CancelledError:
+            self.cancelled = True
+        except Exception as exception:
+            print(exception)
+            error = f"{type(exception).__name__}: {exception}"
+        finally:
+            if self.unrecorded:
+                self._save_results(self.unrecorded)
+            # The stream always gets a final event, whatever stopped the run
+            self._events.put(self._summary(started, error))
+
+    async def _run_jobs(self, executor, started: float) -> None:
+        host_semaphores = {}
+        limiter = RateLimiter(self.rate) if self.rate else None
+        jobs = iter([endpoint for _ in range(self.iterations) for endpoint in self.endpoints])
+
+        async def worker():
+            loop = asyncio.get_running_loop()
+            for endpoint in jobs:
+                if self.cancelled:
+                    return
+                host = urlsplit(endpoint.get('url') or "").netloc
+                semaphore = host_semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+                async with semaphore:
+                    if limiter is not None:
+                        await limiter.acquire()
+                    result = await loop.run_in_executor(executor, self.runner.run, endpoint, self.body)
+                self._record(endpoint, result)
+
+                if self.recorder is not None:
+                    self.unrecorded.append(result)
+                    if len(self.unrecorded) >= RUN_HISTORY_BATCH_SIZE:
+                        batch, self.unrecorded = self.unrecorded, []
+                        await loop.run_in_executor(None, self._save_results, batch)
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(RUN_PROGRESS_INTERVAL)
+                self._events.put(self._progress(started))
+
+        reporting = asyncio.ensure_future(reporter())
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            # Cancelled, or one of the workers failed: stop the others before reporting
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        finally:
+            reporting.cancel()
+
+    def _save_results(self, results: list) -> None:
+        try:
+            self.recorder(results)
+        except Exception as exception:
+            # The run goes on without its history
+            print(exception)
+
+    def _summary(self, started: float, error: str = None) -> dict:
+        summary = self._progress(started)
+        summary.update({
+            'type': 'failed' if error is not None else 'cancelled' if self.cancelled else 'finished',
+            'endpoints': list(self.per_endpoint.values()),
+        })
+        if error is not None:
+            summary['error'] = error
+        for endpoint_stats in summary['endpoints']:
+            endpoint_stats.update(percentiles(endpoint_stats.pop('latencies')))
+        return summary
+
+    def _record(self, endpoint: dict, result: dict) -> None:
+        bucket = latency_bucket(result['timing']['total_ms'])
+        self.completed += 1
+        self.latencies[bucket] = self.latencies.get(bucket, 0) + 1
+
+        stats = self.per_endpoint.setdefault(endpoint.get('id'), {
+            'endpoint_id': endpoint.get('id'), 'title': endpoint.get('title'),
+            'requests': 0, 'errors': 0, 'status_codes': {}, 'latencies': {},
+        })
+        stats['requests'] += 1
+        stats['latencies'][bucket] = stats['latencies'].get(bucket, 0) + 1
+        status = str(result['status'])
+        stats['status_codes'][status] = stats['status_codes'].get(status, 0) + 1
+        if not result['ok']:
+            self.errors += 1
+            stats['errors'] += 1
+
+    def _progress(self, started: float) -> dict:
+        elapsed = time.perf_counter() - started
+        return {
+            'type': 'progress',
+            'run_id': self.id,
+            'completed': self.completed,
+            'total': self.total,
+            'errors': self.errors,
+            'elapsed_s': round(elapsed, 3),
+            'requests_per_second': round(self.completed / elapsed, 2) if elapsed else 0.0,
+            **percentiles(self.latencies),
+        }
+
+
+class RunRegistry(object):
+    """
+    Runs in progress in this process, so they can be cancelled by ID.
+    Owns the thread pool shared by the runs it accepts.
+    """
+
+    def __init__(self, max_runs: int = RUN_MAX_ACTIVE, max_threads: int = RUN_MAX_THREADS) -> None:
+        self.max_runs = max_runs
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="collection-run")
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def add(self, run: CollectionRun) -> bool:
+        """
+        Registers a run (before it is started) and gives it the shared thread pool.
+        :return: False when max_runs runs are already in progress
+        """
+        with self._lock:
+            if len(self._runs) >= self.max_runs:
+                return False
+            self._runs[run.id] = run
+        run.executor = self.executor
+        return True
+
+    def remove(self, run: CollectionRun) -> None:
+        with self._lock:
+            self._runs.pop(run.id, None)
+
+    def cancel(self, run_id: str, user_id: int) -> bool:
+        with self._lock:
+            run = self._runs.get(run_id)
+        if run is None or run.user_id != user_id:
+            return False
+        run.cancel()
+        return True
+
+
+active_runs = RunRegistry()
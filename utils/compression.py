@@ -0,0 +1,158 @@
+"""
+Content-Encoding negotiation and compression of the API responses.
+
+Encodings are picked from Accept-Encoding (q-values honoured) in the server preference order
+COMPRESSION_ENCODINGS, among the ones available: gzip always, br with the brotli package,
+zstd with the zstandard package (both in requirements.txt; without them the app falls back to gzip).
+Bodies smaller than COMPRESSION_MIN_SIZE are sent as they are.
+Streamed responses are compressed chunk by chunk with a flush after every chunk, so each NDJSON line
+reaches the client right away while the compression window still spans the whole stream.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_ENCODINGS = [
+    encoding.strip() for encoding in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if encoding.strip()
+]
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+AVAILABLE_ENCODINGS = {'gzip'} | ({'br'} if brotli is not None else set()) | ({'zstd'} if zstandard is not None else set())
+# Responses of these types are worth compressing
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def negotiate_encoding(accept_encoding: str):
+    """
+    :param accept_encoding: value of the Accept-Encoding request header
+    :return: chosen content coding or None for identity
+    """
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, parameters = part.strip().partition(";")
+        quality = 1.0
+        parameters = parameters.strip()
+        if parameters.startswith("q="):
+            try:
+                quality = float(parameters[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in COMPRESSION_ENCODINGS:
+        if encoding in AVAILABLE_ENCODINGS and accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(body) + compressor.flush()
+    if encoding == 'br':
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported encoding \"{encoding}\"")
+
+
+def encode_body(body: bytes, encoding):
+    """
+    Compresses a response body when it is big enough.
+    :return: (body, encoding actually applied or None)
+    """
+    if encoding is None or len(body) < COMPRESSION_MIN_SIZE:
+        return body, None
+    return compress(body, encoding), encoding
+
+
+class StreamCompressor(object):
+    """Incremental compressor of one response; every compress() call returns flushed output."""
+
+    def __init__(self, encoding: str) -> None:
+        self.encoding = encoding
+        if encoding == 'gzip':
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == 'br':
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        elif encoding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding \"{encoding}\"")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == 'gzip':
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_stream(chunks, encoding: str):
+    """
+    :param chunks: iterator of str or bytes
+    :return: generator of compressed bytes
+    """
+    compressor = StreamCompressor(encoding)
+    for chunk in chunks:
+        output = compressor.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if output:
+            yield output
+    yield compressor.finish()
+
+
+async def compress_stream_async(chunks, encoding: str):
+    """
+    Same as compress_stream() for the ASGI app.
+    :param chunks: async iterator of str or bytes
+    :return: async generator of compressed bytes
+    """
+    compressor = StreamCompressor(encoding)
+    async for chunk in chunks:
+        output = compressor.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if output:
+            yield output
+    yield compressor.finish()
+
+
+def is_compressible(response) -> bool:
+    """
+    :param response: Flask or Quart response
+    :return: True for buffered (Content-Length set) successful responses of a compressible type that aren't encoded yet
+    """
+    return (
+        COMPRESSION_ENABLED
+        and response.status_code == 200
+        and response.content_length is not None
+        and response.content_length >= COMPRESSION_MIN_SIZE
+        and 'Content-Encoding' not in response.headers
+        and (response.mimetype or "").startswith(COMPRESSIBLE_MIMETYPES)
+    )
+
+
+def set_encoding_headers(response, encoding) -> None:
+    """Marks a response body as encoded (None: identity, still varies on Accept-Encoding)."""
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add("Accept-Encoding")
@@ -0,0 +1,237 @@
+"""
+Cache of the rendered /user-information payload (JSON bytes), keyed by user_id.
+Every content coding (identity, gzip, br, zstd; see utils.compression) is cached next to the others,
+so repeat responses are neither serialized nor compressed again.
+
+Every entry is stored with the user's data_version (see utils.etag). A hit requires the version read
+by the request to match, so an entry written by another node or just before a change is never served.
+Write paths of database.main invalidate the entry too, which frees the memory right away.
+
+Backends:
+    LocalDashboardCache - in-process LRU bounded by number of entries and total bytes
+    RedisDashboardCache - shared by all nodes (DASHBOARD_CACHE_REDIS_URL, any Redis protocol server),
+                          bounded by DASHBOARD_CACHE_TTL and the server maxmemory / allkeys-lru policy
+
+The ASGI app uses get_async() / set_async(): the Redis round trips run in the default executor of the
+event loop. Invalidations from a write running on an event loop thread (AsyncDatabase.run_sync) are
+handed to the executor the same way.
+"""
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "1000"))
+DASHBOARD_CACHE_MAX_BYTES = int(os.getenv("DASHBOARD_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Empty: in-process cache
+DASHBOARD_CACHE_REDIS_URL = os.getenv("DASHBOARD_CACHE_REDIS_URL", "")
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "3600"))
+DASHBOARD_CACHE_REDIS_PREFIX = "callapi:dashboard:"
+DASHBOARD_CACHE_ENCODINGS = ('identity', 'gzip', 'br', 'zstd')
+
+
+class LocalDashboardCache(object):
+    """
+    LRU of user_id -> (data_version, {encoding: body}). Bodies bigger than max_bytes are not cached.
+    """
+
+    def __init__(self, max_size: int = DASHBOARD_CACHE_SIZE, max_bytes: int = DASHBOARD_CACHE_MAX_BYTES) -> None:
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int, data_version: int, encoding: str = 'identity'):
+        """
+        :return: cached body in the given content coding or None
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            body = entry[1].get(encoding) if entry is not None and entry[0] == data_version else None
+            if body is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return body
+
+    async def get_async(self, user_id: int, data_version: int, encoding: str = 'identity'):
+        """Same as get() for the ASGI app (in memory, nothing to wait for)."""
+        return self.get(user_id, data_version, encoding)
+
+    def set(self, user_id: int, data_version: int, body: bytes, encoding: str = 'identity') -> None:
+        if self.max_size <= 0 or len(body) > self.max_bytes:
+            return
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > data_version:
+                # A slow request finished after a newer version was cached
+                return
+            if entry is None or entry[0] != data_version:
+                if entry is not None:
+                    self._bytes -= sum(len(cached) for cached in entry[1].values())
+                entry = (data_version, {})
+                self._entries[user_id] = entry
+
+            previous = entry[1].get(encoding)
+            if previous is not None:
+                self._bytes -= len(previous)
+            entry[1][encoding] = body
+            self._bytes += len(body)
+            self._entries.move_to_end(user_id)
+
+            while len(self._entries) > self.max_size or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= sum(len(cached) for cached in evicted.values())
+                self.evictions += 1
+
+    async def set_async(self, user_id: int, data_version: int, body: bytes, encoding: str = 'identity') -> None:
+        self.set(user_id, data_version, body, encoding)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._bytes -= sum(len(cached) for cached in entry[1].values())
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'local',
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class RedisDashboardCache(object):
+    """
+    Same interface as LocalDashboardCache, stored as "<data_version>:<body>" under one key per user and encoding.
+    Redis errors are counted and treated as misses, the dashboard is then built from the database.
+    """
+
+    def __init__(self, url: str = DASHBOARD_CACHE_REDIS_URL, ttl: int = DASHBOARD_CACHE_TTL,
+                 max_bytes: int = DASHBOARD_CACHE_MAX_BYTES, client=None) -> None:
+        self.client = client or redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, user_id: int, data_version: int, encoding: str = 'identity'):
+        try:
+            value = self.client.get(f"{DASHBOARD_CACHE_REDIS_PREFIX}{user_id}:{encoding}")
+        except redis.RedisError as error:
+            print(error)
+            self._count('errors')
+            return None
+
+        if value is not None:
+            version, _, body = value.partition(b":")
+            if version == str(data_version).encode():
+                self._count('hits')
+                return body
+
+        self._count('misses')
+        return None
+
+    async def get_async(self, user_id: int, data_version: int, encoding: str = 'identity'):
+        """Same as get() for the ASGI app: the event loop awaits the Redis round trip instead of blocking on it."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, user_id, data_version, encoding)
+
+    def set(self, user_id: int, data_version: int, body: bytes, encoding: str = 'identity') -> None:
+        if len(body) > self.max_bytes:
+            return
+        try:
+            self.client.set(f"{DASHBOARD_CACHE_REDIS_PREFIX}{user_id}:{encoding}", str(data_version).encode() + b":" + body, ex=self.ttl)
+        except redis.RedisError as error:
+            print(error)
+            self._count('errors')
+
+    async def set_async(self, user_id: int, data_version: int, body: bytes, encoding: str = 'identity') -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.set, user_id, data_version, body, encoding)
+
+    def invalidate(self, user_id: int) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._delete(user_id)
+        else:
+            # Write of the ASGI app, the event loop thread must not wait for Redis
+            loop.run_in_executor(None, self._delete, user_id)
+
+    def _delete(self, user_id: int) -> None:
+        try:
+            self.client.delete(*(f"{DASHBOARD_CACHE_REDIS_PREFIX}{user_id}:{encoding}" for encoding in DASHBOARD_CACHE_ENCODINGS))
+            self._count('invalidations')
+        except redis.RedisError as error:
+            print(error)
+            self._count('errors')
+
+    def clear(self) -> None:
+        try:
+            for key in self.client.scan_iter(f"{DASHBOARD_CACHE_REDIS_PREFIX}*"):
+                self.client.delete(key)
+        except redis.RedisError as error:
+            print(error)
+            self._count('errors')
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'redis',
+                'ttl': self.ttl,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'invalidations': self.invalidations,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+def create_dashboard_cache():
+    """
+    :return: RedisDashboardCache when DASHBOARD_CACHE_REDIS_URL is set (and redis is installed), else LocalDashboardCache
+    """
+    if DASHBOARD_CACHE_REDIS_URL:
+        if redis is not None:
+            return RedisDashboardCache()
+        print("DASHBOARD_CACHE_REDIS_URL is set but the redis package is not installed, using the in-process cache.")
+    return LocalDashboardCache()
+
+
+dashboard_cache = create_dashboard_cache()
@@ -0,0 +1,26 @@
+"""
+Validators of the dashboard (/user-information) responses.
+
+The ETag is derived from the user's data_version (database.models.User), which every Database method
+changing collections or endpoints increments, so a poll can be answered with 304 after reading one users row.
+Query arguments are part of the URL, different pages of the dashboard are cached separately by the client.
+"""
+
+
+def dashboard_etag(user_id: int, data_version: int) -> str:
+    """
+    :return: opaque ETag value (unquoted)
+    """
+    return f"{user_id}.{data_version}"
+
+
+def set_dashboard_validators(response, etag: str):
+    """
+    Adds the (weak) ETag and makes the client revalidate before reusing the response.
+    Works for Flask and Quart responses.
+    :return: the response
+    """
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
@@ -1,15 +1,178 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
 
-def hash_password(password: str) -> str:
+from utils.metrics import record_bcrypt_time
+
+# bcrypt work factor used for new hashes
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+# Rehash stored passwords whose work factor differs from PASSWORD_HASH_ROUNDS after a successful login
+PASSWORD_HASH_REHASH_ON_LOGIN = os.getenv("PASSWORD_HASH_REHASH_ON_LOGIN", "true").lower() in ("1", "true", "yes")
+# Threads that run bcrypt (bcrypt releases the GIL, so this is roughly the number of cores to spend on it)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+# Hash requests allowed to wait for a worker before new ones are rejected
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing pool queue is full. Routes answer it with 503."""
+
+
+class PasswordHasher(object):
+    """
+    Bounded worker pool for bcrypt. At most `workers` hashes run at the same time and
+    at most `queue_size` more wait for a worker; anything above that fails fast with PasswordHashingBusy.
+
+    run_async() frees the event loop while bcrypt runs. run() (WSGI) still holds the request thread until
+    the hash is done: there the pool only bounds how many hashes run at once and rejects the excess.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE_SIZE) -> None:
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+        self.wait_time_total = 0.0
+
+    def run(self, function, *args):
+        """
+        Runs `function(*args)` on the pool and waits for the result.
+        :raise PasswordHashingBusy: when the queue is full
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHashingBusy("Password hashing queue is full")
+
+        with self._lock:
+            self.in_flight += 1
+
+        submitted_at = time.perf_counter()
+        # (bcrypt time, queue wait), measured by the worker
+        timing = [0.0, 0.0]
+        try:
+            return self._executor.submit(self._timed, submitted_at, timing, function, *args).result()
+        finally:
+            record_bcrypt_time(*timing)
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    async def run_async(self, function, *args):
+        """
+        Same as run() for the ASGI app: the event loop awaits the result instead of blocking on it.
+        :raise PasswordHashingBusy: when the queue is full
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHashingBusy("Password hashing queue is full")
+
+        with self._lock:
+            self.in_flight += 1
+
+        submitted_at = time.perf_counter()
+        # (bcrypt time, queue wait), measured by the worker
+        timing = [0.0, 0.0]
+        try:
+            return await asyncio.wrap_future(self._executor.submit(self._timed, submitted_at, timing, function, *args))
+        finally:
+            record_bcrypt_time(*timing)
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def _timed(self, submitted_at: float, timing: list, function, *args):
+        start = time.perf_counter()
+        timing[1] = start - submitted_at
+        with self._lock:
+            self.running += 1
+            self.wait_time_total += timing[1]
+        try:
+            return function(*args)
+        finally:
+            elapsed = timing[0] = time.perf_counter() - start
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.hash_time_total += elapsed
+                if elapsed > self.hash_time_max:
+                    self.hash_time_max = elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'running': self.running,
+                'queued': self.in_flight - self.running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'hash_ms_avg': round(self.hash_time_total / self.completed * 1000, 3) if self.completed else 0.0,
+                'hash_ms_max': round(self.hash_time_max * 1000, 3),
+                'wait_ms_avg': round(self.wait_time_total / self.completed * 1000, 3) if self.completed else 0.0,
+            }
+
+
+password_hasher = PasswordHasher()
+
+
+def _hash_password(password: str) -> str:
     # Generate salt and hash
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=PASSWORD_HASH_ROUNDS)
     hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
     # Return as string (decode from bytes)
     return hashed.decode("utf-8")
 
-def check_password(password: str, hashed: str) -> bool:
+
+def _check_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
 
+
+def hash_password(password: str) -> str:
+    return password_hasher.run(_hash_password, password)
+
+
+def check_password(password: str, hashed: str) -> bool:
+    return password_hasher.run(_check_password, password, hashed)
+
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run_async(_hash_password, password)
+
+
+async def check_password_async(password: str, hashed: str) -> bool:
+    return await password_hasher.run_async(_check_password, password, hashed)
+
+
+def get_hash_rounds(hashed: str) -> int:
+    """
+    Reads the work factor of a bcrypt hash ("$2b$12$..." -> 12).
+    Returns 0 if the string is not a bcrypt hash.
+    """
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return 0
+    return int(parts[2])
+
+
+def needs_rehash(hashed: str) -> bool:
+    """
+    Checks if a stored hash was created with a different work factor than the current policy.
+    """
+    return PASSWORD_HASH_REHASH_ON_LOGIN and get_hash_rounds(hashed) != PASSWORD_HASH_ROUNDS
+
 # # Example usage
 # plain = "AdministratorUserPassword27!"
 # hashed_pw = hash_password(plain)
@@ -18,4 +181,4 @@ def check_password(password: str, hashed: str) -> bool:
 #
 # # Verify later
 # print("Correct password?", check_password("AdministratorUserPassword27!", hashed_pw))
-# print("Wrong password?", check_password("wrongpass", hashed_pw))
\ No newline at end of file
+# print("Wrong password?", check_password("wrongpass", hashed_pw))
@@ -0,0 +1,83 @@
+"""
+Pluggable JSON provider for the Flask (app.py) and Quart (asgi_app.py) apps.
+
+JSON_PROVIDER selects the serializer:
+    orjson  - orjson when it is installed (default), dataclasses (database.schemas) are serialized natively
+    default - the framework provider (json module)
+Output stays compatible with the default provider: dates are formatted by the framework and
+the response is compact. Keys are sorted only where the framework provider sorts them.
+"""
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "orjson").lower()
+# Responses are serialized by orjson (database.schemas relies on it for the raw headers)
+USE_ORJSON = orjson is not None and JSON_PROVIDER == 'orjson'
+
+
+class FastJSONProviderMixin(object):
+    """
+    Mixed into the framework JSON provider class, every call falls back to it when orjson is disabled
+    or arguments only the json module understands are passed.
+    """
+
+    use_orjson = USE_ORJSON
+
+    def _orjson_options(self) -> int:
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if getattr(self, 'sort_keys', False):
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def _orjson_default(self, value):
+        default = getattr(self, 'default', None)
+        if default is None:
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+        return default(value)
+
+    def dumps_bytes(self, obj, **kwargs) -> bytes:
+        """
+        :return: UTF-8 JSON document, without the str round-trip when orjson is used
+        """
+        if self.use_orjson and not kwargs:
+            return orjson.dumps(obj, default=self._orjson_default, option=self._orjson_options())
+        return super().dumps(obj, **kwargs).encode("utf-8")
+
+    def dumps(self, obj, **kwargs) -> str:
+        if self.use_orjson and not kwargs:
+            return self.dumps_bytes(obj).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if not self.use_orjson:
+            return super().response(*args, **kwargs)
+
+        if args and kwargs:
+            raise TypeError("app.json.response() takes either args or kwargs, not both")
+        if not args and not kwargs:
+            obj = None
+        elif len(args) == 1:
+            obj = args[0]
+        else:
+            obj = args or kwargs
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def install_json_provider(app):
+    """
+    Replaces the JSON provider of a Flask or Quart app with the fast provider built on its own class.
+    :return: the app
+    """
+    base = app.json_provider_class
+    app.json_provider_class = type(f"Fast{base.__name__}", (FastJSONProviderMixin, base), {})
+    app.json = app.json_provider_class(app)
+    return app
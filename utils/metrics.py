@@ -0,0 +1,359 @@
+"""
+Request, database and bcrypt instrumentation, exported in the Prometheus text format on /metrics.
+
+Every request gets a RequestStats (context variable) that the SQLAlchemy engine events and the
+password hasher add to: number of queries, time spent in the database, time spent in bcrypt and time spent
+waiting for a bcrypt worker.
+When the request ends the values are observed in per-route histograms, so a route whose query count
+jumps (N+1) shows up in callapi_request_db_queries right away.
+A streamed body that still queries the database is wrapped with track_stream() / track_stream_async(): the
+request then ends with the stream, its queries are counted (and checked against the route budget) too.
+Like the */-stats routes, /metrics only answers when STATS_ENDPOINTS_ENABLED is set (see utils.route_helpers);
+with STATS_TOKEN the scraper sends it as a bearer token.
+"""
+import time
+import threading
+import contextvars
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter(object):
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(object):
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (not cumulative) + overflow, sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry(object):
+    """
+    Metrics of this process. Gauges are read when /metrics is scraped from the existing stats() functions.
+    """
+
+    def __init__(self) -> None:
+        self._metrics = []
+        self._gauges = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_gauges(self, prefix: str, function, documentation: str) -> None:
+        """
+        :param prefix: metric name prefix, every numeric key of the dictionary becomes "<prefix>_<key>"
+        :param function: function returning a dictionary (e.g. get_pool_status)
+        """
+        self._gauges.append((prefix, function, documentation))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        for prefix, function, documentation in self._gauges:
+            try:
+                values = function()
+            except Exception as error:
+                print(error)
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# HELP {prefix}_{key} {documentation}")
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "callapi_request_duration_seconds", "Request latency by route.", ("route", "method", "status"))
+request_db_queries = metrics.histogram(
+    "callapi_request_db_queries", "Database queries per request.", ("route",), QUERY_COUNT_BUCKETS)
+request_db_duration = metrics.histogram(
+    "callapi_request_db_duration_seconds", "Time spent in database queries per request.", ("route",))
+request_bcrypt_duration = metrics.histogram(
+    "callapi_request_bcrypt_duration_seconds", "Time spent hashing or checking passwords per request.", ("route",))
+request_bcrypt_wait = metrics.histogram(
+    "callapi_request_bcrypt_wait_seconds", "Time spent waiting for a password hashing worker per request.", ("route",))
+db_query_duration = metrics.histogram(
+    "callapi_db_query_duration_seconds", "Duration of every database query.")
+db_query_errors = metrics.counter(
+    "callapi_db_query_errors_total", "Database queries that raised an error.")
+run_history_errors = metrics.counter(
+    "callapi_run_history_errors_total", "Run results that could not be saved in the run history.")
+
+
+class RequestStats(object):
+    """Counters of the request in progress."""
+
+    __slots__ = ('started', 'queries', 'db_time', 'bcrypt_time', 'bcrypt_wait', 'statements', 'allowed_queries', 'finishers')
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.bcrypt_time = 0.0
+        self.bcrypt_wait = 0.0
+        # (caller, duration, statement) of every query, only for routes with a query budget (see utils.query_log)
+        self.statements = None
+        # Queries allowed on top of the route budget (see utils.query_log.allow_queries)
+        self.allowed_queries = 0
+        # End-of-request work waiting for the streamed body (see track_stream), None for buffered responses
+        self.finishers = None
+
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_request_stats():
+    """:return: RequestStats of the request in progress or None outside a request"""
+    return _request_stats.get()
+
+
+def start_request() -> RequestStats:
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def finish_request(route: str, method: str, status: int) -> None:
+    """Observes the stats of the request in progress in the per-route histograms."""
+    stats = _request_stats.get()
+    if stats is None:
+        return
+    _request_stats.set(None)
+
+    request_duration.observe(time.perf_counter() - stats.started, (route, method, str(status)))
+    request_db_queries.observe(stats.queries, (route,))
+    request_db_duration.observe(stats.db_time, (route,))
+    if stats.bcrypt_time:
+        request_bcrypt_duration.observe(stats.bcrypt_time, (route,))
+        request_bcrypt_wait.observe(stats.bcrypt_wait, (route,))
+
+
+def run_at_request_end(finisher) -> None:
+    """
+    Runs the end-of-request work of an after_request hook: right away, or when the body
+    is streamed with track_stream() / track_stream_async(), once the stream has ended.
+    """
+    stats = _request_stats.get()
+    if stats is not None and stats.finishers is not None:
+        stats.finishers.append(finisher)
+    else:
+        finisher()
+
+
+def _open_stream():
+    """:return: stats of the request, now waiting for its stream (None outside a request)"""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.finishers = []
+    return stats
+
+
+def _close_stream(stats: RequestStats) -> None:
+    finishers, stats.finishers = stats.finishers, None
+    error = None
+    for finisher in finishers:
+        try:
+            finisher()
+        except Exception as exception:
+            error = error or exception
+    if error is not None:
+        raise error
+
+
+def track_stream(chunks):
+    """
+    Keeps the request open while a streamed body is generated. Call it in the view, before returning.
+    :param chunks: iterator of the body
+    :return: iterator of the same chunks
+    """
+    stats = _open_stream()
+    if stats is None:
+        return chunks
+    return _tracked_stream(chunks, stats)
+
+
+def _tracked_stream(chunks, stats: RequestStats):
+    _request_stats.set(stats)
+    try:
+        yield from chunks
+    finally:
+        _request_stats.set(stats)
+        _close_stream(stats)
+
+
+def track_stream_async(chunks):
+    """
+    Same as track_stream() for the ASGI app.
+    :param chunks: async iterator of the body
+    """
+    stats = _open_stream()
+    if stats is None:
+        return chunks
+    return _tracked_stream_async(chunks, stats)
+
+
+async def _tracked_stream_async(chunks, stats: RequestStats):
+    _request_stats.set(stats)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        _request_stats.set(stats)
+        _close_stream(stats)
+
+
+def record_bcrypt_time(seconds: float, wait: float = 0.0) -> None:
+    """
+    :param seconds: time spent in bcrypt
+    :param wait: time spent waiting for a worker of the hashing pool before that
+    """
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.bcrypt_time += seconds
+        stats.bcrypt_wait += wait
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    db_query_duration.observe(elapsed)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+
+
+def _handle_error(exception_context) -> None:
+    db_query_errors.inc()
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start'):
+        connection.info['query_start'].pop()
+
+
+def instrument_queries(engine) -> None:
+    """
+    Counts and times every query of a (sync) engine; for an AsyncEngine pass engine.sync_engine.
+    """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+def _route_of(request) -> str:
+    # The URL rule, not the path, keeps the number of label values bounded
+    return request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+
+
+def init_app_metrics(app, request, asynchronous: bool = False) -> None:
+    """
+    Registers the request hooks on a Flask app (or a Quart app with asynchronous=True).
+    :param app: Flask or Quart app
+    :param request: the request proxy of the framework
+    """
+    if asynchronous:
+        @app.before_request
+        async def start_request_metrics():
+            start_request()
+
+        @app.after_request
+        async def finish_request_metrics(response):
+            route, method, status = _route_of(request), request.method, response.status_code
+            run_at_request_end(lambda: finish_request(route, method, status))
+            return response
+    else:
+        @app.before_request
+        def start_request_metrics():
+            start_request()
+
+        @app.after_request
+        def finish_request_metrics(response):
+            route, method, status = _route_of(request), request.method, response.status_code
+            run_at_request_end(lambda: finish_request(route, method, status))
+            return response
@@ -0,0 +1,226 @@
+"""
+Slow-query log and per-request query budgets, on top of the engine events of utils.metrics.
+
+Slow queries (SLOW_QUERY_MS, 0 disables the log) are printed with the statement, a fingerprint of the
+parameters (their shape and a short hash, never the values) and the Database method that ran them.
+
+Routes declare how many queries they may run with @query_budget(n), work that grows with the data by
+design asks for more with allow_queries(n). Queries of a streamed body (utils.metrics.track_stream) count too. QUERY_BUDGET_MODE decides what
+happens when a request goes over its budget:
+    raise - QueryBudgetExceeded with the list of queries of the request (the request fails)
+    warn  - the same report is printed
+    off   - budgets are not checked
+    auto  - raise when the app runs in debug or testing mode, otherwise off (default)
+That way an N+1 pattern fails the dev server and the tests instead of quietly slowing production down.
+"""
+import os
+import sys
+import time
+import hashlib
+
+from sqlalchemy import event
+
+from utils.metrics import metrics, current_request_stats, run_at_request_end
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+# Longer statements are cut in the log
+SLOW_QUERY_STATEMENT_CHARS = int(os.getenv("SLOW_QUERY_STATEMENT_CHARS", "1000"))
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "auto").lower()
+
+# Frames of these files are reported as the caller of a query
+DATABASE_MODULES = tuple(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', name)
+    for name in ('main.py', 'async_main.py')
+)
+
+slow_queries = metrics.counter(
+    "callapi_db_slow_queries_total", "Database queries slower than SLOW_QUERY_MS.")
+query_budget_violations = metrics.counter(
+    "callapi_query_budget_violations_total", "Requests that ran more queries than their route budget.", ("route",))
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised (QUERY_BUDGET_MODE=raise) when a request runs more queries than the budget of its route."""
+
+
+def query_budget(queries: int):
+    """
+    Decorator declaring the maximum number of database queries of a route. Put it below @app.route.
+    :param queries: maximum number of queries of one request
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+
+    return decorator
+
+
+def allow_queries(queries: int) -> None:
+    """
+    Raises the budget of the request in progress, for work that grows with the data by design
+    (e.g. every page of the streamed dashboard after the first one).
+    :param queries: number of extra queries
+    """
+    stats = current_request_stats()
+    if stats is not None:
+        stats.allowed_queries += queries
+
+
+def database_caller() -> str:
+    """
+    :return: Database method(s) running the current query, outermost first (e.g.
+             "Database.change_endpoint > Database._bump_data_version"), or "<outside Database>"
+    """
+    callers = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename in DATABASE_MODULES:
+            name = getattr(code, 'co_qualname', code.co_name)
+            if not callers or callers[-1] != name:
+                callers.append(name)
+        elif callers:
+            break
+        frame = frame.f_back
+
+    return " > ".join(reversed(callers)) if callers else "<outside Database>"
+
+
+def parameters_fingerprint(parameters) -> str:
+    """
+    :param parameters: parameters of one execution (dict or tuple) or of an executemany (list of them)
+    :return: "<rows>x(<name:type,...>) #<hash>", equal for equal parameters without showing their values
+    """
+    rows, sample = 1, parameters
+    if isinstance(parameters, list) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        rows, sample = len(parameters), parameters[0]
+
+    if isinstance(sample, dict):
+        shape = ",".join(f"{name}:{type(value).__name__}" for name, value in sample.items())
+    else:
+        shape = ",".join(type(value).__name__ for value in sample or ())
+
+    digest = hashlib.blake2b(repr(parameters).encode("utf-8"), digest_size=6).hexdigest()
+    return f"{rows}x({shape}) #{digest}"
+
+
+def _statement_text(statement: str) -> str:
+    text = " ".join(statement.split())
+    if len(text) > SLOW_QUERY_STATEMENT_CHARS:
+        text = text[:SLOW_QUERY_STATEMENT_CHARS] + "..."
+    return text
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault('query_log_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info['query_log_start'].pop()
+    slow = SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS
+    stats = current_request_stats()
+    recording = stats is not None and stats.statements is not None
+    if not slow and not recording:
+        return
+
+    caller = database_caller()
+    if recording:
+        stats.statements.append((caller, elapsed, statement))
+    if slow:
+        slow_queries.inc()
+        print(
+            f"Slow query ({elapsed * 1000:.1f} ms) in {caller} "
+            f"[params {parameters_fingerprint(parameters)}]: {_statement_text(statement)}"
+        )
+
+
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_log_start'):
+        connection.info['query_log_start'].pop()
+
+
+def instrument_query_log(engine) -> None:
+    """
+    Logs the slow queries of a (sync) engine and records the queries of requests with a budget;
+    for an AsyncEngine pass engine.sync_engine.
+    """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+def budget_report(route: str, budget: int, statements: list) -> str:
+    """:return: readable list of the queries a request ran over its budget"""
+    lines = [f"{route} ran {len(statements)} database queries, its budget is {budget}:"]
+    for position, (caller, elapsed, statement) in enumerate(statements, start=1):
+        lines.append(f"  {position}. {caller} ({elapsed * 1000:.1f} ms): {_statement_text(statement)}")
+    return "\n".join(lines)
+
+
+def _budget_mode(app) -> str:
+    if QUERY_BUDGET_MODE == 'auto':
+        return 'raise' if app.debug or app.testing else 'off'
+    return QUERY_BUDGET_MODE
+
+
+def _route_budget(app, request):
+    view = app.view_functions.get(request.endpoint) if request.endpoint else None
+    return getattr(view, 'query_budget', None)
+
+
+def _start_budget(app, request) -> None:
+    stats = current_request_stats()
+    if stats is not None and _budget_mode(app) != 'off' and _route_budget(app, request) is not None:
+        stats.statements = []
+
+
+def _check_budget(app, request) -> None:
+    stats = current_request_stats()
+    if stats is None or stats.statements is None:
+        return
+
+    budget = _route_budget(app, request)
+    route = request.url_rule.rule if request.url_rule is not None else request.path
+    raise_error = _budget_mode(app) == 'raise'
+    # A streamed body (utils.metrics.track_stream) may still run queries, it is checked when it ends
+    run_at_request_end(lambda: _enforce_budget(stats, route, budget, raise_error))
+
+
+def _enforce_budget(stats, route: str, budget: int, raise_error: bool) -> None:
+    budget += stats.allowed_queries
+    if len(stats.statements) <= budget:
+        return
+
+    query_budget_violations.inc((route,))
+    report = budget_report(route, budget, stats.statements)
+    if raise_error:
+        raise QueryBudgetExceeded(report)
+    print(report)
+
+
+def init_query_budget(app, request, asynchronous: bool = False) -> None:
+    """
+    Registers the budget checks on a Flask app (or a Quart app with asynchronous=True).
+    Call it after utils.metrics.init_app_metrics, the check must run before the request stats are closed.
+    :param app: Flask or Quart app
+    :param request: the request proxy of the framework
+    """
+    if asynchronous:
+        @app.before_request
+        async def start_query_budget():
+            _start_budget(app, request)
+
+        @app.after_request
+        async def check_query_budget(response):
+            _check_budget(app, request)
+            return response
+    else:
+        @app.before_request
+        def start_query_budget():
+            _start_budget(app, request)
+
+        @app.after_request
+        def check_query_budget(response):
+            _check_budget(app, request)
+            return response
@@ -0,0 +1,292 @@
+"""
+Server-side runner for stored endpoints.
+
+Requests go through keep-alive connections pooled per (scheme, host, port) and run concurrently
+on a bounded thread pool. Every result records the status, the size of the body and a timing breakdown:
+    connect_ms  - DNS + TCP (+ TLS) handshake, 0 when a pooled connection is reused
+    ttfb_ms     - sending the request until the response headers are received
+    download_ms - reading the body
+    total_ms    - the whole request
+Unless RUNNER_ALLOW_PRIVATE_HOSTS is set, the host is resolved once, every address is checked and new
+connections go to the checked address (a second DNS answer can't point them to a private host).
+"""
+import os
+import re
+import time
+import socket
+import threading
+import ipaddress
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+RUNNER_MAX_CONCURRENCY = int(os.getenv("RUNNER_MAX_CONCURRENCY", "10"))
+RUNNER_TIMEOUT = float(os.getenv("RUNNER_TIMEOUT", "30"))
+RUNNER_MAX_IDLE_PER_HOST = int(os.getenv("RUNNER_MAX_IDLE_PER_HOST", "10"))
+# Bodies are read up to this size, the connection is dropped if the response is bigger
+RUNNER_MAX_BODY_BYTES = int(os.getenv("RUNNER_MAX_BODY_BYTES", str(10 * 1024 * 1024)))
+# Characters of the body kept in the result
+RUNNER_BODY_PREVIEW = int(os.getenv("RUNNER_BODY_PREVIEW", "2048"))
+# Stored endpoints are user input: loopback / private / link-local targets are refused unless allowed
+RUNNER_ALLOW_PRIVATE_HOSTS = os.getenv("RUNNER_ALLOW_PRIVATE_HOSTS", "false").lower() in ("1", "true", "yes")
+
+READ_CHUNK_SIZE = 64 * 1024
+# Methods safe to send again after the server closed a pooled connection
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'}
+# Same rules as http.client, checked before sending so the error lands in the result
+HEADER_NAME = re.compile(r"^[!#$%&'*+\-.^_`|~0-9A-Za-z]+$")
+ILLEGAL_HEADER_VALUE = re.compile(r"\n(?![ \t])|\r(?![ \t\n])|\x00")
+
+
+class RunnerError(Exception):
+    """Raised for endpoints that can't be executed (bad URL, refused host)."""
+
+
+class HostConnectionPool(object):
+    """
+    Idle keep-alive connections per (scheme, host, port).
+    """
+
+    def __init__(self, max_idle_per_host: int = RUNNER_MAX_IDLE_PER_HOST, timeout: float = RUNNER_TIMEOUT) -> None:
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, scheme: str, host: str, port: int, address: str = None):
+        """
+        :param address: IP address new connections are opened to (None: resolve host when connecting).
+                        TLS still verifies the certificate against host.
+        :return: (connection, reused)
+        """
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop(), True
+            self.created += 1
+
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(host, port, timeout=self.timeout)
+        if address is not None:
+            connection._create_connection = (
+                lambda target, *args: socket.create_connection((address, target[1]), *args)
+            )
+        return connection, False
+
+    def release(self, scheme: str, host: str, port: int, connection) -> None:
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hosts': len(self._idle),
+                'idle_connections': sum(len(connections) for connections in self._idle.values()),
+                'created': self.created,
+                'reused': self.reused,
+            }
+
+
+class RequestRunner(object):
+    """
+    Executes endpoint dictionaries ({"id", "title", "url", "method", "headers": [{"name", "value"}]}).
+    """
+
+    def __init__(self, max_concurrency: int = RUNNER_MAX_CONCURRENCY, timeout: float = RUNNER_TIMEOUT,
+                 max_idle_per_host: int = RUNNER_MAX_IDLE_PER_HOST, max_body_bytes: int = RUNNER_MAX_BODY_BYTES,
+                 allow_private_hosts: bool = RUNNER_ALLOW_PRIVATE_HOSTS) -> None:
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_body_bytes = max_body_bytes
+        self.allow_private_hosts = allow_private_hosts
+        self.pool = HostConnectionPool(max_idle_per_host, timeout)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="runner")
+
+    def run_many(self, endpoints: list, body: str = None) -> list:
+        """
+        Runs the endpoints concurrently (at most max_concurrency at a time).
+        :return: list of results in the same order as the endpoints
+        """
+        return list(self._executor.map(lambda endpoint: self.run(endpoint, body), endpoints))
+
+    def run(self, endpoint: dict, body: str = None) -> dict:
+        """
+        Executes one endpoint. Invalid endpoints and network errors are reported in the result, never raised.
+        :param endpoint: endpoint dictionary
+        :param body: optional request body
+        :return: dictionary with status, size, timing and body preview of the response
+        """
+        result = {
+            'endpoint_id': endpoint.get('id'),
+            'title': endpoint.get('title'),
+            'method': (endpoint.get('method') or "GET").upper(),
+            'url': endpoint.get('url'),
+            'status': None,
+            'ok': False,
+            'bytes': 0,
+            'truncated': False,
+            'reused_connection': False,
+            'timing': {'connect_ms': 0.0, 'ttfb_ms': 0.0, 'download_ms': 0.0, 'total_ms': 0.0},
+            'body': None,
+            'error': None,
+        }
+        started = time.perf_counter()
+
+        try:
+            scheme, host, port, target, address = self._split_url(endpoint.get('url') or "")
+            headers = self._headers(endpoint.get('headers'))
+            encoded_body = body.encode("utf-8") if body is not None else None
+
+            # A pooled connection may have been closed by the server meanwhile: retry idempotent
+            # requests once on a new one (a POST may already have been processed)
+            for attempt in range(2):
+                connection, reused = self.pool.acquire(scheme, host, port, address)
+                try:
+                    self._execute(connection, reused, result, target, headers, encoded_body)
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    connection.close()
+                    if reused and not attempt and result['method'] in IDEMPOTENT_METHODS:
+                        continue
+                    raise
+                except Exception:
+                    connection.close()
+                    raise
+                break
+
+            if result['keep_alive']:
+                self.pool.release(scheme, host, port, connection)
+            else:
+                connection.close()
+
+        except RunnerError as error:
+            result['error'] = str(error)
+        except (OSError, ValueError, http.client.HTTPException) as error:
+            result['error'] = f"{type(error).__name__}: {error}"
+
+        result.pop('keep_alive', None)
+        result['timing']['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def _execute(self, connection, reused: bool, result: dict, target: str, headers: dict, body: bytes) -> None:
+        result['reused_connection'] = reused
+
+        if connection.sock is None:
+            connect_started = time.perf_counter()
+            connection.connect()
+            result['timing']['connect_ms'] = round((time.perf_counter() - connect_started) * 1000, 3)
+
+        request_started = time.perf_counter()
+        connection.request(result['method'], target, body=body, headers=headers)
+        response = connection.getresponse()
+        result['timing']['ttfb_ms'] = round((time.perf_counter() - request_started) * 1000, 3)
+
+        download_started = time.perf_counter()
+        chunks = []
+        size = 0
+        while True:
+            chunk = response.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                result['truncated'] = True
+                break
+            chunks.append(chunk)
+        result['timing']['download_ms'] = round((time.perf_counter() - download_started) * 1000, 3)
+
+        content = b"".join(chunks)
+        result.update({
+            'status': response.status,
+            'ok': 200 <= response.status < 400,
+            'bytes': size,
+            'body': content[:RUNNER_BODY_PREVIEW].decode("utf-8", errors="replace"),
+            'keep_alive': not result['truncated'] and not response.will_close,
+        })
+
+    @staticmethod
+    def _headers(headers) -> dict:
+        """
+        :param headers: stored headers ([{"name", "value"}])
+        :return: request headers
+        :raise RunnerError: for header names or values http.client refuses (e.g. a value with a line break)
+        """
+        request_headers = {}
+        for header in headers or []:
+            if not isinstance(header, dict) or not header.get('name'):
+                continue
+            name, value = str(header['name']), str(header.get('value', ""))
+            if not HEADER_NAME.match(name):
+                raise RunnerError(f"Invalid header name \"{name}\"")
+            if ILLEGAL_HEADER_VALUE.search(value):
+                raise RunnerError(f"Invalid value of header \"{name}\"")
+            request_headers[name] = value
+        return request_headers
+
+    def _split_url(self, url: str) -> tuple:
+        """
+        :return: (scheme, host, port, request target, checked address or None)
+        :raise RunnerError: for unsupported or refused URLs
+        """
+        parts = urlsplit(url)
+        try:
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+        except ValueError:
+            raise RunnerError(f"Invalid port in URL \"{url}\"")
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise RunnerError(f"Unsupported URL \"{url}\"")
+
+        address = None
+        if not self.allow_private_hosts:
+            address = self._check_public_host(parts.hostname, port)
+
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        return parts.scheme, parts.hostname, port, target, address
+
+    @staticmethod
+    def _check_public_host(host: str, port: int) -> str:
+        """
+        :return: the address to connect to, all the addresses of the host are public
+        :raise RunnerError: when the host can't be resolved or one of its addresses isn't public
+        """
+        try:
+            addresses = [info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)]
+        except socket.gaierror as error:
+            raise RunnerError(f"Can't resolve \"{host}\": {error}")
+
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split("%")[0])
+            if not ip.is_global:
+                raise RunnerError(f"Host \"{host}\" resolves to a non public address")
+        return addresses[0]
+
+    def stats(self) -> dict:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'timeout': self.timeout,
+            **self.pool.stats(),
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.pool.close()
+
+
+request_runner = RequestRunner()
@@ -0,0 +1,231 @@
+"""
+Request parsing, validation and response building shared by the WSGI (app.py) and ASGI (asgi_app.py) apps.
+
+The helpers take what differs between Flask and Quart as arguments (request.args, the parsed JSON body,
+the Response class, the JSON dumps function), so both apps run the same checks and answer with the same
+bodies and status codes. Database access and the I/O stay in the routes, sync in one app and async in the other
+(except record_load_run_results(), which runs in the threads of a load run, after the request).
+
+The operational routes (/metrics and the */-stats routes) describe the internals of the process. They answer
+404 unless STATS_ENDPOINTS_ENABLED is set; with STATS_TOKEN set they also require "Authorization: Bearer <token>".
+"""
+import os
+import hmac
+
+from utils.collection_formats import PARSERS
+from utils.collection_run import RUN_MAX_REQUESTS
+from utils.run_history import RUN_HISTORY_ROLLUP_RETENTION_DAYS
+from utils.etag import set_dashboard_validators
+from utils.compression import set_encoding_headers
+from utils.metrics import run_history_errors
+from database.main import Database
+
+CORS_ORIGINS = ["http://localhost:5174", "http://127.0.0.1:5173/", "http://localhost:4173", "http://localhost:5173"]
+# Maximum page size accepted by the paginated dashboard and endpoint listing
+MAX_PAGE_SIZE = 500
+# Number of collections read from the database for every chunk of the streamed dashboard
+STREAM_BATCH_SIZE = 50
+# Queries of one Database.get_collections_page() (collections, then their endpoints), allowed again for
+# every page of the streamed dashboard after the first one
+COLLECTIONS_PAGE_QUERIES = 2
+# Maximum number of endpoints accepted by /add-endpoints
+MAX_BULK_ENDPOINTS = 1000
+# Number of imported endpoints inserted per transaction
+IMPORT_BATCH_SIZE = 500
+# Maximum number of runs returned by /endpoint-history
+MAX_HISTORY_RUNS = 100
+# Maximum number of hours covered by /endpoint-statistics
+MAX_STATISTICS_HOURS = RUN_HISTORY_ROLLUP_RETENTION_DAYS * 24
+
+AUTH_REDIRECT = {"type": "redirect", "value": "/auth"}
+
+STATS_ENDPOINTS_ENABLED = os.getenv("STATS_ENDPOINTS_ENABLED", "false").lower() in ("1", "true", "yes")
+STATS_TOKEN = os.getenv("STATS_TOKEN", "")
+
+
+def stats_allowed(headers) -> bool:
+    """
+    :param headers: request.headers
+    :return: True when the operational routes may answer this request
+    """
+    if not STATS_ENDPOINTS_ENABLED:
+        return False
+    if not STATS_TOKEN:
+        return True
+    return hmac.compare_digest(headers.get('Authorization', "").encode("utf-8"), f"Bearer {STATS_TOKEN}".encode("utf-8"))
+
+
+def stats_not_found():
+    return ["Not Found"], 404
+
+
+def expire_session_cookie(response):
+    """Replaces the "sid" cookie of a response sending the client back to /auth."""
+    response.set_cookie(
+        "sid", str(),
+        httponly=True, secure=False, samesite="Lax",
+        max_age=24 * 3600
+    )
+    return response
+
+
+def client_collection(collection: dict) -> dict:
+    """Removes the internal columns from a collection sent to the dashboard."""
+    collection.pop('id', None)
+    collection.pop('user_id', None)
+    return collection
+
+
+def page_arguments(args):
+    """
+    Reads the pagination query arguments.
+    :param args: request.args
+    :return: (limit, cursor, endpoints_limit) or None if they are not valid
+    """
+    limit = args.get('limit', type=int)
+    cursor = args.get('cursor', default=0, type=int)
+    endpoints_limit = args.get('endpoints_limit', type=int)
+
+    for value in (limit, endpoints_limit):
+        if value is not None and not 0 < value <= MAX_PAGE_SIZE:
+            return None
+    if cursor is None or cursor < 0:
+        return None
+
+    return limit, cursor, endpoints_limit
+
+
+def stream_requested(args) -> bool:
+    """:return: True when /user-information is asked for the NDJSON stream"""
+    return args.get('stream', '').lower() in ('1', 'true')
+
+
+def dashboard_line(dumps, kind: str, value) -> str:
+    """
+    :param dumps: JSON dumps function of the app
+    :param kind: 'user', 'collection' or 'error' (the value is then the message)
+    :return: one NDJSON line of the streamed dashboard
+    """
+    return dumps({'type': kind, 'message' if kind == 'error' else kind: value}) + "\n"
+
+
+def dashboard_response(response_class, body: bytes, encoding, etag: str):
+    """Full dashboard response from (cached) bytes already in their content coding."""
+    response = response_class(body, mimetype='application/json')
+    set_encoding_headers(response, encoding)
+    return set_dashboard_validators(response, etag)
+
+
+def collection_error(collection_title: str, collection_request: dict, missing_status: int = 404):
+    """
+    :param collection_request: failed result of Database.get_collection_id()
+    :param missing_status: status code answered when the collection does not exist
+    :return: route response of a collection lookup that failed
+    """
+    if collection_request['status'] == 404:
+        return [f"Collection \"{collection_title}\" does not exist."], missing_status
+    return [f"Internal error"], 500
+
+
+def bulk_endpoints_error(collection_title, endpoints_json):
+    """:return: route response when the /add-endpoints body is not valid, otherwise None"""
+    if not collection_title or not isinstance(endpoints_json, list) or not endpoints_json:
+        return ['Invalid JSON.'], 400
+    if len(endpoints_json) > MAX_BULK_ENDPOINTS:
+        return [f"At most {MAX_BULK_ENDPOINTS} endpoints can be added at once."], 400
+    return None
+
+
+def import_parser(args):
+    """:return: parser of the /import-collection format (see utils.collection_formats) or None"""
+    return PARSERS.get(args.get('format', 'postman'))
+
+
+def import_format_error():
+    return [f"Format must be one of: {', '.join(PARSERS)}."], 400
+
+
+def set_export_headers(response, export_format: str):
+    response.headers['Content-Disposition'] = f"attachment; filename=\"{export_format}.json\""
+    return response
+
+
+def run_collection_summary(collection_title: str, results: list) -> dict:
+    """:return: body of /run-collection"""
+    return {
+        'collection': collection_title,
+        'total': len(results),
+        'succeeded': sum(1 for result in results if result['ok']),
+        'results': results,
+    }
+
+
+def history_saved(history_request: dict, runs: int) -> bool:
+    """
+    Logs and counts (callapi_run_history_errors_total) the runs a Database.record_endpoint_runs() call
+    could not save. The runs themselves succeeded, so the routes still answer with their results.
+    :param history_request: result of Database.record_endpoint_runs()
+    :param runs: number of runs given to it
+    """
+    if history_request['status'] == 201:
+        return True
+    print(f"Run history: {runs} runs not saved: {history_request['data'].get('message')}")
+    run_history_errors.inc(amount=runs)
+    return False
+
+
+def record_load_run_results(results: list) -> None:
+    """Recorder of the /run-collection-load runs (see CollectionRun), called outside the request with its own session."""
+    db = Database()
+    try:
+        history_saved(db.record_endpoint_runs(results), len(results))
+    finally:
+        db.close()
+
+
+def history_arguments(args, argument: str, default: int, maximum: int):
+    """
+    :param args: request.args
+    :return: (collection_title, endpoint_id, value of `argument`) or None when the query arguments are invalid
+    """
+    collection_title = args.get('collection_title')
+    try:
+        endpoint_id = int(args.get('endpoint_id', ""))
+        value = int(args.get(argument, default))
+    except ValueError:
+        return None
+
+    if not collection_title or not 1 <= value <= maximum:
+        return None
+    return collection_title, endpoint_id, value
+
+
+def load_run_arguments(data: dict):
+    """
+    Reads the /run-collection-load body.
+    :return: (collection_title, keyword arguments of CollectionRun) or None when the body is not valid
+    """
+    try:
+        iterations = int(data.get('iterations', 1))
+        concurrency = int(data.get('concurrency', 10))
+        per_host = int(data.get('per_host_concurrency', 5))
+        rate = float(data['rate']) if data.get('rate') else None
+    except (TypeError, ValueError):
+        return None
+
+    collection_title = data.get('collection_title')
+    if not collection_title or iterations < 1 or concurrency < 1 or per_host < 1 or (rate is not None and rate <= 0):
+        return None
+
+    return collection_title, {
+        'iterations': iterations, 'concurrency': concurrency, 'per_host': per_host, 'rate': rate, 'body': data.get('body'),
+    }
+
+
+def load_run_size_error(collection_title: str, endpoints: list, iterations: int):
+    """:return: route response when the run can't be started with these endpoints, otherwise None"""
+    if not endpoints:
+        return [f"Collection \"{collection_title}\" has no endpoints."], 400
+    if len(endpoints) * iterations > RUN_MAX_REQUESTS:
+        return [f"A run can't send more than {RUN_MAX_REQUESTS} requests."], 413
+    return None
@@ -0,0 +1,118 @@
+"""
+Helpers of the endpoint run history (tables endpoint_runs and endpoint_run_rollups).
+
+Raw runs are kept small: the status as smallint, the latency in microseconds, the body size and the
+first RUN_HISTORY_BODY_BYTES bytes of the body compressed with zlib.
+Rollups count the runs per endpoint, hour and latency bucket. Buckets grow by RUN_HISTORY_BUCKET_GROWTH
+(10% by default), so percentiles read from the rollups are within that factor of the exact value.
+"""
+import os
+import math
+import zlib
+from datetime import datetime
+
+# Bytes of the response body kept per run (before compression)
+RUN_HISTORY_BODY_BYTES = int(os.getenv("RUN_HISTORY_BODY_BYTES", "4096"))
+# Days of raw runs kept (one partition per day) and days of rollups kept
+RUN_HISTORY_RETENTION_DAYS = int(os.getenv("RUN_HISTORY_RETENTION_DAYS", "7"))
+RUN_HISTORY_ROLLUP_RETENTION_DAYS = int(os.getenv("RUN_HISTORY_ROLLUP_RETENTION_DAYS", "90"))
+# Partitions created in advance by the retention job
+RUN_HISTORY_PARTITIONS_AHEAD = int(os.getenv("RUN_HISTORY_PARTITIONS_AHEAD", "3"))
+
+RUN_HISTORY_BUCKET_GROWTH = 1.1
+_LOG_GROWTH = math.log(RUN_HISTORY_BUCKET_GROWTH)
+
+
+def latency_bucket(latency_ms: float) -> int:
+    """
+    :param latency_ms: latency in milliseconds
+    :return: index of the logarithmic latency bucket (latencies up to 1 ms are all in bucket 0)
+    """
+    if latency_ms <= 1:
+        return 0
+    return int(math.ceil(math.log(latency_ms) / _LOG_GROWTH))
+
+
+def bucket_upper_ms(bucket: int) -> float:
+    """
+    :param bucket: index of a latency bucket
+    :return: upper bound of the bucket in milliseconds
+    """
+    return round(RUN_HISTORY_BUCKET_GROWTH ** bucket, 3)
+
+
+def histogram_percentiles(histogram: dict, percents: tuple = (50, 95, 99)) -> dict:
+    """
+    :param histogram: dictionary bucket -> number of runs
+    :param percents: percentiles to compute
+    :return: dictionary "p<percent>_ms" -> upper bound of the bucket holding the percentile (None without runs)
+    """
+    total = sum(histogram.values())
+    result = {f"p{percent}_ms": None for percent in percents}
+    if not total:
+        return result
+
+    ordered = sorted(histogram.items())
+    for percent in percents:
+        rank = max(1, math.ceil(percent / 100 * total))
+        seen = 0
+        for bucket, runs in ordered:
+            seen += runs
+            if seen >= rank:
+                result[f"p{percent}_ms"] = bucket_upper_ms(bucket)
+                break
+    return result
+
+
+def compress_body(body: str):
+    """
+    :param body: response body (text)
+    :return: zlib compressed first RUN_HISTORY_BODY_BYTES bytes of the body, or None
+    """
+    if body is None:
+        return None
+    return zlib.compress(body.encode("utf-8")[:RUN_HISTORY_BODY_BYTES], 6)
+
+
+def decompress_body(data: bytes):
+    if data is None:
+        return None
+    return zlib.decompress(data).decode("utf-8", errors="replace")
+
+
+def run_row(result: dict, ran_at: datetime) -> dict:
+    """
+    :param result: result dictionary of utils.request_runner.RequestRunner.run()
+    :param ran_at: time of the run
+    :return: row of endpoint_runs
+    """
+    return {
+        'endpoint_id': result['endpoint_id'],
+        'ran_at': ran_at,
+        'status': result['status'],
+        'latency_us': int(result['timing']['total_ms'] * 1000),
+        'bytes': result['bytes'],
+        'body': compress_body(result['body']),
+        'error': result['error'],
+    }
+
+
+def rollup_rows(rows: list) -> list:
+    """
+    Aggregates endpoint_runs rows per (endpoint_id, hour, latency bucket).
+    :return: rows of endpoint_run_rollups, sorted by key so concurrent upserts lock in the same order
+    """
+    rollups = {}
+    for row in rows:
+        hour = row['ran_at'].replace(minute=0, second=0, microsecond=0)
+        key = (row['endpoint_id'], hour, latency_bucket(row['latency_us'] / 1000))
+        rollup = rollups.setdefault(key, {
+            'endpoint_id': key[0], 'hour': key[1], 'latency_bucket': key[2],
+            'runs': 0, 'errors': 0, 'latency_ms_sum': 0.0, 'bytes_sum': 0,
+        })
+        rollup['runs'] += 1
+        rollup['errors'] += 0 if row['status'] is not None and 200 <= row['status'] < 400 else 1
+        rollup['latency_ms_sum'] += row['latency_us'] / 1000
+        rollup['bytes_sum'] += row['bytes']
+
+    return [rollups[key] for key in sorted(rollups)]
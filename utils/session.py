@@ -1,5 +1,6 @@
 import secrets, hashlib, datetime as dt
 from database.main import Database
+from utils.session_cache import session_cache
 
 def _hash_token(raw: str) -> str:
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -22,9 +23,19 @@ def validate_session(sid: str):
         if sid:
             hash_sid = _hash_token(sid)
 
+            # Most requests are answered from the in-process cache without a DB round trip
+            cached_user_id = session_cache.get(hash_sid)
+            if cached_user_id is not None:
+                return cached_user_id
+
             database = Database()
             validate_response = database.validate_session(hash_sid)
             if validate_response['status'] == 302:
+                session_cache.set(
+                    hash_sid,
+                    validate_response['data']['user_id'],
+                    validate_response['data']['expires_at']
+                )
                 return validate_response['data']['user_id']
             else:
                 return False
@@ -39,10 +50,57 @@ def remove_session_id(sid: str):
     try:
         if sid:
             hash_sid = _hash_token(sid)
+            session_cache.invalidate(hash_sid)
             database = Database()
             database.delete_session(hash_sid)
 
         else:
             pass
     except Exception as error:
-        print(error)
\ No newline at end of file
+        print(error)
+
+async def create_session_async(db, user_id: int, days: int = 1):
+    """Same as create_session() for the ASGI app, `db` is an AsyncDatabase"""
+    raw = secrets.token_urlsafe(32)
+    h = _hash_token(raw)
+    expires_at = dt.datetime.now() + dt.timedelta(days=days)
+
+    await db.create_session(user_id, h, expires_at)
+
+    return raw, expires_at
+
+
+async def validate_session_async(db, sid: str):
+    """Same as validate_session() for the ASGI app, `db` is an AsyncDatabase"""
+    try:
+        if sid:
+            hash_sid = _hash_token(sid)
+
+            cached_user_id = session_cache.get(hash_sid)
+            if cached_user_id is not None:
+                return cached_user_id
+
+            validate_response = await db.validate_session(hash_sid)
+            if validate_response['status'] == 302:
+                session_cache.set(
+                    hash_sid,
+                    validate_response['data']['user_id'],
+                    validate_response['data']['expires_at']
+                )
+                return validate_response['data']['user_id']
+
+        return False
+    except Exception as error:
+        print(error)
+        return False
+
+
+async def remove_session_id_async(db, sid: str):
+    """Same as remove_session_id() for the ASGI app, `db` is an AsyncDatabase"""
+    try:
+        if sid:
+            hash_sid = _hash_token(sid)
+            session_cache.invalidate(hash_sid)
+            await db.delete_session(hash_sid)
+    except Exception as error:
+        print(error)
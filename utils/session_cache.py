@@ -0,0 +1,93 @@
+import os
+import time
+import threading
+import datetime as dt
+from collections import OrderedDict
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# Keep the TTL short: a logout handled by another worker process only invalidates its own cache
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))
+
+
+class SessionCache(object):
+    """
+    Bounded LRU cache of validated sessions: session_hash -> (user_id, deadline).
+    An entry lives for at most `ttl` seconds and never past the session expires_at.
+    """
+
+    def __init__(self, max_size: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_hash: str):
+        """
+        :param session_hash: SHA-256 hash of the session token
+        :return: user_id of the cached session or None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(session_hash)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            user_id, deadline = entry
+            if deadline <= now:
+                del self._entries[session_hash]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(session_hash)
+            self.hits += 1
+            return user_id
+
+    def set(self, session_hash: str, user_id: int, expires_at: dt.datetime = None) -> None:
+        """
+        :param session_hash: SHA-256 hash of the session token
+        :param user_id: ID of the session owner
+        :param expires_at: Date/Time when the session expires (caps the cache lifetime)
+        """
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+
+        lifetime = self.ttl
+        if expires_at is not None:
+            lifetime = min(lifetime, (expires_at - dt.datetime.now()).total_seconds())
+        if lifetime <= 0:
+            return
+
+        with self._lock:
+            self._entries[session_hash] = (user_id, time.monotonic() + lifetime)
+            self._entries.move_to_end(session_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, session_hash: str) -> None:
+        with self._lock:
+            self._entries.pop(session_hash, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+session_cache = SessionCache()
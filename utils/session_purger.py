@@ -0,0 +1,181 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+from database.main import engine
+from utils.cleanup_sessions_scheduler import (
+    run_locked_purge, run_locked_history_cleanup, prepare_run_partitions, CLEANUP_BATCH_SIZE,
+)
+
+SESSION_PURGER_ENABLED = os.getenv("SESSION_PURGER_ENABLED", "false").lower() in ("1", "true", "yes")
+# Bounds of the adaptive interval between two purges (seconds)
+SESSION_PURGER_MIN_INTERVAL = float(os.getenv("SESSION_PURGER_MIN_INTERVAL", "5"))
+SESSION_PURGER_MAX_INTERVAL = float(os.getenv("SESSION_PURGER_MAX_INTERVAL", "900"))
+# Seconds between two run history retention passes (partitions and rollups, see cleanup_endpoint_runs)
+SESSION_PURGER_HISTORY_INTERVAL = float(os.getenv("SESSION_PURGER_HISTORY_INTERVAL", "3600"))
+# Create the endpoint_runs partitions of the coming days when a serving process starts (see ensure_run_partitions)
+RUN_PARTITIONS_ON_STARTUP = os.getenv("RUN_PARTITIONS_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+# Seconds until the next session expires and number of sessions expiring within the max interval
+# (both answered from the expires_at index)
+EXPIRY_OUTLOOK = """
+    SELECT
+        (SELECT EXTRACT(EPOCH FROM (min(expires_at) - LOCALTIMESTAMP)) FROM sessions),
+        (SELECT count(*) FROM sessions WHERE expires_at <= LOCALTIMESTAMP + %s * interval '1 second');
+"""
+
+
+class SessionPurger(object):
+    """
+    Background thread of the API process that deletes expired sessions through the shared engine pool.
+
+    The interval adapts to the expiry rate:
+      - backlog left by the last run          -> min interval
+      - another replica holds the purge lock  -> max interval
+      - otherwise the time until the next session expires, shortened when many sessions expire
+        soon so every run deletes about one batch. Always clamped to [min interval, max interval].
+    Every `history_interval` seconds it also runs the retention of the endpoint run history, like the
+    standalone scheduler does, so deployments without the scheduler don't keep the history forever.
+    Postgres only (advisory locks).
+    """
+
+    def __init__(self, min_interval: float = SESSION_PURGER_MIN_INTERVAL,
+                 max_interval: float = SESSION_PURGER_MAX_INTERVAL, batch_size: int = CLEANUP_BATCH_SIZE,
+                 history_interval: float = SESSION_PURGER_HISTORY_INTERVAL) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.history_interval = history_interval
+        self.last_history_report = None
+        self._next_history_run = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.deleted_total = 0
+        self.last_report = None
+        self.next_interval = min_interval
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="session-purger", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.next_interval = self.run_once()
+            except Exception as error:
+                print(f"[{datetime.utcnow().isoformat()}] Session purger ERROR: {error}")
+                self.next_interval = self.max_interval
+
+            if time.monotonic() >= self._next_history_run:
+                try:
+                    self.run_history_cleanup()
+                except Exception as error:
+                    print(f"[{datetime.utcnow().isoformat()}] Run history cleanup ERROR: {error}")
+                self._next_history_run = time.monotonic() + self.history_interval
+
+            self._stop.wait(self.next_interval)
+
+    def run_once(self) -> float:
+        """
+        Runs one purge and computes the interval until the next one.
+        :return: seconds to wait before the next purge
+        """
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            cur = conn.connection.cursor()
+            try:
+                report = run_locked_purge(cur, batch_size=self.batch_size)
+                self.runs += 1
+                self.deleted_total += report['deleted']
+                self.last_report = report
+
+                if report['backlog']:
+                    return self.min_interval
+                if not report['locked']:
+                    return self.max_interval
+
+                cur.execute(EXPIRY_OUTLOOK, (self.max_interval,))
+                seconds_to_next_expiry, expiring_soon = cur.fetchone()
+            finally:
+                cur.close()
+
+        return self.compute_interval(seconds_to_next_expiry, expiring_soon)
+
+    def run_history_cleanup(self) -> dict:
+        """
+        One retention pass of the endpoint run history (skipped when another process holds its lock).
+        :return: report of run_locked_history_cleanup()
+        """
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            cur = conn.connection.cursor()
+            try:
+                self.last_history_report = run_locked_history_cleanup(cur)
+            finally:
+                cur.close()
+        return self.last_history_report
+
+    def compute_interval(self, seconds_to_next_expiry, expiring_soon: int) -> float:
+        """
+        :param seconds_to_next_expiry: seconds until the earliest expires_at (None when there are no sessions)
+        :param expiring_soon: number of sessions that expire within the max interval
+        :return: seconds to wait before the next purge
+        """
+        interval = self.max_interval
+        if seconds_to_next_expiry is not None:
+            interval = min(interval, float(seconds_to_next_expiry))
+        if expiring_soon > self.batch_size:
+            interval = min(interval, self.max_interval * self.batch_size / expiring_soon)
+
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def stats(self) -> dict:
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'runs': self.runs,
+            'deleted_total': self.deleted_total,
+            'next_interval': round(self.next_interval, 3),
+            'last_run': self.last_report,
+            'last_history_run': self.last_history_report,
+        }
+
+
+session_purger = SessionPurger()
+
+
+def ensure_run_partitions() -> dict:
+    """
+    Creates today's and the next daily partitions of endpoint_runs when RUN_PARTITIONS_ON_STARTUP is set
+    (Postgres only). Called by the startup hooks of the apps (start_background_jobs), never on import.
+    Errors are only logged, the app starts anyway.
+    """
+    if not RUN_PARTITIONS_ON_STARTUP or engine.dialect.name != 'postgresql':
+        return {'created': [], 'errors': []}
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            cur = conn.connection.cursor()
+            try:
+                return prepare_run_partitions(cur)
+            finally:
+                cur.close()
+    except Exception as error:
+        print(f"[{datetime.utcnow().isoformat()}] Can't create the endpoint_runs partitions: {error}")
+        return {'created': [], 'errors': [str(error)]}
+
+
+def start_session_purger() -> SessionPurger:
+    """
+    Starts the embedded purger (when SESSION_PURGER_ENABLED is set) and returns it.
+    Called by the startup hooks of the apps (start_background_jobs), never on import.
+    """
+    if SESSION_PURGER_ENABLED:
+        session_purger.start()
+    return session_purger